@@ -14,4 +14,37 @@ def read_markdown_file(markdown_file):
 # Function to load CSS to style the 'Meet the team' page
 def local_css(file_name):
     with open(file_name) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
\ No newline at end of file
+        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+
+
+# Function to pick a movie from the whole catalogue with a search box
+def title_selector(label, title_index, default_options, limit=50):
+    """Selectbox offering the titles matching a search query.
+
+    Only the best `limit` matches of the query are sent to the browser;
+    `default_options` are offered until something is searched.
+
+    Parameters
+    ----------
+    label : str
+        Label of the selectbox, also identifying its search box.
+    title_index : utils.title_search.TitleIndex
+        Index searched for matching titles.
+    default_options : list (str)
+        Titles offered before a search.
+    limit : int
+        Maximum number of matches offered.
+
+    Returns
+    -------
+    str
+        The selected title.
+
+    """
+    query = st.text_input(f'Search titles for the {label.lower()}', key=f'{label} search',
+                          placeholder='Start typing any movie title...')
+    options = title_index.search(query, limit) if query else list(default_options)
+    if query and not options:
+        st.caption(f'No title matches "{query}"')
+        options = list(default_options)
+    return st.selectbox(label, options)
@@ -0,0 +1,375 @@
+"""
+
+    Offline ranking evaluation of the recommenders.
+
+    Author: Explore Data Science Academy.
+
+    Description: Measures the quality of the top-k lists the recommenders
+    return, rather than the RMSE of their rating estimates:
+
+        1. The ratings are split on time: the latest `--holdout` share of
+           them (by timestamp) is held out, the earlier ratings form an
+           evaluation dataset laid out like the repository root, with an
+           ALS model (see `recommenders/als.py`) trained on them only, so
+           that no held-out rating leaks into the recommenders.
+        2. Every user with ratings on both sides of the cutoff becomes a
+           request: their `--favourites` best rated earlier movies are the
+           favourites, the held-out movies they rated `--min-rating` or
+           more are the relevant ones.
+        3. Requests are scored in blocks on worker processes started
+           within the evaluation dataset, with the vectorised block
+           scorers of `recommenders/batch.py`, and every block's top-k
+           lists are compared with the relevant movies in a few array
+           operations.
+
+    Reported per algorithm: precision@k, recall@k and NDCG@k averaged over
+    the users, catalogue coverage (share of the catalogue recommended to
+    at least one user), and the scoring time per user. The evaluation
+    dataset is kept under `benchmarks/data/` and reused while the ratings
+    and split settings are unchanged.
+
+    Runs are stored as JSON under `benchmarks/results/`. When a baseline
+    run exists, the benchmark exits with status 1 when a metric of an
+    algorithm dropped beyond the tolerance, so speed optimisations can be
+    checked for quality regressions.
+
+    Usage (from the repository root):
+
+        python -m benchmarks.evaluate --algorithm content collab --k 10 \\
+            [--max-users 5000] [--save-baseline]
+
+"""
+
+# Dependencies
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+from recommenders.als import ALSTrainer
+from recommenders.catalog import load_catalog
+from recommenders.ingest import ingest_ratings
+from recommenders.model_artifact import export_scorer
+from utils.data_cache import load_ratings
+
+DATA_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'data')
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+BASELINE_PATH = os.path.join(RESULTS_DIR, 'quality_baseline.json')
+
+ALGORITHMS = ('content', 'collab', 'hybrid')
+METRICS = ('precision', 'recall', 'ndcg', 'coverage')
+# Settings two runs must share to be compared.
+SETTINGS = ('ratings', 'k', 'holdout', 'favourites', 'min_rating', 'users')
+
+
+def temporal_split(ratings, share):
+    """Split ratings on the timestamp leaving `share` of them after it.
+
+    Returns
+    -------
+    tuple (Pandas Dataframe, Pandas Dataframe, int)
+        Earlier and held-out ratings, and the cutoff timestamp.
+
+    """
+    cutoff = int(np.quantile(ratings['timestamp'].to_numpy(), 1.0 - share))
+    later = (ratings['timestamp'] >= cutoff).to_numpy()
+    return ratings[~later], ratings[later], cutoff
+
+
+def prepare_dataset(ratings_path, movies_path, share, n_factors=50, n_epochs=10, seed=0):
+    """Write the evaluation dataset of a holdout share unless it is current.
+
+    Returns
+    -------
+    tuple (str, Pandas Dataframe, Pandas Dataframe)
+        The dataset root, and the earlier and held-out ratings.
+
+    """
+    root = os.path.join(DATA_DIR, f'holdout-{share:g}')
+    source = os.stat(ratings_path)
+    split = {'ratings': os.path.abspath(ratings_path), 'size': source.st_size,
+             'mtime': source.st_mtime, 'share': share, 'factors': n_factors,
+             'epochs': n_epochs, 'seed': seed}
+    train, test, split['cutoff'] = temporal_split(load_ratings(ratings_path), share)
+
+    split_path = os.path.join(root, 'split.json')
+    if os.path.exists(split_path):
+        with open(split_path) as f:
+            if json.load(f) == split:
+                return root, train, test
+    shutil.rmtree(root, ignore_errors=True)
+
+    data_dir = os.path.join(root, 'resources', 'data')
+    os.makedirs(data_dir)
+    shutil.copyfile(movies_path, os.path.join(data_dir, 'movies.csv'))
+    train_path = os.path.join(data_dir, 'ratings.csv')
+    train.to_csv(train_path, index=False)
+
+    # The collaborative model only ever sees the earlier ratings
+    start = time.perf_counter()
+    matrix = ingest_ratings(train_path).rating_matrix()
+    trainer = ALSTrainer(n_factors=n_factors, n_epochs=n_epochs, seed=seed).fit(matrix.csr)
+    export_scorer(trainer.scorer(matrix.user_ids, matrix.item_ids),
+                  os.path.join(root, 'resources', 'models', 'svd'), algorithm='ALS',
+                  mode='explicit', n_factors=n_factors, n_epochs=n_epochs,
+                  holdout_cutoff=split['cutoff'], n_ratings=int(matrix.nnz))
+    print(f"Trained the evaluation model on {matrix.nnz} ratings in "
+          f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    with open(split_path, 'w') as f:
+        json.dump(split, f, indent=2)
+    return root, train, test
+
+
+def build_requests(train, test, movies, n_favourites=3, min_rating=4.0, max_users=None, seed=0):
+    """Favourite titles and relevant movies of every evaluated user.
+
+    Movies are identified by the id their title resolves to, so that
+    duplicated titles count as one movie, like the recommenders' output.
+
+    Returns
+    -------
+    tuple (np.ndarray, list (list (str)), list (np.ndarray))
+        User ids, their favourite titles and their relevant movie ids.
+
+    """
+    canonical = np.full(int(movies.movie_ids.max()) + 1, -1, dtype=np.int64)
+    canonical[movies.movie_ids] = [movies.title_to_id[title] for title in movies.titles]
+
+    def in_catalogue(ratings):
+        ids = ratings['movieId'].to_numpy()
+        ids = canonical[np.where(ids < len(canonical), ids, 0)]
+        known = ids >= 0
+        return ratings[known].assign(movieId=ids[known])
+
+    # Best rated, then most recent, earlier movies of every user
+    train = in_catalogue(train).sort_values(['userId', 'rating', 'timestamp'],
+                                            ascending=[True, False, False])
+    favourites = train.drop_duplicates(['userId', 'movieId']).groupby('userId').head(n_favourites)
+    counts = favourites['userId'].value_counts()
+    favourites = favourites[favourites['userId'].isin(counts.index[counts == n_favourites])]
+
+    relevant = in_catalogue(test[test['rating'] >= min_rating]) \
+        .drop_duplicates(['userId', 'movieId'])
+    users = np.intersect1d(favourites['userId'].unique(), relevant['userId'].unique())
+    if max_users and len(users) > max_users:
+        users = np.sort(np.random.default_rng(seed).choice(users, max_users, replace=False))
+
+    favourites = favourites[favourites['userId'].isin(users)].sort_values('userId', kind='stable')
+    titles = movies.titles[movies.positions(favourites['movieId'])]
+    lists = [titles[i:i + n_favourites].tolist()
+             for i in range(0, len(titles), n_favourites)]
+
+    relevant = relevant[relevant['userId'].isin(users)].sort_values('userId', kind='stable')
+    bounds = np.flatnonzero(np.diff(relevant['userId'].to_numpy())) + 1
+    return users, lists, np.split(relevant['movieId'].to_numpy(np.int64), bounds)
+
+
+def ranking_metrics(recommended, relevant, k):
+    """Precision, recall and NDCG at k of a block of top-k lists.
+
+    Parameters
+    ----------
+    recommended : np.ndarray
+        Recommended movie ids of shape (n_users, k), -1 padded.
+    relevant : list (np.ndarray)
+        Relevant movie ids of every user, none empty.
+    k : int
+        Length of the lists.
+
+    Returns
+    -------
+    dict (str, np.ndarray)
+        Every metric for every user.
+
+    """
+    n_relevant = np.array([len(r) for r in relevant])
+    span = int(max(recommended.max(), max(r.max() for r in relevant))) + 1
+    users = np.arange(len(relevant))
+    wanted = np.repeat(users, n_relevant) * span + np.concatenate(relevant)
+    hits = np.isin(users[:, None] * span + recommended, wanted) & (recommended >= 0)
+
+    discount = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = np.cumsum(discount)[np.minimum(n_relevant, k) - 1]
+    return {'precision': hits.sum(axis=1) / k, 'recall': hits.sum(axis=1) / n_relevant,
+            'ndcg': hits @ discount / ideal}
+
+
+def _start_worker(root):
+    # Recommenders find their data at the usual relative paths, loaded
+    # before the first block so that loads aren't timed
+    os.chdir(root)
+    from utils import lazy
+    from recommenders import batch  # noqa: F401, registers the resources
+    lazy.warm_up()
+
+
+def evaluate_block(algorithm, lists, relevant, k):
+    """Score a block of users and sum their ranking metrics."""
+    from recommenders import batch, content_based
+    movies = content_based.catalog.get()
+
+    start = time.perf_counter()
+    recommended = batch.BLOCKS[algorithm](lists, k)
+    seconds = time.perf_counter() - start
+
+    ids = np.full((len(lists), k), -1, dtype=np.int64)
+    for row, titles in enumerate(recommended):
+        ids[row, :len(titles)] = [movies.title_to_id[title] for title in titles[:k]]
+    metrics = ranking_metrics(ids, relevant, k)
+    return {'algorithm': algorithm, 'users': len(lists), 'seconds': seconds,
+            'sums': {name: float(values.sum()) for name, values in metrics.items()},
+            'recommended': np.unique(ids[ids >= 0])}
+
+
+def evaluate(root, lists, relevant, algorithms, n_movies, k=10, block_size=256, workers=None):
+    """Ranking metrics of every algorithm over the requests.
+
+    Returns
+    -------
+    dict
+        Per algorithm: mean precision, recall and NDCG, coverage, and the
+        scoring time per user.
+
+    """
+    workers = workers or os.cpu_count()
+    totals = {algorithm: {'users': 0, 'seconds': 0.0, 'block_ms': [],
+                          'sums': dict.fromkeys(METRICS[:-1], 0.0), 'recommended': set()}
+              for algorithm in algorithms}
+
+    def collect(futures):
+        for future in futures:
+            block = future.result()
+            total = totals[block['algorithm']]
+            total['users'] += block['users']
+            total['seconds'] += block['seconds']
+            total['block_ms'].append(1000.0 * block['seconds'] / block['users'])
+            for name, value in block['sums'].items():
+                total['sums'][name] += value
+            total['recommended'].update(block['recommended'].tolist())
+
+    start, pending = time.perf_counter(), set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker,
+                             initargs=(root,)) as pool:
+        for first in range(0, len(lists), block_size):
+            for algorithm in algorithms:
+                pending.add(pool.submit(evaluate_block, algorithm, lists[first:first + block_size],
+                                        relevant[first:first + block_size], k))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+        collect(pending)
+    print(f"Scored {len(lists)} users in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    results = {}
+    for algorithm, total in totals.items():
+        users = max(total['users'], 1)
+        results[algorithm] = {
+            **{name: total['sums'][name] / users for name in METRICS[:-1]},
+            'coverage': len(total['recommended']) / n_movies,
+            'users': total['users'],
+            'ms_per_user': 1000.0 * total['seconds'] / users,
+            'block_p95_ms': float(np.percentile(total['block_ms'], 95)) if total['block_ms'] else None}
+    return results
+
+
+def compare(current, baseline, tolerance):
+    """Drops of the ranking metrics against a baseline run.
+
+    Returns
+    -------
+    list (str)
+        One message per metric that dropped by more than `tolerance`.
+
+    """
+    settings = [key for key in SETTINGS if current[key] != baseline.get(key)]
+    if settings:
+        return [f"baseline was measured with other {', '.join(settings)}"]
+    regressions = []
+    for algorithm, result in current['algorithms'].items():
+        base = baseline['algorithms'].get(algorithm)
+        if base is None:
+            continue
+        for metric in METRICS:
+            new, old = result[metric], base[metric]
+            if new < old * (1.0 - tolerance):
+                regressions.append(f"{algorithm} {metric} dropped from {old:.4f} to {new:.4f} "
+                                   f"({(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ratings', default='resources/data/ratings.csv')
+    parser.add_argument('--movies', default='resources/data/movies.csv')
+    parser.add_argument('--algorithm', nargs='+', choices=ALGORITHMS, default=['content', 'collab'],
+                        dest='algorithms')
+    parser.add_argument('--k', type=int, default=10, help='length of the recommendation lists')
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help='share of the latest ratings held out')
+    parser.add_argument('--favourites', type=int, default=3, help='favourite movies per user')
+    parser.add_argument('--min-rating', type=float, default=4.0,
+                        help='lowest held-out rating of a relevant movie')
+    parser.add_argument('--max-users', type=int, help='evaluate a random sample of the users')
+    parser.add_argument('--factors', type=int, default=50, help='factors of the evaluation model')
+    parser.add_argument('--epochs', type=int, default=10, help='epochs of the evaluation model')
+    parser.add_argument('--block-size', type=int, default=256, help='users scored together')
+    parser.add_argument('--workers', type=int, help='worker processes, one per core by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='allowed relative drop of every metric')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store this run as the new baseline')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    root, train, test = prepare_dataset(args.ratings, args.movies, args.holdout, args.factors,
+                                        args.epochs, args.seed)
+    movies = load_catalog(args.movies)
+    users, lists, relevant = build_requests(train, test, movies, args.favourites,
+                                            args.min_rating, args.max_users, args.seed)
+    del train, test
+    print(f"Evaluation dataset ready in {time.perf_counter() - start:.1f}s: {len(users)} users, "
+          f"{sum(len(r) for r in relevant)} relevant movies", file=sys.stderr)
+
+    results = evaluate(root, lists, relevant, args.algorithms, len(movies), args.k,
+                       args.block_size, args.workers)
+    for algorithm, result in results.items():
+        print(f"{algorithm:<8} precision@{args.k} {result['precision']:.4f}  "
+              f"recall@{args.k} {result['recall']:.4f}  NDCG@{args.k} {result['ndcg']:.4f}  "
+              f"coverage {result['coverage']:.2%}  {result['ms_per_user']:.2f}ms/user")
+
+    run = {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'ratings': args.ratings,
+           'k': args.k, 'holdout': args.holdout, 'favourites': args.favourites,
+           'min_rating': args.min_rating, 'users': int(len(users)), 'algorithms': results}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, time.strftime('quality-%Y%m%d-%H%M%S.json'))
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results saved to: {path}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(run, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No drop beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
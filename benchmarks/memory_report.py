@@ -0,0 +1,218 @@
+"""
+
+    Memory footprint of the ratings and movies layouts.
+
+    Author: Explore Data Science Academy.
+
+    Description: Compares the bytes every app worker holds for the ratings
+    and movies under three layouts:
+
+        csv        frames parsed by `pd.read_csv` with its default dtypes,
+                   private to every worker
+        float32    the previous binary cache: int32 ids, float32 ratings,
+                   memory-mapped and shared, plus the genre bitmasks and
+                   genre strings every worker built for itself
+        compact    the current binary cache: uint8 half-star ratings and
+                   the genre bitmasks memory-mapped from the cache, shared
+                   by every worker
+
+    Shared bytes are counted once whatever the number of workers; private
+    bytes once per worker. These figures are an estimate over the column
+    files and the genre structures only: the Python strings and dicts of
+    the catalogue, and the rating aggregates and sparse matrix, are private
+    to every worker under any layout and aren't part of it.
+
+    The real footprint of the current layout is then measured: `--workers`
+    processes are spawned, load every recommender resource and, while all
+    are alive, read their resident (RSS) and proportional (PSS, shared
+    pages divided among the processes mapping them) set sizes from
+    `/proc/self/smaps_rollup`, before and after loading. Linux only.
+
+    Usage (from the repository root, or within a synthetic dataset):
+
+        python -m benchmarks.memory_report [--workers 4]
+
+"""
+
+# Dependencies
+import os
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from utils.data_cache import (MOVIES_SCHEMA, RATINGS_SCHEMA, ensure_cache, genre_masks,
+                              load_movies)
+
+MB = 1024 ** 2
+SMAPS_ROLLUP = '/proc/self/smaps_rollup'
+
+
+def _file_bytes(directory, names):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+
+
+def csv_layout(movies_path, ratings_path):
+    """Private bytes per column of the frames parsed from the csv files."""
+    private = {}
+    for label, path in (('ratings', ratings_path), ('movies', movies_path)):
+        usage = pd.read_csv(path).memory_usage(deep=True, index=False)
+        private.update({f'{label}.{column}': int(size) for column, size in usage.items()})
+    return {'shared': {}, 'private': private}
+
+
+def float32_layout(movies_path, ratings_path):
+    """Bytes per column of the previous binary cache."""
+    n_ratings = len(np.load(os.path.join(ensure_cache(ratings_path, RATINGS_SCHEMA),
+                                         'userId.npy'), mmap_mode='r'))
+    shared = {'ratings.userId': 4 * n_ratings, 'ratings.movieId': 4 * n_ratings,
+              'ratings.rating': 4 * n_ratings, 'ratings.timestamp': 8 * n_ratings}
+
+    directory = ensure_cache(movies_path, MOVIES_SCHEMA)
+    for column in ('title', 'genres'):
+        shared[f'movies.{column}'] = _file_bytes(
+            directory, [f'{column}.codes.npy', f'{column}.bytes.npy', f'{column}.offsets.npy'])
+    shared['movies.movieId'] = _file_bytes(directory, ['movieId.npy'])
+
+    # Every worker split the genre strings, kept a space-separated copy
+    # of them and packed its own bitmasks
+    movies = load_movies(movies_path).dropna()
+    genres = movies['genres'].astype(str)
+    _, masks = genre_masks(genres)
+    private = {'movies.bag_of_words': int(genres.str.replace('|', ' ', regex=False)
+                                          .memory_usage(deep=True, index=False)),
+               'movies.genre lists': int(sum(64 + 8 * len(g.split('|')) for g in genres)),
+               'movies.genre masks': masks.nbytes}
+    return {'shared': shared, 'private': private}
+
+
+def compact_layout(movies_path, ratings_path):
+    """Bytes per column of the current binary cache."""
+    directory = ensure_cache(ratings_path, RATINGS_SCHEMA)
+    shared = {f'ratings.{column}': _file_bytes(directory, [f'{column}.npy'])
+              for column in RATINGS_SCHEMA}
+
+    directory = ensure_cache(movies_path, MOVIES_SCHEMA)
+    shared['movies.movieId'] = _file_bytes(directory, ['movieId.npy'])
+    for column in ('title', 'genres'):
+        shared[f'movies.{column}'] = _file_bytes(
+            directory, [f'{column}.codes.npy', f'{column}.bytes.npy', f'{column}.offsets.npy'])
+    shared['movies.genre masks'] = _file_bytes(directory, ['genres.masks.npy'])
+
+    # Genre lists are shared by the movies listing the same combination
+    combinations = load_movies(movies_path, columns=['genres'])['genres'].cat.categories
+    private = {'movies.genre lists': int(sum(64 + 8 * len(g.split('|')) for g in combinations)
+                                         + 8 * len(load_movies(movies_path, ['movieId'])))}
+    return {'shared': shared, 'private': private}
+
+
+def worker_mb(layout, workers):
+    """Total MB held by `workers` workers under a layout."""
+    return (sum(layout['shared'].values()) + workers * sum(layout['private'].values())) / MB
+
+
+def smaps_rollup():
+    """Memory counters of this process in MB, from `/proc/self/smaps_rollup`."""
+    counters = {}
+    with open(SMAPS_ROLLUP) as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                counters[name] = int(value.split()[0]) / 1024.0
+    return {'rss': counters['Rss'], 'pss': counters['Pss'],
+            'private': counters['Private_Clean'] + counters['Private_Dirty'],
+            'shared': counters['Shared_Clean'] + counters['Shared_Dirty']}
+
+
+def _measure_worker(barrier, results):
+    from utils import lazy
+    from recommenders import content_based, collaborative_based  # noqa: F401
+    before = smaps_rollup()
+    lazy.warm_up(names=[content_based.catalog.name, content_based.genre_index.name,
+                        content_based.rating_stats.name, collaborative_based.rating_matrix.name])
+    # Every worker is loaded when the counters are read, so that shared
+    # pages are divided among all of them
+    barrier.wait()
+    results.put({'before': before, 'after': smaps_rollup()})
+    barrier.wait()
+
+
+def measure_workers(workers=4):
+    """Measured memory of workers holding the loaded data, in MB.
+
+    Returns
+    -------
+    list (dict)
+        Counters of every worker before and after loading, see
+        `smaps_rollup`.
+
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=_measure_worker, args=(barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+
+def report(movies_path, ratings_path, workers=4):
+    """Print the per-column bytes of every layout and their totals."""
+    layouts = {'csv': csv_layout(movies_path, ratings_path),
+               'float32': float32_layout(movies_path, ratings_path),
+               'compact': compact_layout(movies_path, ratings_path)}
+
+    columns = sorted({column for layout in layouts.values()
+                      for kind in ('shared', 'private') for column in layout[kind]})
+    print(f"{'column':<24}" + ''.join(f'{name:>16}' for name in layouts))
+    for column in columns:
+        cells = []
+        for layout in layouts.values():
+            if column in layout['shared']:
+                cells.append(f"{layout['shared'][column] / MB:9.2f} shared")
+            elif column in layout['private']:
+                cells.append(f"{layout['private'][column] / MB:8.2f} private")
+            else:
+                cells.append('-')
+        print(f'{column:<24}' + ''.join(f'{cell:>16}' for cell in cells))
+
+    print()
+    for n in sorted({1, workers}):
+        totals = {name: worker_mb(layout, n) for name, layout in layouts.items()}
+        print(f"{n} worker(s): " + ', '.join(f'{name} {mb:.1f} MB' for name, mb in totals.items())
+              + f" ({totals['float32'] / totals['compact']:.1f}x less than float32, "
+              f"{totals['csv'] / totals['compact']:.1f}x less than csv)")
+    print("(estimate over the column files; the catalogue's strings and dicts and the "
+          "rating structures are private to every worker and not included)")
+
+    if not os.path.exists(SMAPS_ROLLUP):
+        print(f"\n{SMAPS_ROLLUP} is not available, skipping the measurement")
+        return layouts
+    measured = measure_workers(workers)
+    print(f"\nMeasured after loading the data in {workers} worker(s), MB per worker:")
+    print(f"{'worker':<8}" + ''.join(f'{name:>12}' for name in
+                                     ('RSS', 'PSS', 'private', 'shared', 'PSS growth')))
+    for n, worker in enumerate(measured, start=1):
+        after = worker['after']
+        print(f'{n:<8}' + ''.join(f'{after[name]:12.1f}' for name in ('rss', 'pss', 'private',
+                                                                       'shared'))
+              + f"{after['pss'] - worker['before']['pss']:12.1f}")
+    print(f"Total PSS of the workers: {sum(w['after']['pss'] for w in measured):.1f} MB, "
+          f"of which {sum(w['after']['pss'] - w['before']['pss'] for w in measured):.1f} MB "
+          f"added by loading the data")
+    return layouts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', default='resources/data/movies.csv')
+    parser.add_argument('--ratings', default='resources/data/ratings.csv')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of app workers sharing the cache')
+    args = parser.parse_args()
+    report(args.movies, args.ratings, args.workers)
@@ -0,0 +1,249 @@
+"""
+
+    Latency and memory benchmarks of the recommenders.
+
+    Author: Explore Data Science Academy.
+
+    Description: For every requested scale of synthetic data (see
+    `benchmarks/synthetic.py`) a fresh Python process is started within
+    the dataset, so that import, load and memory figures are those of a
+    cold app worker. The process measures
+
+        - import time of each recommender module,
+        - load time of each lazily loaded resource,
+        - latency percentiles of `content_model`, `collab_model` and
+          `hybrid_model` over random favourite triples, bypassing the
+          result cache,
+        - latency percentiles of the main stages of each pipeline,
+        - peak traced allocation per request and the process' peak RSS.
+
+    Runs are stored as JSON under `benchmarks/results/`. When a baseline
+    run exists, the p95 latency and peak RSS of every scale and recommender
+    are compared against it and the benchmark exits with status 1 when one
+    of them grew beyond the tolerance.
+
+    Usage (from the repository root):
+
+        python -m benchmarks.run --scales 10 100 1000 [--save-baseline]
+
+"""
+
+# Dependencies
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import resource
+import subprocess
+import tracemalloc
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'data')
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+BASELINE_PATH = os.path.join(RESULTS_DIR, 'baseline.json')
+
+
+def percentiles(samples):
+    """Latency summary, in milliseconds, of samples given in seconds."""
+    samples = np.asarray(samples) * 1000.0
+    return {'p50': float(np.percentile(samples, 50)), 'p95': float(np.percentile(samples, 95)),
+            'p99': float(np.percentile(samples, 99)), 'mean': float(samples.mean()),
+            'n': int(len(samples))}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in KB on Linux and in bytes on macOS.
+    return peak / (1024.0 ** 2 if sys.platform == 'darwin' else 1024.0)
+
+
+def _time_calls(function, inputs):
+    samples = []
+    for args in inputs:
+        start = time.perf_counter()
+        function(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _peak_allocation_mb(function, inputs):
+    peaks = []
+    for args in inputs:
+        tracemalloc.start()
+        function(*args)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024.0 ** 2)
+        tracemalloc.stop()
+    return float(np.max(peaks))
+
+
+def measure(n_requests, seed=0):
+    """Benchmark the recommenders of the current working directory.
+
+    Parameters
+    ----------
+    n_requests : int
+        Number of favourite triples timed per recommender.
+    seed : int
+        Seed of the favourite triples.
+
+    Returns
+    -------
+    dict
+        Import, load, latency and memory measurements.
+
+    """
+    sys.path.insert(0, REPO_ROOT)
+    from utils import lazy
+    content_based = lazy.timed_import('recommenders.content_based')
+    collaborative_based = lazy.timed_import('recommenders.collaborative_based')
+    hybrid_based = lazy.timed_import('recommenders.hybrid_based')
+    from recommenders.svd_engine import top_k
+
+    lazy.warm_up()
+    results = {'imports': {}, 'loads': {}}
+    for record in lazy.report():
+        results['imports' if record['kind'] == 'import' else 'loads'][record['name']] = record['seconds']
+
+    # Favourite triples drawn from rated movies, weighted by popularity
+    movies = content_based.catalog.get()
+    stats = content_based.rating_stats.get()
+    rated = np.array([i in movies.id_to_pos and movies.resolve(movies.title(i)) == i
+                      for i in stats.movie_ids.tolist()])
+    weights = stats.count[rated] / stats.count[rated].sum()
+    rng = np.random.default_rng(seed)
+    triples = [[movies.title(i) for i in rng.choice(stats.movie_ids[rated], 3, replace=False, p=weights)]
+               for _ in range(n_requests)]
+    ids = [movies.resolve_many(triple) for triple in triples]
+
+    # Whole recommenders, without their result cache and tracing
+    recommenders = {'content': inspect.unwrap(content_based.content_model),
+                    'collab': inspect.unwrap(collaborative_based.collab_model),
+                    'hybrid': inspect.unwrap(hybrid_based.hybrid_model)}
+    results['latency_ms'] = {}
+    results['peak_alloc_mb'] = {}
+    for name, recommender in recommenders.items():
+        inputs = [(triple, 10) for triple in triples]
+        recommender(*inputs[0])
+        results['latency_ms'][name] = percentiles(_time_calls(recommender, inputs))
+        results['peak_alloc_mb'][name] = _peak_allocation_mb(recommender, inputs[:10])
+
+    # Pipeline stages
+    genres = content_based.genre_index.get()
+    svd = collaborative_based.model.get()
+    users = collaborative_based.scorer.get()
+    matrix = collaborative_based.rating_matrix.get()
+    queries = [genres.union(movies.positions(i)) for i in ids]
+    scores = genres.jaccard(queries[0])
+    folded = [svd.fold_in(i, [5.0] * 3) for i in ids]
+    lookalikes = [users.top_users(i, k=10).ravel() for i in ids]
+    stages = {
+        'content:resolve': (movies.resolve_many, [(t,) for t in triples]),
+        'content:genre similarity': (genres.jaccard, [(q,) for q in queries]),
+        'content:rating lookup': (lambda: stats.column('bayesian_mean', movies.movie_ids),
+                                  [()] * n_requests),
+        'content:rank': (lambda: top_k(scores, 10), [()] * n_requests),
+        'collab:fold in': (lambda i: svd.fold_in(i, [5.0] * 3), [(i,) for i in ids]),
+        'collab:score catalogue': (svd.score_items, folded),
+        'collab:similar users': (lambda i: users.top_users(i, k=10), [(i,) for i in ids]),
+        'collab:pearson': (lambda u, i: matrix.pearson(u, i, pseudo_rating=5.0),
+                           list(zip(lookalikes, ids))),
+    }
+    results['stages_ms'] = {name: percentiles(_time_calls(function, inputs))
+                            for name, (function, inputs) in stages.items()}
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def run_scale(scale, n_requests):
+    """Generate the data of a scale and benchmark it in a fresh process."""
+    from benchmarks.synthetic import ensure_dataset
+    start = time.perf_counter()
+    root = ensure_dataset(DATA_DIR, scale)
+    print(f"[{scale}x] dataset ready in {time.perf_counter() - start:.1f}s: {root}")
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.run', '--worker',
+                             '--requests', str(n_requests)],
+                            cwd=root, env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(current, baseline, tolerance):
+    """Regressions of p95 latency and peak RSS against a baseline run.
+
+    Returns
+    -------
+    list (str)
+        One message per metric that grew by more than `tolerance`.
+
+    """
+    regressions = []
+    for scale, result in current['scales'].items():
+        base = baseline['scales'].get(scale)
+        if base is None:
+            continue
+        checks = [(f'{name} p95 latency', result['latency_ms'][name]['p95'],
+                   base['latency_ms'][name]['p95'], 'ms') for name in result['latency_ms']
+                  if name in base['latency_ms']]
+        checks.append(('peak RSS', result['peak_rss_mb'], base['peak_rss_mb'], 'MB'))
+        for metric, new, old, unit in checks:
+            if new > old * (1.0 + tolerance):
+                regressions.append(f"[{scale}x] {metric} grew from {old:.1f}{unit} to "
+                                   f"{new:.1f}{unit} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', type=int, default=[10],
+                        help='multiples of the bundled ratings sample, e.g. 10 100 1000')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='favourite triples timed per recommender')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative growth of p95 latency and RSS')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store this run as the new baseline')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.requests)))
+        return
+
+    run = {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'requests': args.requests,
+           'scales': {}}
+    for scale in args.scales:
+        result = run['scales'][str(scale)] = run_scale(scale, args.requests)
+        for name, latency in result['latency_ms'].items():
+            print(f"[{scale}x] {name:<8} p50 {latency['p50']:8.2f}ms  p95 {latency['p95']:8.2f}ms"
+                  f"  p99 {latency['p99']:8.2f}ms")
+        print(f"[{scale}x] peak RSS {result['peak_rss_mb']:.0f}MB")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, time.strftime('run-%Y%m%d-%H%M%S.json'))
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results saved to: {path}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(run, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+
+    Synthetic MovieLens-shaped datasets for benchmarking.
+
+    Author: Explore Data Science Academy.
+
+    Description: Generates `ratings.csv` files at a multiple of the size of
+    the bundled sample (100k ratings, 671 users), keeping its shape: about
+    150 ratings per user with a long-tailed user activity, Zipf-distributed
+    movie popularity over the full `movies.csv` catalogue and half-star
+    ratings. A random SVD model artifact over the same users and movies is
+    exported alongside, so that both recommenders can run on the data.
+
+    Each dataset is laid out like the repository root, so a recommender
+    process started within it finds its files at the usual relative paths:
+
+        <root>/resources/data/movies.csv
+        <root>/resources/data/ratings.csv
+        <root>/resources/models/svd/
+
+"""
+
+# Script dependencies
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from recommenders.svd_engine import SVDScorer
+from recommenders.model_artifact import export_scorer
+
+# Shape of the bundled sample.
+BASE_RATINGS = 100004
+BASE_USERS = 671
+MOVIES_PATH = 'resources/data/movies.csv'
+
+
+def generate(root, scale, n_factors=50, chunk_users=20000, seed=0):
+    """Write a synthetic dataset `scale` times the size of the sample.
+
+    Parameters
+    ----------
+    root : str
+        Directory the dataset is written to.
+    scale : int
+        Multiple of the bundled sample's number of ratings and users.
+    n_factors : int
+        Number of factors of the random SVD model.
+    chunk_users : int
+        Users generated and written per chunk, bounding memory use.
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    str
+        The dataset root.
+
+    """
+    rng = np.random.default_rng(seed)
+    data_dir = os.path.join(root, 'resources', 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    shutil.copyfile(MOVIES_PATH, os.path.join(data_dir, 'movies.csv'))
+    movie_ids = pd.read_csv(MOVIES_PATH, usecols=['movieId'])['movieId'].to_numpy()
+
+    # Zipf movie popularity and a latent quality per movie.
+    popularity = 1.0 / np.arange(1, len(movie_ids) + 1)
+    popularity = rng.permutation(popularity / popularity.sum())
+    quality = rng.normal(0.0, 0.5, len(movie_ids))
+
+    # Long-tailed number of ratings per user, at least 20 like MovieLens.
+    n_users = BASE_USERS * scale
+    activity = rng.lognormal(0.0, 1.0, n_users)
+    counts = np.maximum(20, np.round(activity / activity.sum() * BASE_RATINGS * scale)).astype(np.int64)
+    counts = np.minimum(counts, len(movie_ids))
+    user_bias = rng.normal(0.0, 0.4, n_users)
+
+    path = os.path.join(data_dir, 'ratings.csv')
+    with open(path, 'w') as f:
+        f.write('userId,movieId,rating,timestamp\n')
+        for start in range(0, n_users, chunk_users):
+            users = np.arange(start, min(start + chunk_users, n_users))
+            user_of = np.repeat(users, counts[users])
+            items = rng.choice(len(movie_ids), size=len(user_of), p=popularity)
+            # Drop repeated (user, movie) pairs
+            _, keep = np.unique(user_of * len(movie_ids) + items, return_index=True)
+            user_of, items = user_of[keep], items[keep]
+            rating = 3.5 + user_bias[user_of] + quality[items] + rng.normal(0.0, 0.8, len(items))
+            rating = np.clip(np.round(rating * 2) / 2, 0.5, 5.0)
+            timestamp = rng.integers(789652004, 1537799250, len(items))
+            pd.DataFrame({'userId': user_of + 1, 'movieId': movie_ids[items],
+                          'rating': rating, 'timestamp': timestamp}) \
+                .to_csv(f, header=False, index=False)
+
+    # Random model over the same users and movies.
+    scorer = SVDScorer(rng.normal(0.0, 0.1, (n_users, n_factors)).astype(np.float32),
+                       rng.normal(0.0, 0.1, (len(movie_ids), n_factors)).astype(np.float32),
+                       user_bias.astype(np.float32), quality.astype(np.float32), 3.5,
+                       np.arange(1, n_users + 1), movie_ids)
+    export_scorer(scorer, os.path.join(root, 'resources', 'models', 'svd'),
+                  algorithm='synthetic', scale=scale, seed=seed)
+    return root
+
+
+def ensure_dataset(directory, scale, **kwargs):
+    """Generate the dataset of a scale unless it already exists."""
+    root = os.path.join(directory, f'{scale}x')
+    if not os.path.exists(os.path.join(root, 'resources', 'models', 'svd', 'meta.json')):
+        shutil.rmtree(root, ignore_errors=True)
+        generate(root, scale, **kwargs)
+    return root
@@ -31,20 +31,49 @@ import streamlit as st
 # Data handling dependencies
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
-from sklearn.metrics.pairwise import cosine_similarity
 from PIL import Image
+import logging
 import time
+import os
 
 # Custom Libraries
 from app_functions import *
-from utils.data_loader import load_movie_titles
-from recommenders.collaborative_based import collab_model
-from recommenders.content_based import content_model
+from utils.data_loader import load_movie_titles, load_model_results
+from utils.lazy import timed_import, warm_up
+from utils.instrumentation import debug_enabled, profile_next, recent, stage_totals
+from utils.service_client import remote_model
+collab_model = timed_import('recommenders.collaborative_based').collab_model
+content_model = timed_import('recommenders.content_based').content_model
+hybrid_model = timed_import('recommenders.hybrid_based').hybrid_model
+fallback = timed_import('recommenders.fallback')
+from recommenders import speculative
+from recommenders.catalog import load_catalog
+from recommenders.rating_stats import load_rating_stats
+from utils.title_search import title_index_resource
+
+logger = logging.getLogger(__name__)
 
 # Data Loading
 title_list = load_movie_titles('resources/data/movies.csv')
+title_index = title_index_resource('resources/data/movies.csv', 'resources/data/ratings.csv')
+
+# Ask a running recommendation service (recommenders/service.py) when one
+# is configured, so that the models live in a single long-running process.
+# Otherwise, load the recommender data and models on a background thread,
+# so that the first page is served while they load, and answer requests
+# exceeding their latency budget with a fallback. The data of the fallbacks
+# is loaded first. This only happens once per process.
+service_url = os.environ.get('RECOMMENDER_SERVICE_URL')
+if service_url:
+    content_model = remote_model('content', service_url)
+    collab_model = remote_model('collab', service_url)
+    hybrid_model = remote_model('hybrid', service_url)
+else:
+    content_model = fallback.with_deadline(content_model, 'content')
+    collab_model = fallback.with_deadline(collab_model, 'collab')
+    hybrid_model = fallback.with_deadline(hybrid_model, 'hybrid')
+    warm_up(background=True, first=fallback.RESOURCES)
 
 # App declaration
 def main():
@@ -54,7 +83,7 @@ def main():
     # Create the sidebar and add the logo to it
     logo = Image.open("resources/imgs/logo.png")
     st.sidebar.image(logo, width=200)
-    page_options = ["Recommender System","Solution Overview","Our Team","Analysis and Insights","Model Performance"]
+    page_options = ["Recommender System","Hybrid Recommender","Solution Overview","Our Team","Analysis and Insights","Model Performance"]
 
     # -------------------------------------------------------------------
     # ----------- !! THIS CODE MUST NOT BE ALTERED !! -------------------
@@ -109,6 +138,42 @@ def main():
     # -------------------------------------------------------------------
 
     # ------------- SAFE FOR ALTERING/EXTENSION -------------------
+    # Compute the recommendations of the selected favourites in the
+    # background while the user decides, so that "Recommend" usually finds
+    # them cached. See recommenders/speculative.py
+    if page_selection == "Recommender System":
+        speculative.speculate(content_model if sys == 'Content Based Filtering' else collab_model,
+                              fav_movies, st.session_state)
+
+    if page_selection == "Hybrid Recommender":
+        st.write('# Hybrid Recommender Engine')
+        st.write('### Genre similarity, collaborative filtering and popularity in one ranking')
+        st.image('resources/imgs/Image_header.png',use_column_width=True)
+
+        # User-based preferences, searched within the whole catalogue
+        st.write('### Enter Your Three Favorite Movies')
+        movie_1 = title_selector('First Option',title_index.get(),title_list[14930:15200])
+        movie_2 = title_selector('Second Option',title_index.get(),title_list[25055:25255])
+        movie_3 = title_selector('Third Option',title_index.get(),title_list[21100:21200])
+        fav_movies = [movie_1,movie_2,movie_3]
+        speculative.speculate(hybrid_model, fav_movies, st.session_state)
+
+        if st.button("Recommend"):
+            try:
+                with st.spinner('Crunching the numbers...'):
+                    top_recommendations = hybrid_model(movie_list=fav_movies,
+                                                       top_n=10)
+                st.title("We think you'll like:")
+                for i,j in enumerate(top_recommendations):
+                    st.subheader(str(i+1)+'. '+j)
+            except KeyError:
+                st.error("Oops! One of these movies isn't in our catalogue yet.\
+                          Please pick another one.")
+            except Exception:
+                logger.exception("Hybrid recommender failed")
+                st.error("Oops! Looks like this algorithm does't work.\
+                          We'll need to fix it!")
+
     #define a function for loading css files
     def local_css(file_name):
             with open(file_name) as f:
@@ -427,6 +492,22 @@ def main():
                 according to the year the movies were made
                 """
                 )
+        top_rated=st.checkbox("Top Rated Movies")
+        if top_rated:
+            st.subheader('2.2 Top rated movies')
+            stats = load_rating_stats('resources/data/ratings.csv').frame()
+            catalog = load_catalog('resources/data/movies.csv')
+            stats = stats[stats.index.isin(catalog.movie_ids)]
+            stats = stats.sort_values('bayesian_mean', ascending=False).head(20)
+            stats.insert(0, 'title', [catalog.title(i) for i in stats.index])
+            st.dataframe(stats.round(2))
+            st.markdown(
+                """
+                Movies are ranked by their Bayesian mean rating, which shrinks the average of 
+                rarely rated movies towards the overall mean so that a single 5-star review 
+                doesn't put a movie at the top of the list.
+                """
+                )
     if page_selection == "Model Performance":
         st.title("Model Evaluation")
         st.info(
@@ -493,7 +574,51 @@ def main():
         mean squared error (**RMSE**), which determines the average squared 
         difference between the estimated values and the actual value. A low 
         RMSE value indicates high model accuracy.""")
-        st.image("resources/imgs/model_compare.png",use_column_width=True)
+        # Render the latest benchmark run when there is one, see
+        # resources/models/benchmark_models.py
+        results = load_model_results('resources/models/model_results.json')
+        if results is None:
+            st.image("resources/imgs/model_compare.png",use_column_width=True)
+        else:
+            st.bar_chart(results.set_index('algorithm')['rmse_mean'])
+            st.dataframe(results[['algorithm', 'rmse_mean', 'rmse_std', 'mae_mean',
+                                  'fit_time', 'params']].round(4))
+            st.caption(f"{results.attrs['n_folds']}-fold cross-validation on "
+                       f"{results.attrs['n_ratings']} ratings, run {results.attrs['created']}")
+
+    # Hidden debug panel, only shown when the app runs with RECOMMENDER_DEBUG
+    # set. See utils/instrumentation.py
+    if debug_enabled():
+        with st.sidebar.expander("Debug: request timings"):
+            traces = recent(20)
+            if traces:
+                st.dataframe(pd.DataFrame(
+                    [{'algorithm': t['algorithm'], 'cache': t.get('cache'), 'path': t.get('path'),
+                      'total (ms)': t['seconds'] * 1000,
+                      **{f'{name} (ms)': s['seconds'] * 1000 for name, s in t['stages'].items()}}
+                     for t in traces]).round(2))
+                st.write("Stage totals")
+                st.dataframe(pd.DataFrame(stage_totals()).T)
+            if service_url:
+                st.write(f"Recommendations served by {service_url}")
+            else:
+                st.write("Result caches")
+                st.dataframe(pd.DataFrame({'content': content_model.cache.stats(),
+                                           'collab': collab_model.cache.stats(),
+                                           'hybrid': hybrid_model.cache.stats()}))
+                st.write("Speculative jobs")
+                st.dataframe(pd.DataFrame([speculative.stats()]))
+                deadlines = fallback.stats.snapshot()
+                if deadlines:
+                    st.write(f"Serving tiers ({fallback.DEFAULT_BUDGET * 1000:.0f} ms budget)")
+                    st.dataframe(pd.DataFrame(
+                        {algorithm: {**s['tiers'], **{k: v for k, v in s.items() if k != 'tiers'}}
+                         for algorithm, s in deadlines.items()}))
+            if st.button("Profile next request"):
+                profile_next()
+            profiles = [t['profile'] for t in traces if 'profile' in t]
+            if profiles:
+                st.caption(f"Last cProfile dump: {profiles[0]}")
 
 
 
@@ -0,0 +1,290 @@
+"""
+
+    Offline batch recommendations.
+
+    Author: Explore Data Science Academy.
+
+    Description: Scores large files of favourite-movie lists outside of
+    the app. Requests are read lazily and grouped into blocks; every block
+    is scored on a worker process, with the work shared by its requests
+    done once per block:
+
+        content   the genre bitmasks of all favourites are compared with
+                  the whole catalogue in one batched Jaccard computation
+        collab    every app user is folded into the SVD model and the
+                  catalogue is scored for the whole block in one product
+        hybrid    the candidate pool is scored for the whole block at once
+                  (see `recommenders/hybrid_based.py`)
+
+    Repeated favourite lists within a block are scored once. Requests that
+    the collaborative batch path can't answer (favourites unknown to the
+    model, or covered by the item neighbour lists) are answered by
+    `collab_model` itself, and requests covered by the content neighbour
+    lists by `content_model`, so every result matches the app's.
+
+    Results are streamed as JSON lines in the order blocks finish, each
+    carrying the id of its request. At most two blocks per worker are in
+    flight, so memory stays bounded whatever the size of the input.
+
+    Input is either a CSV file, with an optional `id` column and the
+    favourite titles in the remaining columns, or a JSONL file of lists of
+    titles or of objects with `movies` and an optional `id`.
+
+    Usage (from the repository root):
+
+        python -m recommenders.batch favourites.csv recommendations.jsonl \\
+            --algorithm content collab --workers 4
+
+"""
+
+# Script dependencies
+import os
+import sys
+import csv
+import json
+import time
+import inspect
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from recommenders import content_based, collaborative_based, hybrid_based
+from recommenders.svd_engine import top_k
+
+ALGORITHMS = ('content', 'collab', 'hybrid')
+
+
+def read_requests(path):
+    """Lazily read favourite-movie requests from a CSV or JSONL file.
+
+    Yields
+    ------
+    tuple (object, list (str))
+        Request id (the line number when the file has none) and titles of
+        the favourite movies.
+
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                request_id = row.pop('id', None) or number
+                yield request_id, [title for title in row.values() if title]
+        else:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                if isinstance(request, dict):
+                    yield request.get('id', number), list(request['movies'])
+                else:
+                    yield number, list(request)
+
+
+def _content_block(lists, top_n):
+    """Content-based recommendations for unique favourite lists."""
+    movies = content_based.catalog.get()
+    index = content_based.neighbours.get()
+    single = inspect.unwrap(content_based.content_model)
+
+    # Favourites covered by the content neighbour lists merge their rows
+    results = [None] * len(lists)
+    if index is not None:
+        for row, titles in enumerate(lists):
+            if index.covers(movies.resolve_many(titles)):
+                results[row] = single(titles, top_n)
+    scored = [row for row, result in enumerate(results) if result is None]
+    if not scored:
+        return results
+
+    genres = content_based.genre_index.get()
+    mean_rating = content_based.rating_stats.get().column('bayesian_mean', movies.movie_ids)
+    queries = np.stack([genres.union(movies.positions(movies.resolve_many(lists[row])))
+                        for row in scored])
+    score = genres.jaccard(queries)
+    score += content_based.RATING_TIE_BREAK * mean_rating
+    for block_row, row in enumerate(scored):
+        ids = [i for title in lists[row] for i in movies.all_ids(title)]
+        score[block_row, movies.positions(ids)] = np.nan
+    score[np.isnan(score)] = -np.inf
+
+    best = top_k(score, top_n, axis=1)
+    for block_row, row in enumerate(scored):
+        results[row] = [movies.titles[i] for i in best[block_row]
+                        if np.isfinite(score[block_row, i])]
+    return results
+
+
+def _collab_block(lists, top_n):
+    """Collaborative recommendations for unique favourite lists."""
+    movies = collaborative_based.catalog.get()
+    svd = collaborative_based.model.get()
+    index = collaborative_based.neighbours.get()
+    single = inspect.unwrap(collaborative_based.collab_model)
+
+    results = [None] * len(lists)
+    folded, favourites = [], []
+    for row, titles in enumerate(lists):
+        mov_ids = movies.resolve_many(titles)
+        ids = [i for title in titles for i in movies.all_ids(title)]
+        if (index is not None and index.covers(mov_ids)) or not (svd.item_index(ids) >= 0).any():
+            results[row] = single(titles, top_n)
+        else:
+            folded.append(row)
+            favourites.append(ids)
+    if not folded:
+        return results
+
+    # Fold every app user in, then score the catalogue for all at once
+    rating = collaborative_based.favourite_rating(svd)
+    pu, bu = zip(*(svd.fold_in(ids, [rating] * len(ids)) for ids in favourites))
+    scores = svd.score_items(np.stack(pu), np.array(bu))
+    scores[:, ~collaborative_based.catalog_items.get()] = -np.inf
+    for row, ids in enumerate(favourites):
+        known = svd.item_index(ids)
+        scores[row, known[known >= 0]] = -np.inf
+
+    best = top_k(scores, top_n, axis=1)
+    for row, result_row in enumerate(folded):
+        keep = best[row][np.isfinite(scores[row, best[row]])]
+        results[result_row] = [movies.title(i) for i in svd.item_ids[keep].tolist()]
+    return results
+
+
+def _hybrid_block(lists, top_n):
+    """Hybrid recommendations for unique favourite lists."""
+    movies = hybrid_based.catalog.get()
+    pool = hybrid_based.candidate_pool.get()
+    score = hybrid_based.score_candidates(lists)
+    best = top_k(score, top_n, axis=1)
+    return [[movies.title(i) for i in pool.movie_ids[best[row][np.isfinite(score[row, best[row]])]]
+             .tolist()] for row in range(len(lists))]
+
+
+BLOCKS = {'content': _content_block, 'collab': _collab_block, 'hybrid': _hybrid_block}
+
+
+def score_block(algorithm, requests, top_n=10):
+    """Score a block of requests with one algorithm.
+
+    Parameters
+    ----------
+    algorithm : str
+        'content', 'collab' or 'hybrid'.
+    requests : list (tuple)
+        (request id, favourite titles) pairs.
+    top_n : int
+        Number of recommendations per request.
+
+    Returns
+    -------
+    list (dict)
+        One result per request, with an `error` instead of
+        `recommendations` when its titles aren't in the catalogue.
+
+    """
+    catalog = content_based.catalog.get()
+    results, unique = [], {}
+    for request_id, titles in requests:
+        result = {'id': request_id, 'algorithm': algorithm, 'movies': titles}
+        missing = [title for title in titles if title not in catalog.title_to_id]
+        if missing or not titles:
+            result['error'] = f"Movie titles not found in catalogue: {missing}"
+        else:
+            unique.setdefault(tuple(sorted(titles)), titles)
+        results.append(result)
+
+    keys = list(unique)
+    score = BLOCKS[algorithm]
+    recommended = dict(zip(keys, score([unique[key] for key in keys], top_n))) if keys else {}
+    for result in results:
+        if 'error' not in result:
+            result['recommendations'] = recommended[tuple(sorted(result['movies']))]
+    return results
+
+
+def _blocks(requests, algorithms, block_size):
+    requests = iter(requests)
+    while True:
+        block = list(itertools.islice(requests, block_size))
+        if not block:
+            return
+        for algorithm in algorithms:
+            yield algorithm, block
+
+
+def run(input_path, output, algorithms=ALGORITHMS, top_n=10, block_size=256, workers=None):
+    """Score every request of a file and stream the results as JSONL.
+
+    Parameters
+    ----------
+    input_path : str
+        CSV or JSONL file of requests, see `read_requests`.
+    output : file
+        Writable text file the JSON lines are written to.
+    algorithms : list (str)
+        Algorithms every request is scored with.
+    top_n : int
+        Number of recommendations per request.
+    block_size : int
+        Requests scored together by a worker.
+    workers : int
+        Worker processes, one per core by default.
+
+    Returns
+    -------
+    dict
+        Number of requests and results, wall time and throughput.
+
+    """
+    workers = workers or os.cpu_count()
+    n_results = n_requests = 0
+    start = time.perf_counter()
+
+    def write(futures):
+        nonlocal n_results
+        for future in futures:
+            for result in future.result():
+                output.write(json.dumps(result) + '\n')
+                n_results += 1
+        elapsed = time.perf_counter() - start
+        print(f"{n_results} results in {elapsed:.1f}s ({n_results / elapsed:.0f} req/s)",
+              file=sys.stderr)
+
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for algorithm, block in _blocks(read_requests(input_path), algorithms, block_size):
+            if algorithm == algorithms[0]:
+                n_requests += len(block)
+            pending.add(pool.submit(score_block, algorithm, block, top_n))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write(done)
+        write(pending)
+
+    elapsed = time.perf_counter() - start
+    return {'requests': n_requests, 'results': n_results, 'seconds': elapsed,
+            'requests_per_second': n_results / elapsed if elapsed else 0.0}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='CSV or JSONL file of favourite movies')
+    parser.add_argument('output', help="JSONL file the recommendations are written to, '-' for stdout")
+    parser.add_argument('--algorithm', nargs='+', choices=ALGORITHMS, default=['content'],
+                        dest='algorithms')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--block-size', type=int, default=256, help='requests scored together')
+    parser.add_argument('--workers', type=int, help='worker processes, one per core by default')
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        summary = run(args.input, output, algorithms=args.algorithms, top_n=args.top_n,
+                      block_size=args.block_size, workers=args.workers)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Scored {summary['requests']} requests ({summary['results']} results) in "
+          f"{summary['seconds']:.1f}s: {summary['requests_per_second']:.0f} req/s", file=sys.stderr)
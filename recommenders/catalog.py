@@ -0,0 +1,146 @@
+"""
+
+    Shared in-memory movie catalogue.
+
+    Author: Explore Data Science Academy.
+
+    Description: The content and collaborative recommenders both need to
+    turn the titles chosen in the app into MovieLens ids, and to look up
+    the genres and release year of candidate movies. Scanning the full
+    `movies` frame with a boolean mask for every title is linear in the
+    size of the catalogue, so the catalogue is parsed once into hashed
+    indexes that answer these lookups in constant time.
+
+    Duplicate titles: a handful of titles appear more than once within
+    `movies.csv` under different movie ids. The app only ever supplies a
+    title, so these are resolved deterministically to the first occurrence
+    within the file. The remaining ids are kept in `MovieCatalog.duplicates`
+    so that callers can inspect them when needed.
+
+"""
+
+# Script dependencies
+import numpy as np
+from utils.data_cache import load_movies
+from utils.lazy import shared_resource
+
+# Release years are given as a '(yyyy)' suffix on the title.
+YEAR_PATTERN = r'\((\d{4})\)\s*$'
+
+
+class MovieCatalog:
+    """Hashed indexes over the movie database.
+
+    Parameters
+    ----------
+    movies : Pandas Dataframe
+        Movie records with `movieId`, `title` and `genres` columns, as
+        loaded by `load_movies`.
+
+    """
+
+    def __init__(self, movies):
+        movies = movies.dropna()
+        # Rows of the catalogue within the movies file, to align arrays
+        # cached per file row (e.g. genre bitmasks) with the catalogue
+        self.rows = movies.index.to_numpy()
+        movies = movies.reset_index(drop=True)
+
+        self.movie_ids = movies['movieId'].to_numpy()
+        self.titles = movies['title'].to_numpy()
+        # One genre list per distinct combination, shared by its movies
+        genres = movies['genres'].astype('category').cat
+        combinations = [str(genre).split('|') for genre in genres.categories]
+        self.genres = [combinations[code] for code in genres.codes.tolist()]
+        self.years = (movies['title'].str.extract(YEAR_PATTERN)[0]
+                      .astype(float).to_numpy())
+
+        # movieId -> row position within the catalogue arrays.
+        self.id_to_pos = dict(zip(self.movie_ids.tolist(), range(len(movies))))
+
+        # title -> movieId, first occurrence wins for duplicated titles.
+        self.title_to_id = {}
+        self.duplicates = {}
+        for title, movie_id in zip(self.titles, self.movie_ids.tolist()):
+            if title in self.title_to_id:
+                self.duplicates.setdefault(title, [self.title_to_id[title]])
+                self.duplicates[title].append(movie_id)
+            else:
+                self.title_to_id[title] = movie_id
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __contains__(self, title):
+        return title in self.title_to_id
+
+    def resolve(self, title):
+        """Map a movie title to its MovieLens id.
+
+        Parameters
+        ----------
+        title : str
+            Movie title as listed within the catalogue.
+
+        Returns
+        -------
+        int
+            Movie ID. Duplicated titles resolve to their first occurrence.
+
+        """
+        try:
+            return self.title_to_id[title]
+        except KeyError:
+            raise KeyError(f"Movie title not found in catalogue: {title!r}") from None
+
+    def resolve_many(self, titles):
+        """Map a list of movie titles to their MovieLens ids."""
+        return [self.resolve(title) for title in titles]
+
+    def all_ids(self, title):
+        """Every movie id listed under a title, including duplicates."""
+        return self.duplicates.get(title, [self.resolve(title)])
+
+    def position(self, movie_id):
+        """Row position of a movie id within the catalogue arrays."""
+        return self.id_to_pos[movie_id]
+
+    def positions(self, movie_ids):
+        """Row positions of several movie ids, skipping unknown ids."""
+        return np.array([self.id_to_pos[i] for i in movie_ids if i in self.id_to_pos],
+                        dtype=np.int64)
+
+    def title(self, movie_id):
+        """Title of a movie id."""
+        return self.titles[self.id_to_pos[movie_id]]
+
+    def genres_of(self, movie_id):
+        """Genre list of a movie id."""
+        return self.genres[self.id_to_pos[movie_id]]
+
+    def year_of(self, movie_id):
+        """Release year of a movie id, or NaN when the title carries none."""
+        return self.years[self.id_to_pos[movie_id]]
+
+
+def catalog_resource(path_to_movies='resources/data/movies.csv'):
+    """Lazily built catalogue of a movies file, shared process-wide."""
+    return shared_resource(f'catalog:{path_to_movies}',
+                           lambda: MovieCatalog(load_movies(path_to_movies)))
+
+def load_catalog(path_to_movies='resources/data/movies.csv'):
+    """Build the movie catalogue once per process and share it.
+
+    Parameters
+    ----------
+    path_to_movies : str
+        Relative or absolute path to movie database stored
+        in .csv format.
+
+    Returns
+    -------
+    MovieCatalog
+        Catalogue shared by every caller requesting the same path.
+
+    """
+    return catalog_resource(path_to_movies).get()
@@ -28,47 +28,130 @@
 """
 
 # Script dependencies
-import pandas as pd
+import os
 import numpy as np
-import pickle
-import copy
-from surprise import Reader, Dataset
-from surprise import SVD, NormalPredictor, BaselineOnly, KNNBasic, NMF
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from recommenders.catalog import catalog_resource
+from recommenders.model_artifact import load_artifact, convert_pickle
+from recommenders.item_neighbours import load_index
+from recommenders.svd_engine import top_k
+from recommenders.ingest import ingest_resource
+from recommenders.rating_stats import rating_stats_resource
+from utils.data_cache import load_ratings
+from utils.instrumentation import instrumented, stage, annotate
+from utils.lazy import shared_resource
+from utils.result_cache import artifact_version, cached_recommender
+
+MOVIES_PATH = 'resources/data/movies.csv'
+RATINGS_PATH = 'resources/data/ratings.csv'
+MODEL_PATH = 'resources/models/svd'
+LEGACY_MODEL_PATH = 'resources/models/svd_test4.pkl'
+NEIGHBOURS_PATH = 'resources/models/item_neighbours'
+# Ratings a movie needs before it is recommended from the neighbour lists;
+# the factors of rarely rated movies are mostly noise.
+MIN_NEIGHBOUR_SUPPORT = 10
+
+# Importing data. Every resource below is loaded on first use and then
+# shared by all app sessions of the process.
+catalog = catalog_resource(MOVIES_PATH)
+rating_stats = rating_stats_resource(RATINGS_PATH)
+ratings_df = shared_resource(
+    'collab:ratings',
+    lambda: load_ratings(RATINGS_PATH, columns=['userId', 'movieId', 'rating'], encoded=True))
+rating_matrix = shared_resource(
+    'collab:rating matrix', lambda: ingest_resource(RATINGS_PATH).get()[1])
+
+def _load_model():
+    # We make use of an SVD model trained on a subset of the MovieLens 10k dataset,
+    # exported as a memory-mapped artifact by train_colbased.py. A legacy
+    # pickled model is converted once.
+    if not os.path.exists(os.path.join(MODEL_PATH, 'meta.json')) \
+            and os.path.exists(LEGACY_MODEL_PATH):
+        convert_pickle(LEGACY_MODEL_PATH, MODEL_PATH)
+    return load_artifact(MODEL_PATH)
+
+model = shared_resource('collab:svd model', _load_model)
+
+# Factor arrays of the model, restricted to the users we hold ratings for.
+scorer = shared_resource(
+    'collab:svd scorer',
+    lambda: model.get().subset_users(ratings_df.get()['userId'].unique()))
+
+# Which of the model's items are listed within the movie catalogue.
+catalog_items = shared_resource(
+    'collab:catalog items',
+    lambda: np.isin(model.get().item_ids, catalog.get().movie_ids))
+
+# Item-item neighbour lists, when built with build_item_neighbours.py.
+neighbours = shared_resource('collab:item neighbours',
+                             lambda: load_index(NEIGHBOURS_PATH, model.get().version))
+
+# Version of the model artifacts, reloading them when they are replaced.
+model_version = artifact_version([os.path.join(MODEL_PATH, 'meta.json'),
+                                  os.path.join(NEIGHBOURS_PATH, 'index.json')],
+                                 [model, scorer, catalog_items, neighbours])
+
+def favourite_rating(svd):
+    """Rating the app user is assumed to give each of their favourite movies.
+
+    The top of the ratings the model was trained on, 5 stars, including for
+    models trained on implicit feedback, which take ratings as confidences
+    (see `recommenders/als.py`) while estimating preferences in [0, 1].
 
-# Importing data
-movies_df = pd.read_csv('resources/data/movies.csv',sep = ',')
-ratings_df = pd.read_csv('resources/data/ratings.csv')
-ratings_df.drop(['timestamp'], axis=1,inplace=True)
+    """
+    return svd.input_scale[1]
 
-# We make use of an SVD model trained on a subset of the MovieLens 10k dataset.
-model=pickle.load(open('resources/models/svd_test4.pkl', 'rb'))
+def fold_in_movies(mov_ids, top_n=10):
+    """Recommend movies by folding the app user into the SVD model.
 
-def prediction_item(item_id):
-    """Map a given favourite movie to users within the
-       MovieLens dataset with the same preference.
+    The user's latent vector is fitted on their favourites, each rated
+    `favourite_rating`, and the whole catalogue is scored in one product.
 
     Parameters
     ----------
-    item_id : int
-        A MovieLens Movie ID.
+    mov_ids : list (int)
+        Movie ids of the favourites, including duplicated titles.
+    top_n : int
+        Number of movies to return.
 
     Returns
     -------
-    list
-        User IDs of users with similar high ratings for the given movie.
+    list (int)
+        Movie ids with the highest estimated rating.
 
     """
-    # Data preprosessing
-    reader = Reader(rating_scale=(0, 5))
-    load_df = Dataset.load_from_df(ratings_df,reader)
-    a_train = load_df.build_full_trainset()
+    svd = model.get()
+    with stage('fold in'):
+        pu, bu = svd.fold_in(mov_ids, [favourite_rating(svd)] * len(mov_ids))
+    with stage('prediction'):
+        scores = svd.score_items(pu, bu)
+    with stage('ranking'):
+        scores[~catalog_items.get()] = -np.inf
+        favourites = svd.item_index(mov_ids)
+        scores[favourites[favourites >= 0]] = -np.inf
+        best = top_k(scores, top_n)
+    return svd.item_ids[best[np.isfinite(scores[best])]].tolist()
+
+def record_ratings(user_ids, movie_ids, ratings):
+    """Fold new ratings from real users into the live model.
+
+    The user factors are updated incrementally (see `SVDScorer.add_ratings`),
+    as are the per-movie rating statistics, so recommendations reflect the
+    new ratings before the next full retrain. The content and hybrid
+    results cached against the previous statistics are invalidated by the
+    bumped `RatingStats.revision`.
+
+    Parameters
+    ----------
+    user_ids, movie_ids : list (int)
+        User and movie id of every new rating.
+    ratings : list (float)
+        New rating values.
 
-    predictions = []
-    for ui in a_train.all_users():
-        predictions.append(model.predict(iid=item_id,uid=ui, verbose = False))
-    return predictions
+    """
+    model.get().add_ratings(user_ids, movie_ids, ratings)
+    rating_stats.get().add_ratings(movie_ids, ratings)
+    scorer.reset()
+    collab_model.cache.clear()
 
 def pred_movies(movie_list):
     """Maps the given favourite movies selected within the app to corresponding
@@ -89,26 +172,20 @@ def pred_movies(movie_list):
     id_store=[]
 
     # Store movie_ids
-    mov_ids = []
-
-    # iterate over the movie list
-    for movie in movie_list:
-        # append the id from the movies_df to the list
-        mov_ids.append(int(movies_df['movieId'][movies_df['title'] == movie]))
-    # For each movie selected by a user of the app,
-    # predict a corresponding user within the dataset with the highest rating
-    for i in mov_ids:
-        predictions = prediction_item(item_id=i)
-        predictions.sort(key=lambda x: x.est, reverse=True)
-        # Take the top 10 user id's from each movie with highest rankings
-        for pred in predictions[:10]:
-            id_store.append(pred.uid)
+    mov_ids = catalog.get().resolve_many(movie_list)
+    # For each movie selected by a user of the app, score every user
+    # within the dataset in a single pass and keep the 10 highest ratings
+    top_users = scorer.get().top_users(mov_ids, k=10)
+    for column in top_users.T:
+        id_store.extend(column.tolist())
 
     return id_store
 
 
 # !! DO NOT CHANGE THIS FUNCTION SIGNATURE !!
 # You are, however, encouraged to change its content.
+@instrumented('collab')
+@cached_recommender('collab', lambda movies: catalog.get().resolve_many(movies), model_version)
 def collab_model(movie_list, top_n=10):
     """Performs Collaborative filtering based upon a list of movies supplied
        by the app user.
@@ -124,67 +201,55 @@ def collab_model(movie_list, top_n=10):
         Titles of the top-n movie recommendations to the user.
     """
 
+    movies = catalog.get()
+
     # store the movie ids
-    mov_ids = []
-
-    # iterate over the movie list
-    for movie in movie_list:
-        # append the movie id from the movies_df to the list
-        mov_ids.append(int(movies_df['movieId'][movies_df['title'] == movie]))
-
-    # store predicted similar users
-    user_ids = pred_movies(movie_list)
-
-    # generate a df with the ratings of similar users
-    df_init_users = ratings_df[ratings_df['userId'].isin(user_ids)]
-    # merge the df to obtain the movie titles
-    df_init_users = pd.merge(df_init_users, movies_df, on="movieId", how="inner")
-    # drop the genres column
-    df_init_users.drop('genres', inplace=True, axis=1)
-
-    # create dictionary to create a new user with the ratings
-    user_row1 = {'userId': 500000, 'movieId': mov_ids[0], 'title': movie_list[0], 'rating': 5.0}
-    user_row2 = {'userId': 500000, 'movieId': mov_ids[1], 'title': movie_list[1], 'rating': 5.0}
-    user_row3 = {'userId': 500000, 'movieId': mov_ids[2], 'title': movie_list[2], 'rating': 5.0}
-    # append the new ratings as observations
-    df_init_users = df_init_users.append([user_row1,
-                                          user_row2,
-                                          user_row3],
-                                         ignore_index=True)
-
-    # pivot the similar users to have unique rows
-    user_pivot = pd.pivot_table(df_init_users,
-                                values='rating',
-                                columns='title',
-                                index='userId')
-
-    # fill the nulls with 0
-    user_pivot = user_pivot.fillna(0)
-    # obtain the correlation matrix
-    corr_movie_df = user_pivot.corr(method='pearson')
-
-    # create a new dataframe
-    movie_sim_df = pd.DataFrame()
-    # iterate over the movie list
-    for movie in movie_list:
-        # calculate the similarity score
-        high_score = corr_movie_df[movie] * 5
-        # sort the value with the highest score at the top
-        high_score = high_score.sort_values(ascending=False)
-        # append the sorted scores to the dataframe
-        movie_sim_df = movie_sim_df.append(high_score,
-                                           ignore_index=True)
+    with stage('title lookup'):
+        mov_ids = movies.resolve_many(movie_list)
+        favourites = [i for title in movie_list for i in movies.all_ids(title)]
+
+    # merge the precomputed neighbour lists of the favourites when available,
+    # keeping movies with enough ratings
+    index = neighbours.get()
+    if index is not None and index.covers(mov_ids):
+        with stage('neighbour lists'):
+            candidates = np.array(index.recommend(mov_ids, None), dtype=np.int64)
+            support = rating_stats.get().column('count', candidates)
+            titles = [movies.title(i) for i in candidates[support >= MIN_NEIGHBOUR_SUPPORT].tolist()
+                      if i in movies.id_to_pos]
+            recommended = [t for t in titles if t not in movie_list]
+        if len(recommended) >= top_n:
+            annotate(path='neighbours')
+            return recommended[:top_n]
+
+    # fold the app user into the SVD model and score the whole catalogue
+    if (model.get().item_index(favourites) >= 0).any():
+        annotate(path='fold in')
+        return [movies.title(i) for i in fold_in_movies(favourites, top_n)]
+
+    # otherwise, store predicted similar users
+    annotate(path='similar users')
+    with stage('similar users'):
+        user_ids = pred_movies(movie_list)
+
+    # correlate the favourites with every movie rated by the similar users,
+    # adding the app user as a new user rating each favourite 5.0
+    with stage('pivot/corr'):
+        candidates, corr = rating_matrix.get().pearson(user_ids, mov_ids, pseudo_rating=5.0)
+
+    # calculate the cumulative similarity score for each movie,
+    # breaking ties on the (shrunk) mean rating
+    scores = np.nansum(corr * 5, axis=1)
+    mean_rating = np.nan_to_num(rating_stats.get().column('bayesian_mean', candidates))
 
     # store the movie titles recommended
     all_movies_recommended = []
-
-    # calculate the cumulative score for each movie in the df
-    for mov in movie_sim_df.sum().sort_values(ascending=False).index:
-        if mov in movie_list:
-            pass
-        else:
+    with stage('ranking'):
+        ranked = candidates[np.lexsort((-mean_rating, -scores))]
+    for mov in ranked:
+        if mov in movies.id_to_pos and movies.title(mov) not in movie_list:
             # append the movie title on the list
-            all_movies_recommended.append(mov)
+            all_movies_recommended.append(movies.title(mov))
     # get the top n movies
     recommended_movies = all_movies_recommended[:top_n]
     # return the recommended movies
@@ -29,40 +29,66 @@
 
 # Script dependencies
 import os
-import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
-
-# Importing data
-movies = pd.read_csv('resources/data/movies.csv', sep = ',')
-ratings = pd.read_csv('resources/data/ratings.csv')
-movies.dropna(inplace=True)
-
-def data_preprocessing(data):
-    """Prepare data for use within Content filtering algorithm.
-
-    Parameters
-    ----------
-    subset_size : int
-        Number of movies to use within the algorithm.
-
-    Returns
-    -------
-    Pandas Dataframe
-        Subset of movies selected for content-based filtering.
-
-    """
-    movies = data.copy()
-    # Separate genre using a ',' instead of '|'.
-    movies['bag_of_words'] = movies['genres'].str.replace('|', ' ')
-
-    movies['genres'] = movies['genres'].apply(str).apply(lambda x: x.split('|'))
-    return movies
+from recommenders.catalog import catalog_resource
+from recommenders.genre_engine import GenreIndex
+from recommenders.ingest import ingest_resource
+from recommenders.item_neighbours import load_index
+from recommenders.rating_stats import rating_stats_resource
+from recommenders.svd_engine import top_k
+from utils.instrumentation import instrumented, stage, annotate
+from utils.lazy import shared_resource
+from utils.data_cache import load_genre_masks
+from utils.result_cache import artifact_version, cached_recommender
+
+MOVIES_PATH = 'resources/data/movies.csv'
+RATINGS_PATH = 'resources/data/ratings.csv'
+NEIGHBOURS_PATH = 'resources/models/content_neighbours'
+
+# Importing data. Every resource below is loaded on first use and then
+# shared by all app sessions of the process.
+catalog = catalog_resource(MOVIES_PATH)
+rating_stats = rating_stats_resource(RATINGS_PATH)
+ratings_ingest = ingest_resource(RATINGS_PATH)
+
+def _genre_index():
+    # The bitmasks cached with the movies file are shared by every
+    # process; only catalogues missing some file rows need a copy.
+    vocabulary, masks = load_genre_masks(MOVIES_PATH)
+    rows = catalog.get().rows
+    if len(rows) != len(masks):
+        masks = masks[rows]
+    return GenreIndex.from_masks(vocabulary, masks)
+
+# Genre bitmasks of every movie, in catalogue order.
+genre_index = shared_resource('content:genre index', _genre_index)
+
+# Content neighbour lists, when built with build_content_neighbours.py.
+neighbours = shared_resource('content:neighbours', lambda: load_index(NEIGHBOURS_PATH))
+
+# Version of the data files, reloading them when they are replaced.
+data_version = artifact_version([MOVIES_PATH, RATINGS_PATH,
+                                 os.path.join(NEIGHBOURS_PATH, 'index.json')],
+                                [catalog, ratings_ingest, rating_stats, genre_index, neighbours])
+
+def stats_revision():
+    """Revision of the shared rating statistics, bumped by live ratings."""
+    # Not loaded yet means no live ratings were merged, and checking it
+    # must not block a request on loading the ratings.
+    return rating_stats.get().revision if rating_stats.loaded else 0
+
+def content_version():
+    return (data_version(), stats_revision())
+
+# Weight of the mean rating within the ranking score. Distinct Jaccard
+# similarities differ by more than 1/400, so a 5 star mean scaled by this
+# weight only ever breaks ties between equally similar movies.
+RATING_TIE_BREAK = 1e-4
 
 # !! DO NOT CHANGE THIS FUNCTION SIGNATURE !!
 # You are, however, encouraged to change its content.  
+@instrumented('content')
+@cached_recommender('content', lambda movies: catalog.get().resolve_many(movies), content_version)
 def content_model(movie_list,top_n=10):
     """Performs Content filtering based upon a list of movies supplied
        by the app user.
@@ -80,32 +106,42 @@ def content_model(movie_list,top_n=10):
         Titles of the top-n movie recommendations to the user.
 
     """
-    # global movies
-    # removing the favorite movie list
-    movies_df = data_preprocessing(movies)
-    genre_list = []
-    for i in movie_list:
-        genre_list.append(list(movies_df[movies_df['title'] == i]['genres'])[0])
-
-    # instantiate the multilabelbinarizer for sparsity
-    mlb = MultiLabelBinarizer()
-    mlb.fit_transform(genre_list)
-    genre_list = mlb.classes_
-    movies_df = movies_df[~movies_df['title'].isin(movie_list)]  # remove selected movies
-    movie_genre = movies_df
-
-    # looping over genres for similarity
-    for i in genre_list:
-
-        movie_genre = movie_genre[movie_genre['bag_of_words'].str.contains(i)]
-
-        if len(movie_genre) <= top_n:
-            break
-
-        movie_genre_2 = movie_genre
-
-    movie_rating = ratings[ratings['movieId'].isin(movie_genre_2['movieId'].values)][['movieId', 'rating']]
-
-    top_movies = (movie_rating.groupby(['movieId']).mean().reset_index()).sort_values('rating', ascending=False)[:top_n]
-
-    return list((movies_df[movies_df['movieId'].isin(top_movies['movieId'].values)]['title']).values)
\ No newline at end of file
+    movies = catalog.get()
+
+    with stage('title lookup'):
+        mov_ids = movies.resolve_many(movie_list)
+        selected_ids = [i for title in movie_list for i in movies.all_ids(title)]
+        favourites = movies.positions(mov_ids)
+        selected = movies.positions(selected_ids)
+
+    # merge the precomputed neighbour lists of the favourites when available,
+    # keeping movies with at least one rating
+    index = neighbours.get()
+    if index is not None and index.covers(mov_ids):
+        with stage('neighbour lists'):
+            candidates = np.array(index.recommend(selected_ids, None), dtype=np.int64)
+            rated = np.isfinite(rating_stats.get().column('bayesian_mean', candidates))
+            recommended = [i for i in candidates[rated].tolist() if i in movies.id_to_pos]
+        if len(recommended) >= top_n:
+            annotate(path='neighbours')
+            return [movies.title(i) for i in recommended[:top_n]]
+
+    # otherwise, score the combined genres of the favourite movies
+    annotate(path='genre similarity')
+    genres = genre_index.get()
+    query = genres.union(favourites)
+
+    # genre similarity of every movie, ties broken by (shrunk) mean rating
+    with stage('genre similarity'):
+        similarity = genres.jaccard(query)
+    with stage('rating lookup'):
+        mean_rating = rating_stats.get().column('bayesian_mean', movies.movie_ids)
+    score = similarity + RATING_TIE_BREAK * mean_rating
+
+    # remove the selected movies and movies without any rating
+    with stage('ranking'):
+        score[selected] = np.nan
+        score[np.isnan(score)] = -np.inf
+        top_movies = top_k(score, top_n)
+        top_movies = top_movies[np.isfinite(score[top_movies])]
+    return [movies.titles[i] for i in top_movies]
@@ -0,0 +1,220 @@
+"""
+
+    Precomputed content neighbours of every movie.
+
+    Author: Explore Data Science Academy.
+
+    Description: Every movie is described by a bag of tokens: its genres,
+    the words of its title (English stop words removed) and its release
+    year and decade. The bags are counted by a `CountVectorizer` over a
+    fixed vocabulary, each kind of token weighted by `FEATURE_WEIGHTS`,
+    and the top-K most similar movies of every movie (`cosine_similarity`
+    of the weighted counts) are stored in the compact, memory-mapped
+    layout of `recommenders/item_neighbours.py`, with float16 scores. At
+    request time `content_model` merges the rows of the favourites instead
+    of scoring the whole catalogue.
+
+    No weight depends on the other movies (there is no IDF), so a movie's
+    vector only changes with its own title, genres or year. The build is
+    therefore incremental: the vocabulary of the previous build is kept,
+    new tokens being appended to it, and a hash of every movie's tokens is
+    stored with the index. Only the movies missing from the previous index
+    or whose hash changed, plus those listing an edited movie, are scored
+    against the catalogue; the other lists are merged with the new and
+    edited movies. The new index, vocabulary and hashes are written
+    together to a staging directory swapped in place of the previous
+    index, so an interrupted build never leaves a mix of both for the next
+    one to reuse. The index is built offline with
+    `resources/models/build_content_neighbours.py`.
+
+"""
+
+# Script dependencies
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+from sklearn.metrics.pairwise import cosine_similarity
+from recommenders.catalog import YEAR_PATTERN
+from recommenders.item_neighbours import _blocked_topk, _merge_topk, load_index, save_index
+
+# Weight of every kind of token within the movie vectors.
+FEATURE_WEIGHTS = {'genre': 1.0, 'title': 1.0, 'year': 0.5, 'decade': 0.5}
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def movie_tokens(title, genres, year):
+    """Tokens describing a movie, prefixed by their kind.
+
+    Parameters
+    ----------
+    title : str
+        Title as listed within the catalogue, year included.
+    genres : list (str)
+        Genres of the movie.
+    year : float
+        Release year, NaN when unknown.
+
+    Returns
+    -------
+    list (str)
+        e.g. ['genre:comedy', 'title:toy', 'title:story', 'year:1995',
+        'decade:1990'].
+
+    """
+    tokens = [f'genre:{genre.lower()}' for genre in genres if genre != '(no genres listed)']
+    words = _WORD.findall(re.sub(YEAR_PATTERN, '', title).lower())
+    tokens += [f'title:{word}' for word in words if word not in ENGLISH_STOP_WORDS]
+    if np.isfinite(year):
+        tokens += [f'year:{int(year)}', f'decade:{int(year) // 10 * 10}']
+    return tokens
+
+
+def movie_documents(movies):
+    """Token lists of every movie of a catalogue, in catalogue order."""
+    return [movie_tokens(title, genres, year)
+            for title, genres, year in zip(movies.titles, movies.genres, movies.years)]
+
+
+def token_hashes(documents):
+    """64-bit hash of the token list of every document."""
+    return np.array([int.from_bytes(hashlib.blake2b(' '.join(tokens).encode(),
+                                                    digest_size=8).digest(), 'little')
+                     for tokens in documents], dtype=np.uint64)
+
+
+def extend_vocabulary(documents, vocabulary=()):
+    """A vocabulary followed by the unseen tokens of documents, sorted."""
+    known = set(vocabulary)
+    new = sorted({token for tokens in documents for token in tokens} - known)
+    return list(vocabulary) + new
+
+
+def features(documents, vocabulary):
+    """Weighted token counts of documents over a fixed vocabulary.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        float32 matrix of shape (n_documents, len(vocabulary)).
+
+    """
+    vectorizer = CountVectorizer(analyzer=lambda tokens: tokens, vocabulary=vocabulary,
+                                 binary=True, dtype=np.float32)
+    weights = np.array([FEATURE_WEIGHTS[token.split(':', 1)[0]] for token in vocabulary],
+                       dtype=np.float32)
+    return (vectorizer.transform(documents) @ sparse.diags(weights)).tocsr()
+
+
+def build(movies, k=50, block_size=512, previous=None):
+    """Top-k content neighbours of every movie of a catalogue.
+
+    Parameters
+    ----------
+    movies : MovieCatalog
+        Movie catalogue.
+    k : int
+        Number of neighbours kept per movie.
+    block_size : int
+        Movies scored per `cosine_similarity` call, bounding memory to
+        block_size * len(movies) floats.
+    previous : tuple (ItemNeighbourIndex, list (str), np.ndarray), optional
+        Index, vocabulary and token hashes of a previous build, whose
+        lists are reused unless some of its movies have left the
+        catalogue.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray, list (str), int)
+        Neighbour catalogue rows and similarities of shape
+        (len(movies), k), the vocabulary and the number of movies scored
+        against the whole catalogue.
+
+    """
+    if previous is not None and not np.isin(previous[0].item_ids, movies.movie_ids).all():
+        previous = None
+    documents = movie_documents(movies)
+    vocabulary = extend_vocabulary(documents, previous[1] if previous else ())
+    vectors = features(documents, vocabulary)
+    if previous is None:
+        rows, scores = _blocked_topk(vectors, vectors, k, block_size, np.arange(len(movies)),
+                                     cosine_similarity)
+        return rows, scores, vocabulary, len(movies)
+
+    index, _, hashes = previous
+    listed = index.rows(movies.movie_ids)
+    known = np.flatnonzero(listed >= 0)
+    # Movies missing from the previous index or whose tokens changed
+    changed = listed < 0
+    changed[known] = hashes[listed[known]] != token_hashes(documents)[known]
+    rows = np.full((len(movies), k), -1, dtype=np.int64)
+    scores = np.full((len(movies), k), -np.inf, dtype=np.float32)
+
+    # Reused lists, from movie ids to catalogue rows
+    old_rows = np.flatnonzero(~changed)
+    rows[old_rows] = _positions(movies, np.asarray(index.neighbour_ids[listed[old_rows]]))
+    scores[old_rows] = np.asarray(index.scores[listed[old_rows]], dtype=np.float32)
+    changed_rows = np.flatnonzero(changed)
+    if not len(changed_rows):
+        return rows, scores, vocabulary, 0
+
+    # Lists holding an edited movie are scored again, as a better movie
+    # may replace it
+    rescored = changed.copy()
+    rescored[old_rows] = np.isin(rows[old_rows], changed_rows[listed[changed_rows] >= 0]).any(axis=1)
+    old_rows, new_rows = np.flatnonzero(~rescored), np.flatnonzero(rescored)
+
+    # New, edited and rescored movies against the whole catalogue, then
+    # the other movies against the new and edited ones only
+    rows[new_rows], scores[new_rows] = _blocked_topk(vectors[new_rows], vectors, k, block_size,
+                                                     new_rows, cosine_similarity)
+    if len(old_rows):
+        found, found_scores = _blocked_topk(vectors[old_rows], vectors[changed_rows], k,
+                                            block_size, similarity=cosine_similarity)
+        found = np.where(found >= 0, changed_rows[np.maximum(found, 0)], -1)
+        rows[old_rows], scores[old_rows] = _merge_topk(rows[old_rows], scores[old_rows],
+                                                       found, found_scores, k)
+    return rows, scores, vocabulary, len(new_rows)
+
+
+def _positions(movies, movie_ids):
+    """Catalogue rows of a movie id array, -1 where padded."""
+    positions = np.full(movie_ids.shape, -1, dtype=np.int64)
+    valid = movie_ids >= 0
+    positions[valid] = movies.positions(movie_ids[valid].tolist())
+    return positions
+
+
+def load_previous(path, k):
+    """Index, vocabulary and token hashes of a previous build its lists can
+    be reused from.
+
+    Returns None when there is no previous build, or when it was built
+    with other settings.
+
+    """
+    index = load_index(path)
+    if index is None or not all(os.path.exists(os.path.join(path, name))
+                                for name in ('vocabulary.json', 'token_hashes.npy')):
+        return None
+    with open(os.path.join(path, 'index.json')) as f:
+        settings = json.load(f)
+    if settings.get('k') != k or settings.get('weights') != FEATURE_WEIGHTS:
+        return None
+    with open(os.path.join(path, 'vocabulary.json')) as f:
+        vocabulary = json.load(f)
+    return index, vocabulary, np.load(os.path.join(path, 'token_hashes.npy'))
+
+
+def save(path, movies, rows, scores, vocabulary, **metadata):
+    """Write a content neighbour index, its vocabulary and token hashes."""
+    # Hashes in the movie id order of the index
+    order = np.argsort(np.asarray(movies.movie_ids, dtype=np.int32), kind='stable')
+    extra = {'vocabulary.json': vocabulary,
+             'token_hashes.npy': token_hashes(movie_documents(movies))[order]}
+    save_index(path, movies.movie_ids, rows, scores, score_dtype=np.float16, extra=extra,
+               weights=FEATURE_WEIGHTS, vocabulary_size=len(vocabulary), **metadata)
@@ -0,0 +1,281 @@
+"""
+
+    Latency budgets with tiered fallback recommendations.
+
+    Author: Explore Data Science Academy.
+
+    Description: `with_deadline` wraps a recommender so that every request
+    is answered within a time budget. The recommender runs on a bounded
+    thread pool; when it hasn't answered once the budget is spent, or it
+    fails, the request is served by the first fallback tier able to:
+
+        primary      the wrapped recommender itself
+        neighbours   merged item-item neighbour lists of the favourites,
+                     read from the memory-mapped index built offline (see
+                     `recommenders/item_neighbours.py`)
+        popularity   the most popular movies sharing the favourites'
+                     genres, from per-genre lists ranked when the data is
+                     loaded
+
+    Fallback tiers only serve once their data is loaded, so they never
+    wait on a load themselves. A request no tier can serve waits for the
+    recommender after all. A recommender that misses its deadline keeps
+    running and stores its result in the result cache, so the next request
+    for the same favourites is served by the primary tier. A request whose
+    favourites are already being computed speculatively (see
+    `recommenders/speculative.py`) waits for that job instead.
+
+    Requests, the tier that served them, deadline misses and failures are
+    counted per algorithm, together with recent response times, see
+    `stats`. The budget defaults to `RECOMMENDER_DEADLINE_MS` milliseconds.
+
+"""
+
+# Script dependencies
+import os
+import time
+import logging
+import functools
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+from recommenders import content_based, collaborative_based, speculative
+from recommenders.svd_engine import top_k
+from utils.lazy import shared_resource
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request may take before a fallback answers it.
+DEFAULT_BUDGET = float(os.environ.get('RECOMMENDER_DEADLINE_MS', 1500)) / 1000.0
+# Recommenders running at once; further requests queue, eating into their
+# budget, so that an overloaded process answers from the fallbacks.
+WORKERS = 8
+# Movies kept per genre for the popularity tier.
+GENRE_LIST_LENGTH = 200
+# Response times kept per algorithm for the percentiles.
+LATENCY_HISTORY = 1000
+
+TIERS = ('primary', 'neighbours', 'popularity')
+
+# Data shared with the recommenders.
+catalog = content_based.catalog
+rating_stats = content_based.rating_stats
+genre_index = content_based.genre_index
+neighbours = collaborative_based.neighbours
+
+
+class GenrePopularity:
+    """Most popular movies of every genre.
+
+    Parameters
+    ----------
+    movies : MovieCatalog
+        Movie catalogue.
+    genres : GenreIndex
+        Genre bitmasks of the catalogue.
+    stats : RatingStats
+        Rating statistics per movie.
+    length : int
+        Movies kept per genre.
+
+    """
+
+    def __init__(self, movies, genres, stats, length=GENRE_LIST_LENGTH):
+        self.genres = genres
+        # Popularity is the number of ratings, ties broken by mean rating
+        count = stats.column('count', movies.movie_ids)
+        mean = np.nan_to_num(stats.column('bayesian_mean', movies.movie_ids))
+        self.popularity = np.log1p(count) + content_based.RATING_TIE_BREAK * mean
+        rated = count > 0
+
+        self.lists = []
+        for bit in range(len(genres.vocabulary)):
+            word, mask = bit // 64, np.uint64(1 << (bit % 64))
+            positions = np.flatnonzero(((genres.masks[:, word] & mask) != 0) & rated)
+            best = top_k(self.popularity[positions], length)
+            self.lists.append(positions[best])
+
+    def recommend(self, positions, top_n=10):
+        """Catalogue positions of popular movies sharing genres with favourites.
+
+        Candidates are ranked by the Jaccard similarity of their genres to
+        the favourites' combined genres, then by popularity.
+
+        """
+        query = self.genres.union(positions)
+        bits = [bit for bit in range(len(self.lists))
+                if int(query[bit // 64]) >> (bit % 64) & 1]
+        if not bits:
+            return []
+        candidates = np.unique(np.concatenate([self.lists[bit] for bit in bits]))
+        candidates = candidates[~np.isin(candidates, positions)]
+        score = self.genres.subset(candidates).jaccard(query)
+        score += 1e-3 * self.popularity[candidates] / max(self.popularity.max(), 1.0)
+        return candidates[top_k(score, top_n)].tolist()
+
+
+genre_popularity = shared_resource(
+    'fallback:genre popularity',
+    lambda: GenrePopularity(catalog.get(), genre_index.get(), rating_stats.get()))
+
+# Resources every fallback tier needs, loaded ahead of the others.
+RESOURCES = [catalog.name, rating_stats.name, genre_index.name, genre_popularity.name]
+
+
+def _neighbour_tier(movie_list, top_n):
+    if not (catalog.loaded and neighbours.loaded) or neighbours.get() is None:
+        return None
+    movies = catalog.get()
+    favourites = [i for title in movie_list for i in movies.all_ids(title)]
+    if not (neighbours.get().rows(favourites) >= 0).any():
+        return None
+    recommended = neighbours.get().recommend(favourites, top_n + len(favourites))
+    return [movies.title(i) for i in recommended if i in movies.id_to_pos][:top_n]
+
+
+def _popularity_tier(movie_list, top_n):
+    if not (catalog.loaded and genre_popularity.loaded):
+        return None
+    movies = catalog.get()
+    favourites = movies.positions([i for title in movie_list for i in movies.all_ids(title)])
+    return [movies.titles[i] for i in genre_popularity.get().recommend(favourites, top_n)]
+
+
+FALLBACKS = [('neighbours', _neighbour_tier), ('popularity', _popularity_tier)]
+
+
+def serve_fallback(movie_list, top_n=10):
+    """Recommendations of the first fallback tier able to serve them.
+
+    Returns
+    -------
+    tuple (str, list (str)) or None
+        Name of the tier and its recommendations, None when no tier has
+        its data loaded or knows the favourites.
+
+    """
+    for tier, recommend in FALLBACKS:
+        try:
+            recommendations = recommend(movie_list, top_n)
+        except Exception:
+            logger.exception("Fallback tier %s failed", tier)
+            continue
+        if recommendations:
+            return tier, recommendations
+    return None
+
+
+class DeadlineStats:
+    """Thread-safe counters of the tiers serving requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._algorithms = {}
+
+    def record(self, algorithm, tier, seconds, missed=False, failed=False):
+        with self._lock:
+            counts = self._algorithms.setdefault(
+                algorithm, {'tiers': Counter(), 'missed': 0, 'failed': 0,
+                            'latencies': deque(maxlen=LATENCY_HISTORY)})
+            counts['tiers'][tier] += 1
+            counts['missed'] += missed
+            counts['failed'] += failed
+            counts['latencies'].append(seconds)
+
+    def snapshot(self):
+        """Counters and response time percentiles (ms) per algorithm."""
+        with self._lock:
+            snapshot = {}
+            for algorithm, counts in self._algorithms.items():
+                requests = sum(counts['tiers'].values())
+                latencies = np.array(counts['latencies']) * 1000.0
+                snapshot[algorithm] = {
+                    'requests': requests,
+                    'tiers': {tier: counts['tiers'][tier] for tier in TIERS},
+                    'deadline_missed': counts['missed'],
+                    'miss_rate': counts['missed'] / requests if requests else 0.0,
+                    'failed': counts['failed'],
+                    'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None}
+            return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._algorithms.clear()
+
+
+stats = DeadlineStats()
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='recommend')
+
+
+def with_deadline(model, algorithm, budget=None):
+    """Wrap a recommender to answer within a time budget.
+
+    Parameters
+    ----------
+    model : callable
+        A `*_model(movie_list, top_n)` recommender, optionally with the
+        `key` and `cache` of `cached_recommender`.
+    algorithm : str
+        Name the requests are counted under.
+    budget : float, optional
+        Seconds before a fallback answers, `DEFAULT_BUDGET` by default.
+
+    Returns
+    -------
+    callable
+        A function with the signature of `model`. Unknown titles still
+        raise the recommender's `KeyError`.
+
+    """
+    budget = DEFAULT_BUDGET if budget is None else budget
+
+    @functools.wraps(model)
+    def wrapper(movie_list, top_n=10):
+        start = time.perf_counter()
+        # Cached results are served straight away, results being computed
+        # speculatively are waited for. A miss is only counted by `model`.
+        future = None
+        if hasattr(model, 'cache'):
+            key = model.key(movie_list, top_n)
+            if key in model.cache:
+                found, recommendations = model.cache.get(key)
+                if found:
+                    stats.record(algorithm, 'primary', time.perf_counter() - start)
+                    return recommendations
+            future = speculative.claim(key)
+
+        if future is None:
+            future = _executor.submit(model, movie_list, top_n)
+        missed = failed = False
+        try:
+            recommendations = future.result(timeout=budget)
+            stats.record(algorithm, 'primary', time.perf_counter() - start)
+            return recommendations
+        except TimeoutError:
+            missed = True
+        except KeyError:
+            raise
+        except Exception:
+            logger.exception("%s recommender failed, serving a fallback", algorithm)
+            failed = True
+
+        fallback = serve_fallback(movie_list, top_n)
+        if fallback is None:
+            # Nothing to fall back on: wait for the recommender after all
+            recommendations = future.result()
+            stats.record(algorithm, 'primary', time.perf_counter() - start, missed, failed)
+            return recommendations
+        # Drop the request if it is still queued behind others
+        future.cancel()
+        tier, recommendations = fallback
+        stats.record(algorithm, tier, time.perf_counter() - start, missed, failed)
+        logger.info("%s request served by the %s tier after %.3fs", algorithm, tier,
+                    time.perf_counter() - start)
+        return recommendations
+
+    # What `speculative.speculate` computes, without the deadline
+    wrapper.primary = model
+    return wrapper
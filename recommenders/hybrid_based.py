@@ -0,0 +1,183 @@
+"""
+
+    Hybrid filtering for item recommendation.
+
+    Author: Explore Data Science Academy.
+
+    Description: Combines the signals of the content-based and
+    collaborative recommenders in one ranking pass. The candidate pool,
+    every catalogue movie with at least one rating, is built once per
+    data and model version, together with everything about the candidates
+    that doesn't depend on the request: their genre bitmasks, item factors
+    and biases, and popularity. A request then scores the whole pool with
+
+        score = w_genre * Jaccard genre similarity to the favourites
+              + w_svd * estimated rating of the folded-in app user,
+                        rescaled to [0, 1]
+              + w_popularity * log number of ratings, rescaled to [0, 1]
+
+    in a few array operations, sharing the data and models loaded by the
+    two other recommenders. The weights are set in `WEIGHTS`.
+
+"""
+
+# Script dependencies
+import os
+import numpy as np
+from recommenders import content_based, collaborative_based
+from recommenders.svd_engine import top_k
+from utils.instrumentation import instrumented, stage
+from utils.lazy import shared_resource
+from utils.result_cache import artifact_version, cached_recommender
+
+# Weight of each signal within the hybrid score.
+WEIGHTS = {'genre': 0.5, 'svd': 0.35, 'popularity': 0.15}
+
+# Data and models shared with the other recommenders.
+catalog = content_based.catalog
+rating_stats = content_based.rating_stats
+genre_index = content_based.genre_index
+model = collaborative_based.model
+
+
+class CandidatePool:
+    """Request-independent arrays of the movies a hybrid request ranks.
+
+    Parameters
+    ----------
+    movies : MovieCatalog
+        Movie catalogue.
+    genres : GenreIndex
+        Genre bitmasks of the catalogue.
+    stats : RatingStats
+        Rating statistics per movie.
+    svd : SVDScorer
+        Trained SVD model.
+
+    """
+
+    def __init__(self, movies, genres, stats, svd):
+        self.stats_revision = stats.revision
+        count = stats.column('count', movies.movie_ids)
+        positions = np.flatnonzero(count > 0)
+        self.movie_ids = movies.movie_ids[positions]
+        self.index = dict(zip(self.movie_ids.tolist(), range(len(positions))))
+        self.genres = genres.subset(positions)
+
+        # Item factors and biases, zero for movies unknown to the model
+        rows = svd.item_index(self.movie_ids)
+        known = rows >= 0
+        self.qi = np.zeros((len(positions), svd.qi.shape[1]))
+        self.qi[known] = svd.qi[rows[known]]
+        self.bi = np.zeros(len(positions))
+        self.bi[known] = svd.bi[rows[known]]
+
+        count = np.log1p(count[positions])
+        self.popularity = count / count.max() if len(count) else count
+        self.bayesian_mean = stats.column('bayesian_mean', self.movie_ids)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def rows(self, movie_ids):
+        """Pool rows of movie ids, skipping movies outside the pool."""
+        return np.array([self.index[i] for i in movie_ids if i in self.index], dtype=np.int64)
+
+
+candidate_pool = shared_resource(
+    'hybrid:candidate pool',
+    lambda: CandidatePool(catalog.get(), genre_index.get(), rating_stats.get(), model.get()))
+
+# Version of the data, models and weights the results depend on. The
+# candidate pool is rebuilt whenever a file it derives from is replaced,
+# or live ratings changed the statistics it was built from.
+_pool_version = artifact_version(
+    [content_based.MOVIES_PATH, content_based.RATINGS_PATH,
+     os.path.join(collaborative_based.MODEL_PATH, 'meta.json')],
+    [candidate_pool])
+
+def hybrid_version():
+    revision = content_based.stats_revision()
+    if candidate_pool.loaded and candidate_pool.get().stats_revision != revision:
+        candidate_pool.reset()
+    return (content_based.content_version(), collaborative_based.model_version(),
+            _pool_version(), tuple(sorted(WEIGHTS.items())))
+
+def score_candidates(movie_lists, weights=None):
+    """Hybrid score of every candidate for several lists of favourites.
+
+    Parameters
+    ----------
+    movie_lists : list (list (str))
+        Favourite movie titles of every request.
+    weights : dict, optional
+        Weights overriding `WEIGHTS`.
+
+    Returns
+    -------
+    np.ndarray
+        Scores of shape (n_requests, n_candidates), -inf for the
+        favourites themselves.
+
+    """
+    weights = {**WEIGHTS, **(weights or {})}
+    movies = catalog.get()
+    pool = candidate_pool.get()
+    svd = model.get()
+
+    with stage('title lookup'):
+        favourites = [[i for title in titles for i in movies.all_ids(title)]
+                      for titles in movie_lists]
+
+    # genre similarity of the pool to the combined genres of the favourites
+    with stage('genre similarity'):
+        genres = genre_index.get()
+        queries = np.stack([genres.union(movies.positions(ids)) for ids in favourites])
+        score = weights['genre'] * pool.genres.jaccard(queries)
+
+    # estimated rating of every candidate by the folded-in app user
+    with stage('svd affinity'):
+        rating = collaborative_based.favourite_rating(svd)
+        folded = [svd.fold_in(ids, [rating] * len(ids)) for ids in favourites]
+        pu = np.stack([p for p, _ in folded])
+        bu = np.array([b for _, b in folded])
+        low, high = svd.rating_scale
+        affinity = pu @ pool.qi.T
+        affinity += pool.bi + svd.global_mean - low
+        affinity += bu[:, None]
+        affinity /= high - low
+        score += weights['svd'] * np.clip(affinity, 0.0, 1.0, out=affinity)
+
+    score += weights['popularity'] * pool.popularity
+    score += content_based.RATING_TIE_BREAK * pool.bayesian_mean
+    for row, ids in enumerate(favourites):
+        score[row, pool.rows(ids)] = -np.inf
+    return score
+
+@instrumented('hybrid')
+@cached_recommender('hybrid', lambda movies: catalog.get().resolve_many(movies), hybrid_version)
+def hybrid_model(movie_list, top_n=10):
+    """Performs hybrid filtering based upon a list of movies supplied
+       by the app user.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : type
+        Number of top recommendations to return to the user.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
+
+    """
+    movies = catalog.get()
+    pool = candidate_pool.get()
+    score = score_candidates([movie_list])[0]
+
+    with stage('ranking'):
+        best = top_k(score, top_n)
+        best = best[np.isfinite(score[best])]
+    return [movies.title(i) for i in pool.movie_ids[best].tolist()]
@@ -0,0 +1,212 @@
+"""
+
+    Streaming ingestion of MovieLens ratings.
+
+    Author: Explore Data Science Academy.
+
+    Description: Builds everything the recommenders derive from the
+    ratings in a single pass over bounded chunks of the file:
+
+        - the binary column cache (see `utils/data_cache.py`), when it is
+          missing or out of date,
+        - the maps between user and movie ids and matrix positions,
+        - the per-movie rating aggregates (see `RatingStats.update`),
+        - the sparse user-item matrix (see `RatingMatrix`).
+
+    The `timestamp` column is converted into the cache but never held by
+    the structures. When the cache is already up to date the pass reads
+    chunks of the memory-mapped columns instead of parsing the csv. Peak
+    memory is one chunk plus the structures built, and progress and
+    throughput are logged (or printed from the command line) as chunks are
+    consumed.
+
+    Usage (from the repository root):
+
+        python -m recommenders.ingest resources/data/ratings.csv [--chunk-rows 1000000]
+
+"""
+
+# Script dependencies
+import sys
+import time
+import logging
+import argparse
+import resource
+
+import numpy as np
+from recommenders.rating_stats import RatingStats
+from recommenders.sparse_ratings import RatingMatrix
+from utils.data_cache import (CHUNK_ROWS, RATINGS_SCHEMA, decode_ratings, ensure_cache,
+                              load_ratings)
+from utils.lazy import shared_resource
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two progress reports.
+REPORT_INTERVAL = 5.0
+
+
+class IdMap:
+    """Dense codes of ids, assigned in order of first appearance.
+
+    Chunks are encoded with vectorised lookups into a sorted copy of the
+    ids seen so far, so memory grows with the number of distinct ids only.
+
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._sorted = np.empty(0, dtype=np.int64)
+        self._codes = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def encode(self, ids):
+        """Codes of a chunk of ids, assigning new codes to unseen ids."""
+        unique, inverse = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+        found = np.minimum(np.searchsorted(self._sorted, unique), max(len(self) - 1, 0))
+        known = self._sorted[found] == unique if len(self) else np.zeros(len(unique), bool)
+        codes = np.empty(len(unique), dtype=np.int32)
+        codes[known] = self._codes[found[known]]
+
+        new = unique[~known]
+        codes[~known] = np.arange(len(self), len(self) + len(new), dtype=np.int32)
+        if len(new):
+            self._chunks.append(new)
+            merged = np.concatenate([self._sorted, new])
+            order = np.argsort(merged, kind='stable')
+            self._sorted = merged[order]
+            self._codes = np.concatenate([self._codes, codes[~known]])[order]
+        return codes[inverse]
+
+    @property
+    def ids(self):
+        """Ids in order of their codes."""
+        return np.concatenate([np.empty(0, dtype=np.int64)] + self._chunks)
+
+    def sorted_positions(self):
+        """Sorted ids, and the position of every code within them."""
+        positions = np.empty(len(self), dtype=np.int32)
+        positions[self._codes] = np.arange(len(self), dtype=np.int32)
+        return self._sorted, positions
+
+
+class RatingsIngest:
+    """Consumer of rating chunks building the derived structures.
+
+    Parameters
+    ----------
+    matrix : bool
+        Whether to build the sparse user-item matrix.
+    prior_weight : float
+        Prior weight of the Bayesian means, see `RatingStats`.
+
+    """
+
+    def __init__(self, matrix=True, prior_weight=10.0):
+        self.users = IdMap()
+        self.items = IdMap()
+        self.stats = RatingStats(prior_weight)
+        self.matrix = matrix
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._reported = self.started
+        self._parts = []
+
+    def __call__(self, chunk, progress):
+        users = chunk['userId'].to_numpy()
+        items = chunk['movieId'].to_numpy()
+        ratings = chunk['rating'].to_numpy()
+        if ratings.dtype == np.uint8:
+            ratings = decode_ratings(ratings)
+        self.stats.update(items, ratings)
+        if self.matrix:
+            self._parts.append((self.users.encode(users), self.items.encode(items),
+                                np.asarray(ratings, dtype=np.float32)))
+        self.rows += len(chunk)
+
+        now = time.perf_counter()
+        if now - self._reported >= REPORT_INTERVAL or progress >= 1.0:
+            self._reported = now
+            logger.info("Ingested %d ratings (%.0f%%) at %.0f ratings/s", self.rows,
+                        100 * progress, self.rows / max(now - self.started, 1e-9))
+
+    def rating_matrix(self):
+        """The sparse matrix of the ingested ratings."""
+        user_ids, rows = self.users.sorted_positions()
+        item_ids, cols = self.items.sorted_positions()
+        parts, self._parts = self._parts, []
+        rows = np.concatenate([rows[r] for r, _, _ in parts] or [np.empty(0, np.int32)])
+        cols = np.concatenate([cols[c] for _, c, _ in parts] or [np.empty(0, np.int32)])
+        ratings = np.concatenate([v for _, _, v in parts] or [np.empty(0, np.float32)])
+        del parts
+        return RatingMatrix.from_positions(user_ids, item_ids, rows, cols, ratings)
+
+    def summary(self):
+        seconds = time.perf_counter() - self.started
+        return {'ratings': self.rows, 'users': len(self.users), 'movies': len(self.stats),
+                'seconds': seconds, 'ratings_per_second': self.rows / max(seconds, 1e-9)}
+
+
+def ingest_ratings(path_to_ratings='resources/data/ratings.csv', matrix=True,
+                   chunk_rows=None):
+    """Build the rating aggregates and matrix in one pass over a file.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings stored in .csv format.
+    matrix : bool
+        Whether to build the sparse user-item matrix.
+    chunk_rows : int, optional
+        Ratings per chunk, `CHUNK_ROWS` by default.
+
+    Returns
+    -------
+    RatingsIngest
+        With the `stats` built, `rating_matrix()` when `matrix` is set,
+        and the throughput of the pass in `summary()`.
+
+    """
+    ingest = RatingsIngest(matrix)
+    ensure_cache(path_to_ratings, RATINGS_SCHEMA, on_chunk=ingest, chunk_rows=chunk_rows)
+    if not ingest.rows:
+        # The cache was up to date: stream its memory-mapped columns
+        columns = load_ratings(path_to_ratings, columns=['userId', 'movieId', 'rating'],
+                               encoded=True)
+        step = chunk_rows or CHUNK_ROWS
+        for start in range(0, len(columns), step):
+            ingest(columns.iloc[start:start + step], min((start + step) / len(columns), 1.0))
+    return ingest
+
+
+def ingest_resource(path_to_ratings='resources/data/ratings.csv'):
+    """Ratings ingested once per process, shared by the recommenders."""
+    def load():
+        ingest = ingest_ratings(path_to_ratings)
+        return ingest.stats, ingest.rating_matrix()
+    return shared_resource(f'ratings ingest:{path_to_ratings}', load)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratings', nargs='?', default='resources/data/ratings.csv')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='ratings parsed and aggregated at once')
+    parser.add_argument('--no-matrix', action='store_true',
+                        help='only build the cache and per-movie aggregates')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    result = ingest_ratings(args.ratings, matrix=not args.no_matrix, chunk_rows=args.chunk_rows)
+    if not args.no_matrix:
+        shape = result.rating_matrix().shape
+        print(f"Rating matrix of {shape[0]} users x {shape[1]} movies", file=sys.stderr)
+    summary = result.summary()
+    print(f"Ingested {summary['ratings']} ratings of {summary['users'] or '-'} users and "
+          f"{summary['movies']} movies in {summary['seconds']:.1f}s "
+          f"({summary['ratings_per_second']:.0f} ratings/s), peak RSS "
+          f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB",
+          file=sys.stderr)
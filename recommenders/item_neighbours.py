@@ -0,0 +1,355 @@
+"""
+
+    Precomputed item-item nearest neighbours over SVD item factors.
+
+    Author: Explore Data Science Academy.
+
+    Description: For every movie known to the SVD model we store its top-K
+    most similar movies (cosine similarity of the item factors) as fixed
+    width arrays:
+
+        item_ids.npy      int32   (n_items,)     sorted movie ids of the rows
+        neighbour_ids.npy int32   (n_items, K)   neighbour movie ids
+        scores.npy        float32 (n_items, K)   neighbour similarities
+                          (float16 for the content neighbours of
+                          `recommenders/content_neighbours.py`)
+
+    The arrays are memory-mapped at serve time, so a request for three
+    favourites only touches three rows of the index. A rebuilt index is
+    written to a staging directory swapped in place of the previous one,
+    which processes still mapping it keep reading intact; an index built
+    from another version of the model is ignored. The index is built
+    offline with `resources/models/build_item_neighbours.py`, either
+    exactly (blocked matrix products) or approximately (random-projection
+    LSH) for large catalogues.
+
+"""
+
+# Script dependencies
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+# Movies per LSH bucket aimed at when deriving the number of hyperplanes
+# from the catalogue size; smaller buckets lose too many true neighbours.
+LSH_BUCKET_SIZE = 200
+LSH_MAX_BITS = 16
+
+
+def lsh_bits(n_items):
+    """Hyperplanes per LSH table giving buckets of about `LSH_BUCKET_SIZE`."""
+    return int(np.clip(np.floor(np.log2(max(n_items, 1) / LSH_BUCKET_SIZE)), 1, LSH_MAX_BITS))
+
+
+def _normalise(factors):
+    """Scale factor rows to unit length for cosine similarity."""
+    norms = np.linalg.norm(factors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (factors / norms).astype(np.float32)
+
+
+def _merge_topk(ids, scores, new_ids, new_scores, k):
+    """Merge two sets of per-row candidate lists into the best `k`.
+
+    Candidates found more than once (e.g. through several LSH tables) are
+    only kept once.
+
+    """
+    ids = np.concatenate([ids, new_ids], axis=1)
+    scores = np.concatenate([scores, new_scores], axis=1)
+    # Mask repeated ids within each row.
+    order = np.argsort(ids, axis=1, kind='stable')
+    sorted_ids = np.take_along_axis(ids, order, axis=1)
+    repeated = np.zeros_like(sorted_ids, dtype=bool)
+    repeated[:, 1:] = sorted_ids[:, 1:] == sorted_ids[:, :-1]
+    np.put_along_axis(scores, order, np.where(repeated, -np.inf,
+                      np.take_along_axis(scores, order, axis=1)), axis=1)
+    best = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(ids, best, axis=1), np.take_along_axis(scores, best, axis=1)
+
+
+def _blocked_topk(query, base, k, block_size, query_rows=None, similarity=None):
+    """Exact top-k cosine neighbours of `query` rows within `base`.
+
+    Parameters
+    ----------
+    query, base : np.ndarray
+        Unit-length factor rows, or any rows `similarity` accepts.
+    k : int
+        Number of neighbours per query row.
+    block_size : int
+        Number of query rows scored per matrix product, bounding memory
+        to block_size * len(base) floats.
+    query_rows : np.ndarray, optional
+        Row of each query within `base`, excluded from its own list.
+    similarity : callable, optional
+        Dense similarities of a block of query rows to `base`, the dot
+        products of the rows by default.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        Neighbour rows within `base` and their similarities.
+
+    """
+    n = query.shape[0]
+    k_eff = min(k, base.shape[0] - (query_rows is not None))
+    ids = np.full((n, k), -1, dtype=np.int64)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    if k_eff <= 0:
+        return ids, scores
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        sims = (similarity(query[start:stop], base) if similarity is not None
+                else query[start:stop] @ base.T)
+        if query_rows is not None:
+            sims[np.arange(stop - start), query_rows[start:stop]] = -np.inf
+        best = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+        best_scores = np.take_along_axis(sims, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        ids[start:stop, :k_eff] = np.take_along_axis(best, order, axis=1)
+        scores[start:stop, :k_eff] = np.take_along_axis(best_scores, order, axis=1)
+    return ids, scores
+
+
+def build_exact(factors, k=50, block_size=1024):
+    """Exact top-k neighbours of every item, computed block by block.
+
+    Parameters
+    ----------
+    factors : np.ndarray
+        Item factor matrix of shape (n_items, n_factors).
+    k : int
+        Number of neighbours kept per item.
+    block_size : int
+        Number of items scored per matrix product.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        Neighbour rows and similarities, both of shape (n_items, k).
+
+    """
+    unit = _normalise(factors)
+    return _blocked_topk(unit, unit, k, block_size, np.arange(len(unit)))
+
+
+def build_lsh(factors, k=50, n_bits=None, n_tables=16, block_size=1024, seed=0):
+    """Approximate top-k neighbours using random-projection LSH.
+
+    Items are hashed by the signs of `n_bits` random projections in each
+    of `n_tables` tables. Exact similarities are then only computed
+    between items sharing a bucket, and the best candidates across tables
+    are kept.
+
+    Parameters
+    ----------
+    factors : np.ndarray
+        Item factor matrix of shape (n_items, n_factors).
+    k : int
+        Number of neighbours kept per item.
+    n_bits : int, optional
+        Hyperplanes per table; more bits give smaller buckets. Derived
+        from the number of items by default, see `lsh_bits`.
+    n_tables : int
+        Independent hash tables; more tables give better recall.
+    block_size : int
+        Number of items scored per matrix product within a bucket.
+    seed : int
+        Seed of the random projections.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        Neighbour rows and similarities, both of shape (n_items, k).
+
+    """
+    unit = _normalise(factors)
+    n = len(unit)
+    n_bits = lsh_bits(n) if n_bits is None else n_bits
+    rng = np.random.default_rng(seed)
+    ids = np.full((n, k), -1, dtype=np.int64)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    weights = 1 << np.arange(n_bits, dtype=np.int64)
+    for _ in range(n_tables):
+        planes = rng.standard_normal((unit.shape[1], n_bits)).astype(np.float32)
+        signatures = ((unit @ planes) > 0).astype(np.int64) @ weights
+        order = np.argsort(signatures, kind='stable')
+        bounds = np.flatnonzero(np.diff(signatures[order])) + 1
+        for members in np.split(order, bounds):
+            if len(members) < 2:
+                continue
+            local_ids, local_scores = _blocked_topk(unit[members], unit[members], k,
+                                                    block_size, np.arange(len(members)))
+            local_ids = np.where(local_ids >= 0, members[np.maximum(local_ids, 0)], -1)
+            ids[members], scores[members] = _merge_topk(ids[members], scores[members],
+                                                        local_ids, local_scores, k)
+    return ids, scores
+
+
+def sampled_recall(factors, neighbour_rows, k=10, n_samples=500, block_size=1024, seed=0):
+    """Recall at k of approximate neighbour lists against exact search.
+
+    Parameters
+    ----------
+    factors : np.ndarray
+        Item factor matrix the lists were built from.
+    neighbour_rows : np.ndarray
+        Neighbour rows of every item, e.g. from `build_lsh`.
+    k : int
+        Length of the lists compared.
+    n_samples : int
+        Items whose exact neighbours are computed.
+    seed : int
+        Seed of the sampled items.
+
+    Returns
+    -------
+    float
+        Mean share of the exact top-k found within the approximate top-k.
+
+    """
+    unit = _normalise(factors)
+    sample = np.random.default_rng(seed).choice(len(unit), min(n_samples, len(unit)),
+                                                replace=False)
+    exact, _ = _blocked_topk(unit[sample], unit, k, block_size, sample)
+    found = [len(np.intersect1d(e[e >= 0], a[:k])) / max((e >= 0).sum(), 1)
+             for e, a in zip(exact, neighbour_rows[sample])]
+    return float(np.mean(found))
+
+
+def save_index(path, item_ids, neighbour_rows, scores, score_dtype=np.float32, extra=None,
+               **metadata):
+    """Write a neighbour index as compact arrays, replacing any previous one.
+
+    Parameters
+    ----------
+    path : str
+        Output directory.
+    item_ids : np.ndarray
+        Movie id of every factor row.
+    neighbour_rows : np.ndarray
+        Neighbour factor rows, -1 where fewer than k neighbours exist.
+    scores : np.ndarray
+        Neighbour similarities.
+    score_dtype : np.dtype
+        Type the similarities are stored as, e.g. float16 to halve the
+        size of a large index.
+    extra : dict, optional
+        Other files of the index, file name -> array (.npy) or
+        JSON-serialisable object (.json).
+    **metadata
+        Build settings stored alongside the arrays, e.g. the
+        `model_version` the index was built from.
+
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=os.path.basename(path) + '.', dir=parent)
+    os.chmod(staging, 0o755)
+
+    try:
+        item_ids = np.asarray(item_ids, dtype=np.int32)
+        order = np.argsort(item_ids, kind='stable')
+        neighbour_ids = np.where(neighbour_rows >= 0,
+                                 item_ids[np.maximum(neighbour_rows, 0)], -1)
+        np.save(os.path.join(staging, 'item_ids.npy'), item_ids[order])
+        np.save(os.path.join(staging, 'neighbour_ids.npy'), neighbour_ids[order].astype(np.int32))
+        np.save(os.path.join(staging, 'scores.npy'), scores[order].astype(score_dtype))
+        for filename, value in (extra or {}).items():
+            if filename.endswith('.npy'):
+                np.save(os.path.join(staging, filename), value)
+            else:
+                with open(os.path.join(staging, filename), 'w') as f:
+                    json.dump(value, f)
+        with open(os.path.join(staging, 'index.json'), 'w') as f:
+            json.dump(dict(metadata, n_items=len(item_ids), k=neighbour_rows.shape[1]), f,
+                      indent=2)
+    except BaseException:
+        # A failed build leaves the previous index in place, untouched
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Swap the new index in place of the previous one, whose files stay
+    # readable by processes that have them mapped.
+    if os.path.isdir(path):
+        retired = tempfile.mkdtemp(prefix=os.path.basename(path) + '.old.', dir=parent)
+        os.rename(path, os.path.join(retired, 'index'))
+        os.rename(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.rename(staging, path)
+
+
+class ItemNeighbourIndex:
+    """Memory-mapped neighbour lists of a built index.
+
+    Parameters
+    ----------
+    path : str
+        Directory written by `save_index`.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.item_ids = np.load(os.path.join(path, 'item_ids.npy'), mmap_mode='r')
+        self.neighbour_ids = np.load(os.path.join(path, 'neighbour_ids.npy'), mmap_mode='r')
+        self.scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+
+    def rows(self, movie_ids):
+        """Index rows of movie ids, -1 for movies outside the index."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if not len(self.item_ids):
+            return np.full(movie_ids.shape, -1, dtype=np.int64)
+        rows = np.searchsorted(self.item_ids, movie_ids)
+        rows = np.minimum(rows, len(self.item_ids) - 1)
+        return np.where(self.item_ids[rows] == movie_ids, rows, -1)
+
+    def covers(self, movie_ids):
+        """Whether every movie id has a neighbour list."""
+        return bool(np.all(self.rows(movie_ids) >= 0))
+
+    def recommend(self, movie_ids, top_n=10):
+        """Merge the neighbour lists of the favourite movies.
+
+        Parameters
+        ----------
+        movie_ids : list (int)
+            Favourite movie ids.
+        top_n : int or None
+            Number of movies to return, every neighbour when None.
+
+        Returns
+        -------
+        list (int)
+            Movie ids ranked by their summed similarity to the favourites.
+
+        """
+        rows = self.rows(movie_ids)
+        rows = rows[rows >= 0]
+        ids = np.asarray(self.neighbour_ids[rows]).ravel()
+        scores = np.asarray(self.scores[rows], dtype=np.float64).ravel()
+        keep = (ids >= 0) & ~np.isin(ids, movie_ids)
+        candidates, inverse = np.unique(ids[keep], return_inverse=True)
+        totals = np.bincount(inverse, weights=scores[keep], minlength=len(candidates))
+        order = np.argsort(-totals, kind='stable')[:top_n]
+        return candidates[order].tolist()
+
+
+def load_index(path, model_version=None):
+    """Open a neighbour index, or return None when it has not been built.
+
+    When `model_version` is given, an index built from another version of
+    the model is ignored (None) as well.
+
+    """
+    if not os.path.exists(os.path.join(path, 'item_ids.npy')):
+        return None
+    if model_version is not None:
+        with open(os.path.join(path, 'index.json')) as f:
+            if json.load(f).get('model_version') != model_version:
+                return None
+    return ItemNeighbourIndex(path)
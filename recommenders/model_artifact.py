@@ -0,0 +1,193 @@
+"""
+
+    Versioned numeric artifact format for trained SVD models.
+
+    Author: Explore Data Science Academy.
+
+    Description: Rather than pickling the whole Surprise `SVD` object, the
+    trainer exports only what is needed to score, one `.npy` file per
+    array, plus a `meta.json` manifest:
+
+        pu.npy, qi.npy      float32  user and item factors
+        bu.npy, bi.npy      float32  user and item biases
+        user_ids.npy        int64    raw user id of every factor row
+        item_ids.npy        int64    raw movie id of every factor row
+
+    The manifest records the format version, whether the model was
+    trained on implicit feedback, the regularisation users are folded in
+    with, training metadata and a SHA-256 checksum per file. The serving side memory-maps the arrays, so
+    load time doesn't grow with the model and every process shares the
+    same pages. A legacy pickled model can be converted with:
+
+        python -m recommenders.model_artifact svd_test4.pkl resources/models/svd
+
+"""
+
+# Script dependencies
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import tempfile
+import numpy as np
+from recommenders.svd_engine import SVDScorer
+
+FORMAT_VERSION = 1
+ARRAYS = {'pu': np.float32, 'qi': np.float32, 'bu': np.float32, 'bi': np.float32,
+          'user_ids': np.int64, 'item_ids': np.int64}
+
+
+def _sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_scorer(scorer, path, **metadata):
+    """Write the arrays of an `SVDScorer` as a versioned artifact.
+
+    Parameters
+    ----------
+    scorer : SVDScorer
+        Factor and bias arrays to export.
+    path : str
+        Artifact directory. An existing artifact is replaced atomically.
+    **metadata
+        Extra training metadata (algorithm, hyperparameters, ...) stored
+        in the manifest.
+
+    Returns
+    -------
+    dict
+        The manifest written to `meta.json`.
+
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=os.path.basename(path) + '.', dir=parent)
+    os.chmod(staging, 0o755)
+
+    files = {}
+    for name, dtype in ARRAYS.items():
+        filename = name + '.npy'
+        np.save(os.path.join(staging, filename), np.asarray(getattr(scorer, name), dtype=dtype))
+        files[filename] = _sha256(os.path.join(staging, filename))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_version': hashlib.sha256(''.join(files[f] for f in sorted(files))
+                                        .encode()).hexdigest()[:16],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'n_users': int(scorer.n_users),
+        'n_items': int(scorer.n_items),
+        'n_factors': int(scorer.qi.shape[1]),
+        'global_mean': float(scorer.global_mean),
+        'rating_scale': list(scorer.rating_scale),
+        'implicit': scorer.implicit,
+        'alpha': scorer.alpha,
+        'input_scale': list(scorer.input_scale),
+        'reg': scorer.reg,
+        'weighted_reg': scorer.weighted_reg,
+        'metadata': metadata,
+        'files': files,
+    }
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the new artifact in place of the previous one.
+    if os.path.isdir(path):
+        retired = tempfile.mkdtemp(prefix=os.path.basename(path) + '.old.', dir=parent)
+        os.rename(path, os.path.join(retired, 'artifact'))
+        os.rename(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.rename(staging, path)
+    return manifest
+
+
+def export_svd(model, path, **metadata):
+    """Export a fitted Surprise `SVD` model as a versioned artifact."""
+    return export_scorer(SVDScorer.from_surprise(model), path, **metadata)
+
+
+def read_manifest(path):
+    """The `meta.json` manifest of an artifact."""
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+
+def verify_artifact(path):
+    """Check every array of an artifact against its recorded checksum.
+
+    Raises
+    ------
+    ValueError
+        When a file is missing or its contents don't match.
+
+    """
+    manifest = read_manifest(path)
+    for filename, checksum in manifest['files'].items():
+        full_path = os.path.join(path, filename)
+        if not os.path.exists(full_path) or _sha256(full_path) != checksum:
+            raise ValueError(f"Model artifact {path} is corrupt: {filename} "
+                             "doesn't match its checksum")
+    return manifest
+
+
+def load_artifact(path, verify=False):
+    """Memory-map a model artifact into an `SVDScorer`.
+
+    Parameters
+    ----------
+    path : str
+        Artifact directory written by `export_scorer`.
+    verify : bool
+        Check the checksum of every array before loading. This reads the
+        files in full, so it is off by default.
+
+    Returns
+    -------
+    SVDScorer
+        Scorer whose arrays are memory-mapped read-only.
+
+    """
+    manifest = verify_artifact(path) if verify else read_manifest(path)
+    if manifest['format_version'] > FORMAT_VERSION:
+        raise ValueError(f"Model artifact {path} has format version "
+                         f"{manifest['format_version']}, newer than supported "
+                         f"version {FORMAT_VERSION}")
+    arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+              for name in ARRAYS}
+    # Artifacts exported before the fold-in settings were recorded keep
+    # them within the training metadata of ALS models.
+    metadata = manifest.get('metadata', {})
+    implicit = manifest.get('implicit', metadata.get('mode') == 'implicit')
+    als = metadata.get('algorithm') == 'ALS'
+    defaults = {'alpha': metadata.get('alpha') or 40.0,
+                'input_scale': (0.5, 5.0) if implicit else manifest['rating_scale'],
+                'reg': metadata['reg'] if als else 0.1,
+                'weighted_reg': als and not implicit}
+    settings = {name: manifest.get(name, default) for name, default in defaults.items()}
+    return SVDScorer(arrays['pu'], arrays['qi'], arrays['bu'], arrays['bi'],
+                     manifest['global_mean'], arrays['user_ids'], arrays['item_ids'],
+                     manifest['rating_scale'], version=manifest['model_version'],
+                     implicit=implicit, **settings)
+
+
+def convert_pickle(pickle_path, path):
+    """Export a legacy pickled Surprise model as an artifact."""
+    with open(pickle_path, 'rb') as f:
+        model = pickle.load(f)
+    return export_svd(model, path, source=os.path.basename(pickle_path))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m recommenders.model_artifact <model.pkl> <artifact dir>')
+    manifest = convert_pickle(sys.argv[1], sys.argv[2])
+    print(f"Exported model version {manifest['model_version']} to: {sys.argv[2]}")
@@ -0,0 +1,201 @@
+"""
+
+    Per-movie rating statistics.
+
+    Author: Explore Data Science Academy.
+
+    Description: Rating count, mean and variance of every movie, computed
+    once when the ratings are loaded and indexed by movieId. A Bayesian
+    (shrunk) mean pulls the mean of rarely rated movies towards the global
+    mean rating:
+
+        bayesian_mean = (prior_weight * global_mean + count * mean)
+                        / (prior_weight + count)
+
+    New ratings are merged incrementally with the parallel variance
+    update of Chan et al., so the table never needs to rescan the full
+    ratings history. Ratings recorded live bump `revision`, which the
+    content and hybrid result caches are versioned with.
+
+"""
+
+# Script dependencies
+import threading
+import numpy as np
+import pandas as pd
+from utils.lazy import shared_resource
+
+
+def _group_moments(movie_ids, ratings):
+    """Count, mean and sum of squared deviations per movie of a batch."""
+    ids, inverse = np.unique(np.asarray(movie_ids), return_inverse=True)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    count = np.bincount(inverse, minlength=len(ids)).astype(np.float64)
+    mean = np.bincount(inverse, weights=ratings, minlength=len(ids)) / count
+    m2 = np.bincount(inverse, weights=(ratings - mean[inverse]) ** 2, minlength=len(ids))
+    return ids, count, mean, m2
+
+
+class RatingStats:
+    """Rating aggregates of every rated movie, sorted by movieId.
+
+    Parameters
+    ----------
+    prior_weight : float
+        Number of global-mean pseudo ratings the Bayesian mean is
+        shrunk with.
+
+    """
+
+    def __init__(self, prior_weight=10.0):
+        self.prior_weight = float(prior_weight)
+        self.movie_ids = np.empty(0, dtype=np.int64)
+        self.count = np.empty(0)
+        self.mean = np.empty(0)
+        self.m2 = np.empty(0)
+        # Number of live rating batches merged since the table was built
+        self.revision = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, ratings, prior_weight=10.0):
+        """Aggregate a frame with movieId and rating columns."""
+        stats = cls(prior_weight)
+        stats.update(ratings['movieId'].to_numpy(), ratings['rating'].to_numpy())
+        return stats
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    @property
+    def n_ratings(self):
+        return int(self.count.sum())
+
+    @property
+    def global_mean(self):
+        if not len(self):
+            return np.nan
+        return float(np.dot(self.count, self.mean) / self.count.sum())
+
+    @property
+    def variance(self):
+        """Sample variance per movie, NaN for movies rated once."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    @property
+    def bayesian_mean(self):
+        return ((self.prior_weight * self.global_mean + self.count * self.mean)
+                / (self.prior_weight + self.count))
+
+    def update(self, movie_ids, ratings):
+        """Merge a batch of new ratings into the aggregates.
+
+        Parameters
+        ----------
+        movie_ids : np.ndarray
+            Movie id of every new rating.
+        ratings : np.ndarray
+            New rating values.
+
+        """
+        ids, count, mean, m2 = _group_moments(movie_ids, ratings)
+        all_ids = np.union1d(self.movie_ids, ids)
+
+        old = np.searchsorted(all_ids, self.movie_ids)
+        new = np.searchsorted(all_ids, ids)
+        n_a = np.zeros(len(all_ids))
+        mean_a = np.zeros(len(all_ids))
+        m2_a = np.zeros(len(all_ids))
+        n_a[old], mean_a[old], m2_a[old] = self.count, self.mean, self.m2
+
+        n_b = np.zeros(len(all_ids))
+        mean_b = np.zeros(len(all_ids))
+        m2_b = np.zeros(len(all_ids))
+        n_b[new], mean_b[new], m2_b[new] = count, mean, m2
+
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        # Parallel update of the mean and squared deviations (Chan et al.)
+        self.movie_ids, self.count, self.mean, self.m2 = (
+            all_ids, n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n)
+
+    def add_ratings(self, movie_ids, ratings):
+        """Merge ratings recorded while the app runs, see `update`.
+
+        Concurrent batches are merged one at a time, and each one bumps
+        `revision` so that results cached against the previous statistics
+        are invalidated.
+
+        """
+        with self._lock:
+            self.update(movie_ids, ratings)
+            self.revision += 1
+
+    def positions(self, movie_ids):
+        """Table rows of movie ids, -1 for movies without ratings."""
+        movie_ids = np.asarray(movie_ids)
+        if not len(self):
+            return np.full(len(movie_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), len(self) - 1)
+        return np.where(self.movie_ids[rows] == movie_ids, rows, -1)
+
+    def column(self, name, movie_ids):
+        """Values of one statistic for the given movie ids.
+
+        Parameters
+        ----------
+        name : str
+            One of 'count', 'mean', 'variance' or 'bayesian_mean'.
+        movie_ids : np.ndarray
+            Movie ids to look up.
+
+        Returns
+        -------
+        np.ndarray
+            Statistic per movie id, NaN (0 for 'count') for unrated movies.
+
+        """
+        missing = 0.0 if name == 'count' else np.nan
+        if not len(self):
+            return np.full(len(movie_ids), missing)
+        rows = self.positions(movie_ids)
+        values = np.asarray(getattr(self, name), dtype=np.float64)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)], missing)
+
+    def frame(self):
+        """The statistics as a Pandas Dataframe indexed by movieId."""
+        return pd.DataFrame({'count': self.count.astype(np.int64),
+                             'mean': self.mean,
+                             'variance': self.variance,
+                             'bayesian_mean': self.bayesian_mean},
+                            index=pd.Index(self.movie_ids, name='movieId'))
+
+
+def rating_stats_resource(path_to_ratings='resources/data/ratings.csv'):
+    """Lazily computed statistics of a ratings file, shared process-wide.
+
+    The statistics are aggregated within the single streaming pass that
+    also builds the rating matrix, see `recommenders/ingest.py`.
+
+    """
+    # Imported here, as the ingestion pipeline builds on this module
+    from recommenders.ingest import ingest_resource
+    ingest = ingest_resource(path_to_ratings)
+    return shared_resource(f'rating stats:{path_to_ratings}', lambda: ingest.get()[0])
+
+def load_rating_stats(path_to_ratings='resources/data/ratings.csv'):
+    """Aggregate a ratings file once per process and share the result.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings stored in .csv format.
+
+    Returns
+    -------
+    RatingStats
+        Statistics shared by every caller requesting the same path.
+
+    """
+    return rating_stats_resource(path_to_ratings).get()
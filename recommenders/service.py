@@ -0,0 +1,365 @@
+"""
+
+    Asynchronous HTTP/JSON recommendation service.
+
+    Author: Explore Data Science Academy.
+
+    Description: Serves `content_model`, `collab_model` and `hybrid_model`
+    from one long-running process, so that the data and models are loaded once and
+    shared by every front-end, including the Streamlit app (see
+    `utils/service_client.py`). Endpoints:
+
+        POST /recommend   {"algorithm": "content" | "collab" | "hybrid",
+                           "movies": [titles], "top_n": 10}
+                          -> {"recommendations": [titles], "tier": "primary"
+                              | "neighbours" | "popularity"}
+        GET  /healthz     the process is up
+        GET  /readyz      every data file and model is loaded
+        GET  /stats       batching, backpressure, cache and serving tier
+                          counters
+
+    Requests that miss the result cache are queued per algorithm. A
+    batcher collects the requests arriving within a few milliseconds of
+    each other and scores them in one batched matrix computation (see
+    `recommenders/batch.py`) on a thread pool, so concurrent users share
+    the work. Load is bounded in three places: a full queue answers 503
+    straight away, a limited number of batches are scored at once, and
+    connections beyond a limit are turned away. A request whose result
+    isn't ready within the timeout is answered by a fallback tier (see
+    `recommenders/fallback.py`), or with a 504 when none can serve it.
+
+    Usage (from the repository root):
+
+        python -m recommenders.service --port 8600
+
+"""
+
+# Script dependencies
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from recommenders import content_based, collaborative_based, hybrid_based
+from recommenders.batch import score_block
+from recommenders.fallback import RESOURCES as fallback_resources, serve_fallback, \
+    stats as tier_stats
+from utils import lazy
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'content': content_based.content_model, 'collab': collaborative_based.collab_model,
+          'hybrid': hybrid_based.hybrid_model}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+           504: 'Gateway Timeout'}
+MAX_BODY = 64 * 1024
+
+
+class Overloaded(Exception):
+    """Raised when a request can't be queued."""
+
+
+class MicroBatcher:
+    """Collects concurrent requests of one algorithm into batches.
+
+    Parameters
+    ----------
+    algorithm : str
+        'content', 'collab' or 'hybrid'.
+    executor : concurrent.futures.Executor
+        Pool the batches are scored on.
+    limit : asyncio.Semaphore
+        Bounds the number of batches scored at once, across algorithms.
+    window : float
+        Seconds to wait for more requests after the first of a batch.
+    max_batch : int
+        Largest number of requests scored together.
+    max_pending : int
+        Largest number of queued requests; more are rejected.
+
+    """
+
+    def __init__(self, algorithm, executor, limit, window=0.005, max_batch=64, max_pending=1024):
+        self.algorithm = algorithm
+        self.executor = executor
+        self.limit = limit
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self._tasks = set()
+
+    def submit(self, movies, top_n):
+        """Queue a request, returning the future of its recommendations."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((movies, top_n, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded(f"{self.algorithm} queue is full") from None
+        return future
+
+    async def run(self):
+        """Collect and dispatch batches until cancelled."""
+        while True:
+            batch = [await self.queue.get()]
+            # Give concurrent requests the window to arrive, unless a full
+            # batch is already waiting
+            if self.queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.limit.acquire()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._score, [(movies, top_n) for movies, top_n, _ in batch])
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as error:
+            logger.exception("Scoring a %s batch failed", self.algorithm)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self.limit.release()
+            self.batches += 1
+            self.requests += len(batch)
+
+    def _score(self, requests):
+        # One scoring call per distinct top_n within the batch
+        results = [None] * len(requests)
+        for top_n in {top_n for _, top_n in requests}:
+            rows = [row for row, (_, n) in enumerate(requests) if n == top_n]
+            scored = score_block(self.algorithm, [(row, requests[row][0]) for row in rows], top_n)
+            for row, result in zip(rows, scored):
+                results[row] = result
+        return results
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'batches': self.batches, 'requests': self.requests,
+                'mean_batch': self.requests / self.batches if self.batches else 0.0,
+                'rejected': self.rejected}
+
+
+class RecommendationService:
+    """HTTP front of the micro-batched recommenders.
+
+    Parameters
+    ----------
+    window_ms : float
+        Milliseconds a batch waits for more requests.
+    max_batch : int
+        Largest number of requests scored together.
+    max_pending : int
+        Queued requests per algorithm beyond which requests get a 503.
+    max_batches : int
+        Batches scored at once.
+    max_connections : int
+        Open connections beyond which new connections get a 503.
+    timeout : float
+        Seconds a request may wait for its result before a fallback, or a
+        504 when no fallback can serve it.
+
+    """
+
+    def __init__(self, window_ms=5.0, max_batch=64, max_pending=1024, max_batches=4,
+                 max_connections=256, timeout=10.0):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_batches = max_batches
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connections = 0
+        self.batchers = {}
+        self._tasks = []
+
+    async def start(self, host='127.0.0.1', port=8600):
+        """Start batching and listening, loading the models in the background."""
+        executor = ThreadPoolExecutor(max_workers=self.max_batches, thread_name_prefix='score')
+        limit = asyncio.Semaphore(self.max_batches)
+        for algorithm in MODELS:
+            batcher = MicroBatcher(algorithm, executor, limit, self.window,
+                                   self.max_batch, self.max_pending)
+            self.batchers[algorithm] = batcher
+            self._tasks.append(asyncio.create_task(batcher.run()))
+        lazy.warm_up(background=True, first=fallback_resources)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def ready(self):
+        """Names of the resources that aren't loaded yet."""
+        return [r['name'] for r in lazy.report() if r['kind'] == 'resource' and not r['loaded']]
+
+    async def recommend(self, request):
+        algorithm = request.get('algorithm')
+        movies = request.get('movies')
+        top_n = request.get('top_n', 10)
+        valid_movies = isinstance(movies, list) and movies \
+            and all(isinstance(title, str) for title in movies)
+        # bool is a subclass of int
+        valid_top_n = isinstance(top_n, int) and not isinstance(top_n, bool) and top_n >= 1
+        if algorithm not in MODELS or not valid_movies or not valid_top_n:
+            return 400, {'error': "Expected 'algorithm' (content, collab or hybrid), 'movies' "
+                                  "(non-empty list of titles) and an optional positive "
+                                  "integer 'top_n'"}
+
+        model = MODELS[algorithm]
+        start = time.perf_counter()
+        try:
+            key = model.key(movies, top_n)
+        except KeyError as error:
+            return 404, {'error': error.args[0]}
+        found, recommendations = model.cache.get(key)
+        if found:
+            tier_stats.record(algorithm, 'primary', time.perf_counter() - start)
+            return 200, {'recommendations': recommendations, 'cached': True, 'tier': 'primary'}
+
+        try:
+            future = self.batchers[algorithm].submit(movies, top_n)
+        except Overloaded as error:
+            return 503, {'error': str(error)}
+        try:
+            # Shielded, so that a late result still reaches the cache
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.add_done_callback(lambda done: self._cache_late(model, key, done))
+            fallback = serve_fallback(movies, top_n)
+            if fallback is None:
+                return 504, {'error': f"No result within {self.timeout}s"}
+            tier, recommendations = fallback
+            tier_stats.record(algorithm, tier, time.perf_counter() - start, missed=True)
+            return 200, {'recommendations': recommendations, 'cached': False, 'tier': tier}
+        if 'error' in result:
+            return 404, {'error': result['error']}
+        model.cache.put(key, result['recommendations'])
+        tier_stats.record(algorithm, 'primary', time.perf_counter() - start)
+        return 200, {'recommendations': result['recommendations'], 'cached': False,
+                     'tier': 'primary'}
+
+    @staticmethod
+    def _cache_late(model, key, future):
+        if not future.cancelled() and future.exception() is None \
+                and 'error' not in future.result():
+            model.cache.put(key, future.result()['recommendations'])
+
+    async def route(self, method, path, body):
+        if path == '/healthz':
+            return 200, {'status': 'ok'}
+        if path == '/readyz':
+            loading = self.ready()
+            return (503, {'status': 'loading', 'loading': loading}) if loading \
+                else (200, {'status': 'ready'})
+        if path == '/stats':
+            return 200, {'connections': self.connections,
+                         'batchers': {a: b.stats() for a, b in self.batchers.items()},
+                         'caches': {a: m.cache.stats() for a, m in MODELS.items()},
+                         'tiers': tier_stats.snapshot()}
+        if path == '/recommend':
+            if method != 'POST':
+                return 405, {'error': 'Use POST'}
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                return 400, {'error': 'Body is not valid JSON'}
+            if not isinstance(request, dict):
+                return 400, {'error': 'Body must be a JSON object'}
+            return await self.recommend(request)
+        return 404, {'error': f'No route {path}'}
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one keep-alive connection."""
+        self.connections += 1
+        try:
+            if self.connections > self.max_connections:
+                await self._respond(writer, 503, {'error': 'Too many connections'}, False)
+                return
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, path, version = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                keep_alive = headers.get('connection', '').lower() != 'close' \
+                    and version.strip() == 'HTTP/1.1'
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'Body too large'}, False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, payload = await self.route(method, path.split('?', 1)[0], body)
+                except Exception:
+                    logger.exception("Request %s %s failed", method, path)
+                    status, payload = 500, {'error': 'Internal server error'}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            return
+        except Exception:
+            logger.exception("Connection failed")
+            try:
+                await self._respond(writer, 500, {'error': 'Internal server error'}, False)
+            except Exception:
+                pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        headers = [f'HTTP/1.1 {status} {REASONS[status]}', 'Content-Type: application/json',
+                   f'Content-Length: {len(body)}',
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            headers.append('Retry-After: 1')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+
+
+async def serve(host, port, **options):
+    service = RecommendationService(**options)
+    server = await service.start(host, port)
+    print(f"Serving recommendations on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--window-ms', type=float, default=5.0,
+                        help='milliseconds a batch waits for more requests')
+    parser.add_argument('--max-batch', type=int, default=64, help='requests scored together')
+    parser.add_argument('--max-pending', type=int, default=1024,
+                        help='queued requests per algorithm before answering 503')
+    parser.add_argument('--max-batches', type=int, default=4, help='batches scored at once')
+    parser.add_argument('--max-connections', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='seconds a request waits for its result')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.host, args.port, window_ms=args.window_ms, max_batch=args.max_batch,
+                      max_pending=args.max_pending, max_batches=args.max_batches,
+                      max_connections=args.max_connections, timeout=args.timeout))
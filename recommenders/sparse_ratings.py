@@ -0,0 +1,159 @@
+"""
+
+    Sparse user-item rating matrix.
+
+    Author: Explore Data Science Academy.
+
+    Description: Ratings are held once as a `scipy.sparse` matrix with one
+    row per user and one column per movie, together with the maps between
+    MovieLens ids and matrix positions. The Pearson stage of the
+    collaborative recommender only needs the correlation of the three
+    favourites with every other movie, so it is computed from sparse
+    column sums and a single sparse-dense product instead of a dense
+    pivot and a full title x title correlation matrix. Memory and time
+    scale with the number of stored ratings.
+
+"""
+
+# Script dependencies
+import numpy as np
+from scipy import sparse
+from utils.data_cache import decode_ratings
+
+
+class RatingMatrix:
+    """User-item ratings stored in CSR (by user) and CSC (by movie) form.
+
+    Parameters
+    ----------
+    user_ids, movie_ids : np.ndarray
+        MovieLens user and movie id of every rating.
+    ratings : np.ndarray
+        Rating values.
+
+    """
+
+    def __init__(self, user_ids, movie_ids, ratings):
+        self.user_ids, rows = np.unique(np.asarray(user_ids), return_inverse=True)
+        self.item_ids, cols = np.unique(np.asarray(movie_ids), return_inverse=True)
+        self.csr = sparse.csr_matrix((np.asarray(ratings, dtype=np.float32), (rows, cols)),
+                                     shape=(len(self.user_ids), len(self.item_ids)))
+        self.csc = self.csr.tocsc()
+
+    @classmethod
+    def from_positions(cls, user_ids, item_ids, rows, cols, ratings):
+        """Build the matrix from ratings already mapped to matrix positions.
+
+        Parameters
+        ----------
+        user_ids, item_ids : np.ndarray
+            Sorted MovieLens ids of the matrix rows and columns.
+        rows, cols : np.ndarray
+            Row and column of every rating.
+        ratings : np.ndarray
+            Rating values.
+
+        """
+        matrix = object.__new__(cls)
+        matrix.user_ids, matrix.item_ids = np.asarray(user_ids), np.asarray(item_ids)
+        matrix.csr = sparse.csr_matrix((np.asarray(ratings, dtype=np.float32), (rows, cols)),
+                                       shape=(len(user_ids), len(item_ids)))
+        matrix.csc = matrix.csr.tocsc()
+        return matrix
+
+    @classmethod
+    def from_frame(cls, ratings):
+        """Build the matrix from a frame with userId, movieId and rating columns.
+
+        Ratings may be given as the uint8 half-star codes of the data cache.
+
+        """
+        values = ratings['rating'].to_numpy()
+        if values.dtype == np.uint8:
+            values = decode_ratings(values)
+        return cls(ratings['userId'].to_numpy(), ratings['movieId'].to_numpy(), values)
+
+    @property
+    def shape(self):
+        return self.csr.shape
+
+    @property
+    def nnz(self):
+        return self.csr.nnz
+
+    def user_rows(self, user_ids):
+        """Matrix rows of user ids, skipping users without ratings."""
+        user_ids = np.asarray(user_ids)
+        rows = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+        return rows[self.user_ids[rows] == user_ids]
+
+    def item_columns(self, movie_ids):
+        """Matrix columns of movie ids, -1 for movies without ratings."""
+        movie_ids = np.asarray(movie_ids)
+        cols = np.minimum(np.searchsorted(self.item_ids, movie_ids), len(self.item_ids) - 1)
+        return np.where(self.item_ids[cols] == movie_ids, cols, -1)
+
+    def pearson(self, user_ids, movie_ids, pseudo_rating=None):
+        """Pearson correlation of some movies with every co-rated movie.
+
+        Correlations are computed over the given users only, with missing
+        ratings counted as zero.
+
+        Parameters
+        ----------
+        user_ids : list (int)
+            Users whose ratings the correlation is computed over.
+        movie_ids : list (int)
+            Movies to correlate against every other movie.
+        pseudo_rating : float, optional
+            When given, an extra user rating each of `movie_ids` with this
+            value is added to the users, standing in for the app user.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            Ids of the movies rated within the user subset, and their
+            correlations of shape (n_movies, len(movie_ids)). Correlations
+            that are undefined (constant columns, or favourites none of
+            the users rated) are NaN.
+
+        """
+        movie_ids = np.asarray(movie_ids)
+        sub = self.csr[self.user_rows(np.unique(user_ids))]
+        item_ids = self.item_ids
+
+        # Movies absent from the matrix get their own columns
+        cols = self.item_columns(movie_ids)
+        missing = cols < 0
+        if missing.any():
+            item_ids = np.concatenate([item_ids, movie_ids[missing]])
+            cols[missing] = self.shape[1] + np.arange(missing.sum())
+            sub = sparse.hstack([sub, sparse.csr_matrix((sub.shape[0], missing.sum()))],
+                                format='csr')
+
+        if pseudo_rating is not None:
+            pseudo = sparse.csr_matrix((np.full(len(cols), pseudo_rating, dtype=np.float32),
+                                        (np.zeros(len(cols), dtype=np.int64), cols)),
+                                       shape=(1, sub.shape[1]))
+            sub = sparse.vstack([sub, pseudo], format='csr')
+
+        # Keep only the movies rated within the subset, favourites included
+        # only when rated
+        rated = np.flatnonzero(sub.getnnz(axis=0))
+        sub = sub[:, rated].tocsc()
+        fav_rated = np.isin(cols, rated)
+        fav = np.searchsorted(rated, cols[fav_rated])
+
+        n = sub.shape[0]
+        sums = np.asarray(sub.sum(axis=0)).ravel()
+        squares = np.asarray(sub.multiply(sub).sum(axis=0)).ravel()
+        favourites = sub[:, fav].toarray()
+        products = np.asarray(sub.T @ favourites)
+
+        covariance = n * products - np.outer(sums, sums[fav])
+        variance = n * squares - sums ** 2
+        corr = np.full((len(rated), len(cols)), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr[:, fav_rated] = covariance / np.sqrt(np.outer(variance, variance[fav]))
+        corr[~np.isfinite(corr)] = np.nan
+        return item_ids[rated], corr
@@ -0,0 +1,149 @@
+"""
+
+    Speculative background computation of recommendations.
+
+    Author: Explore Data Science Academy.
+
+    Description: Streamlit reruns the app script on every widget change,
+    but recommendations used to be computed only once "Recommend" was
+    pressed. `speculate` starts computing them on a small background pool
+    as soon as all favourites are selected, so that the press usually finds
+    them in the result cache:
+
+        - every session keeps at most one speculative job, in its session
+          state; selecting other favourites supersedes it, and a
+          superseded job still queued is cancelled (a job already running
+          completes and fills the cache),
+        - jobs are shared by key, so sessions selecting the same
+          favourites share one job,
+        - a request finding its key in flight (see `claim`) waits for the
+          running job instead of computing it again, or takes over a job
+          still queued on the request pool of `recommenders/fallback.py`.
+
+    Recommenders without a result cache (e.g. answered by the
+    recommendation service) are never speculated on.
+
+"""
+
+# Script dependencies
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Speculative jobs running at once, leaving the cores to requests.
+WORKERS = 2
+# Session state entry holding the session's speculative job.
+SESSION_KEY = 'speculative job'
+
+
+class _Job:
+    # A job without future records a key found in the result cache, for
+    # reruns with the same favourites not to look it up again.
+    __slots__ = ('key', 'future', 'holders')
+
+    def __init__(self, key, future):
+        self.key = key
+        self.future = future
+        self.holders = 1
+
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='speculate')
+# Reentrant, as cancelling a job runs its done callbacks right away.
+_lock = threading.RLock()
+_jobs = {}
+_counts = Counter()
+
+
+def _forget(job):
+    # Done callback of every job
+    with _lock:
+        if _jobs.get(job.key) is job:
+            del _jobs[job.key]
+
+
+def _release(job):
+    """Drop a session's interest in a job, cancelling it when unwanted."""
+    if job.future is None:
+        return
+    with _lock:
+        job.holders -= 1
+        if job.holders <= 0 and not job.future.done() and job.future.cancel():
+            _counts['cancelled'] += 1
+
+
+def speculate(model, movie_list, state, top_n=10):
+    """Start computing recommendations a session is likely to request.
+
+    Parameters
+    ----------
+    model : callable
+        A `*_model(movie_list, top_n)` recommender with the `key` and
+        `cache` of `cached_recommender`, optionally wrapped by
+        `with_deadline`.
+    movie_list : list (str)
+        Selected favourite titles, None where not selected yet.
+    state : dict-like
+        The session's state (e.g. `st.session_state`), holding its job.
+    top_n : int
+        Number of recommendations the request will ask for.
+
+    """
+    if not hasattr(model, 'cache') or not all(movie_list):
+        return
+    try:
+        key = model.key(movie_list, top_n)
+    except KeyError:
+        return
+
+    previous = state.get(SESSION_KEY)
+    if previous is not None and previous.key == key:
+        return
+    if key in model.cache:
+        job = _Job(key, None)
+    else:
+        with _lock:
+            job = _jobs.get(key)
+            if job is not None:
+                job.holders += 1
+                _counts['shared'] += 1
+            else:
+                compute = getattr(model, 'primary', model)
+                job = _jobs[key] = _Job(key, _executor.submit(compute, list(movie_list), top_n))
+                _counts['started'] += 1
+        job.future.add_done_callback(lambda future, job=job: _forget(job))
+
+    state[SESSION_KEY] = job
+    if previous is not None:
+        _release(previous)
+
+
+def claim(key):
+    """The running speculative job of a request key, if any.
+
+    A job still queued is cancelled instead, for the request to compute
+    it right away.
+
+    Returns
+    -------
+    concurrent.futures.Future or None
+        The job to wait for, None when the request should compute it.
+
+    """
+    with _lock:
+        job = _jobs.get(key)
+        if job is None:
+            return None
+        if job.future.cancel():
+            return None
+        _counts['claimed'] += 1
+        return job.future
+
+
+def stats():
+    """Number of speculative jobs started, shared, cancelled and claimed."""
+    with _lock:
+        return dict({name: _counts[name] for name in ('started', 'shared', 'cancelled', 'claimed')},
+                    in_flight=len(_jobs))
@@ -0,0 +1,389 @@
+"""
+
+    Vectorised scoring engine for trained SVD models.
+
+    Author: Explore Data Science Academy.
+
+    Description: Surprise's `SVD.predict` estimates a single (user, item)
+    pair per call. Scoring every user against a favourite movie that way
+    costs one Python call per user. The engine below copies the factor
+    (`pu`, `qi`) and bias (`bu`, `bi`) arrays out of a trained model once,
+    so that all users are scored against a batch of items with a single
+    matrix product:
+
+        est(u, i) = mu + bu[u] + bi[i] + pu[u] . qi[i]
+
+    Unknown users and items contribute zero factors and biases, which
+    matches the estimate Surprise falls back to for them.
+
+    Users that were not part of training are folded in: with the item
+    factors held fixed, their latent vector and bias are the solution of a
+    small ridge regression on the ratings they gave, which is exactly one
+    ALS user step. The same step updates existing users incrementally when
+    new ratings arrive, without retraining the model. Models trained on
+    implicit feedback (see `recommenders/als.py`) have no biases and fold
+    users in with the confidence-weighted step they were trained with.
+
+"""
+
+# Script dependencies
+import threading
+import numpy as np
+
+
+def _gather(values, index):
+    """Select rows of `values`, substituting zeros where `index` is -1."""
+    rows = values[np.maximum(index, 0)]
+    rows[index < 0] = 0
+    return rows
+
+
+def top_k(scores, k, axis=0):
+    """Positions of the `k` largest values along an axis.
+
+    Parameters
+    ----------
+    scores : np.ndarray
+        Array of shape (n,) or (n, m).
+    k : int
+        Number of positions to keep.
+    axis : int
+        Axis to select along. Selecting along the contiguous axis of a
+        large batch is much faster than along a strided one.
+
+    Returns
+    -------
+    np.ndarray
+        Positions of the k largest scores, sorted by decreasing score,
+        equal scores by position. Shape (k,) or (k, m) when selecting
+        along the first axis, (n, k) along the second.
+
+    """
+    k = min(k, scores.shape[axis])
+    if k == 0:
+        shape = list(scores.shape)
+        shape[axis] = 0
+        return np.empty(shape, dtype=np.int64)
+    best = np.take(np.argpartition(-scores, k - 1, axis=axis), np.arange(k), axis=axis)
+
+    # Which of several positions tied with the k-th score are selected
+    # depends on the partitioning; keep the first ones instead.
+    kth = np.take_along_axis(scores, best, axis=axis).min(axis=axis, keepdims=True)
+    if np.count_nonzero(scores >= kth) > kth.size * k:
+        above, tied = scores > kth, scores == kth
+        n_above = above.sum(axis=axis, keepdims=True)
+        keep = np.moveaxis(above | (tied & (np.cumsum(tied, axis=axis) <= k - n_above)), axis, -1)
+        best = np.moveaxis(np.nonzero(keep)[-1].reshape(keep.shape[:-1] + (k,)), -1, axis)
+
+    best = np.sort(best, axis=axis)
+    order = np.argsort(-np.take_along_axis(scores, best, axis=axis), axis=axis, kind='stable')
+    return np.take_along_axis(best, order, axis=axis)
+
+
+class SVDScorer:
+    """Factor and bias arrays of a trained SVD model.
+
+    Parameters
+    ----------
+    pu, qi : np.ndarray
+        User and item factor matrices, one row per user/item.
+    bu, bi : np.ndarray
+        User and item biases.
+    global_mean : float
+        Mean rating of the training set.
+    user_ids, item_ids : np.ndarray
+        Raw (MovieLens) ids of the factor rows.
+    rating_scale : tuple
+        Lower and upper bound used to clip estimates.
+    version : str, optional
+        Version of the model artifact the arrays were loaded from.
+    implicit : bool
+        Whether the model was trained on implicit feedback, with ratings
+        as confidences.
+    alpha : float
+        Confidence gained per rating point of an implicit model.
+    input_scale : tuple, optional
+        Lowest and highest rating the model was trained on, `rating_scale`
+        by default. Implicit models estimate preferences in [0, 1], but
+        take these ratings as confidence inputs.
+    reg : float
+        Ridge penalty the model was trained with, used to fold users in.
+    weighted_reg : bool
+        Whether `reg` applies per rating of the user (ALS-WR).
+
+    """
+
+    def __init__(self, pu, qi, bu, bi, global_mean, user_ids, item_ids,
+                 rating_scale=(0.5, 5.0), version=None, implicit=False, alpha=40.0,
+                 input_scale=None, reg=0.1, weighted_reg=False):
+        self.qi = qi
+        self.bi = bi
+        self.global_mean = float(global_mean)
+        self.item_ids = np.asarray(item_ids)
+        self.rating_scale = tuple(rating_scale)
+        self.version = version
+        self.implicit = bool(implicit)
+        self.alpha = float(alpha)
+        self.input_scale = tuple(input_scale or rating_scale)
+        self.reg = float(reg)
+        self.weighted_reg = bool(weighted_reg)
+        self._gram = None
+        # User-side arrays are swapped as a single tuple when ratings are
+        # added, so that concurrent readers always see a consistent model.
+        user_ids = np.asarray(user_ids)
+        self._users = (user_ids, pu, bu, dict(zip(user_ids.tolist(), range(len(user_ids)))))
+        self._users_lock = threading.Lock()
+        self._item_pos = dict(zip(self.item_ids.tolist(), range(len(self.item_ids))))
+
+    @classmethod
+    def from_surprise(cls, model):
+        """Extract the arrays of a fitted Surprise `SVD` model."""
+        trainset = model.trainset
+        user_ids = [trainset.to_raw_uid(u) for u in range(trainset.n_users)]
+        item_ids = [trainset.to_raw_iid(i) for i in range(trainset.n_items)]
+        if model.biased:
+            bu, bi = model.bu, model.bi
+        else:
+            bu, bi = np.zeros(trainset.n_users), np.zeros(trainset.n_items)
+        global_mean = trainset.global_mean if model.biased else 0.0
+        return cls(np.asarray(model.pu, dtype=np.float64), np.asarray(model.qi, dtype=np.float64),
+                   np.asarray(bu, dtype=np.float64), np.asarray(bi, dtype=np.float64),
+                   global_mean, user_ids, item_ids, trainset.rating_scale)
+
+    @property
+    def user_ids(self):
+        return self._users[0]
+
+    @property
+    def pu(self):
+        return self._users[1]
+
+    @property
+    def bu(self):
+        return self._users[2]
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    def user_index(self, user_ids):
+        """Factor rows of raw user ids, -1 for users unknown to the model."""
+        positions = self._users[3]
+        return np.array([positions.get(u, -1) for u in user_ids], dtype=np.int64)
+
+    def item_index(self, item_ids):
+        """Factor rows of raw item ids, -1 for items unknown to the model."""
+        return np.array([self._item_pos.get(i, -1) for i in item_ids], dtype=np.int64)
+
+    def subset_users(self, user_ids):
+        """Restrict scoring to the given raw user ids.
+
+        Users unknown to the model are kept with zero factors and bias,
+        so that they are scored like Surprise scores unknown users.
+
+        """
+        index = self.user_index(user_ids)
+        return SVDScorer(_gather(self.pu, index), self.qi, _gather(self.bu, index), self.bi,
+                         self.global_mean, user_ids, self.item_ids, self.rating_scale,
+                         self.version, self.implicit, self.alpha, self.input_scale, self.reg,
+                         self.weighted_reg)
+
+    def fold_in(self, item_ids, ratings, reg=None, prior=None):
+        """Fit the latent vector and bias of a user from their ratings.
+
+        Solves, with the item factors and biases held fixed,
+
+            min  sum_i (r_i - mu - bi - b - qi . p)^2 + reg * |(p, b) - prior|^2
+
+        or, for implicit models, over every item of the model,
+
+            min  sum_i c_i (p_i - qi . p)^2 + reg * |p - prior|^2
+
+        with confidence c_i = 1 + alpha * r_i and preference p_i = 1 for
+        the rated items, c_i = 1 and p_i = 0 for the others; the bias is
+        then always zero.
+
+        Parameters
+        ----------
+        item_ids : list
+            Raw ids of the rated items. Items unknown to the model are
+            ignored.
+        ratings : list (float)
+            Ratings given to the items.
+        reg : float, optional
+            Ridge penalty of the regression. By default the model's own,
+            multiplied by the number of ratings for ALS-WR models, so that
+            users are solved the way they were trained.
+        prior : tuple (np.ndarray, float), optional
+            Current vector and bias of an existing user, which the
+            solution is shrunk towards instead of zero.
+
+        Returns
+        -------
+        tuple (np.ndarray, float)
+            Latent vector and bias of the user.
+
+        """
+        index = self.item_index(item_ids)
+        known = index >= 0
+        n_factors = self.qi.shape[1]
+        w0 = np.zeros(n_factors + 1)
+        if prior is not None:
+            w0[:-1], w0[-1] = prior
+        if not known.any():
+            return w0[:-1], float(w0[-1])
+
+        index = index[known]
+        if reg is None:
+            reg = self.reg * len(index) if self.weighted_reg else self.reg
+        if self.implicit:
+            return self._fold_in_implicit(index, np.asarray(ratings, dtype=np.float64)[known],
+                                          reg, w0[:-1])
+        x = np.hstack([np.asarray(self.qi[index], dtype=np.float64), np.ones((len(index), 1))])
+        y = (np.asarray(ratings, dtype=np.float64)[known] - self.global_mean
+             - np.asarray(self.bi[index], dtype=np.float64))
+        # Solve the regression around the prior, in its dual form when
+        # there are fewer ratings than factors.
+        y = y - x @ w0
+        if len(index) < x.shape[1]:
+            w = x.T @ np.linalg.solve(x @ x.T + reg * np.eye(len(index)), y)
+        else:
+            w = np.linalg.solve(x.T @ x + reg * np.eye(x.shape[1]), x.T @ y)
+        w += w0
+        return w[:-1], float(w[-1])
+
+    def _fold_in_implicit(self, index, ratings, reg, prior):
+        # Y'CY = Y'Y + Y'(C - I)Y, the first term shared by every user
+        if self._gram is None:
+            qi = np.asarray(self.qi, dtype=np.float64)
+            self._gram = qi.T @ qi
+        x = np.asarray(self.qi[index], dtype=np.float64)
+        confidence = 1.0 + self.alpha * ratings
+        lhs = self._gram + (x.T * (confidence - 1.0)) @ x + reg * np.eye(x.shape[1])
+        return np.linalg.solve(lhs, x.T @ confidence + reg * prior), 0.0
+
+    def score_items(self, pu, bu):
+        """Estimate the rating of every item for a (folded-in) user.
+
+        Parameters
+        ----------
+        pu : np.ndarray
+            Latent vector of the user, or (n_users, n_factors) for several.
+        bu : float or np.ndarray
+            Bias of the user(s).
+
+        Returns
+        -------
+        np.ndarray
+            Clipped estimates of shape (n_items,) or (n_users, n_items).
+
+        """
+        est = np.asarray(pu) @ np.asarray(self.qi).T
+        est += np.asarray(bu)[..., None] if np.ndim(bu) else bu
+        est += self.bi
+        est += self.global_mean
+        return np.clip(est, *self.rating_scale, out=est)
+
+    def add_ratings(self, user_ids, item_ids, ratings, reg=None):
+        """Fold new ratings into the model without retraining.
+
+        Users already known to the model are updated around their current
+        vector; new users are appended. Concurrent calls are applied one
+        after the other, so that no call swaps out the users another added.
+
+        Parameters
+        ----------
+        user_ids, item_ids : np.ndarray
+            Raw user and item id of every new rating.
+        ratings : np.ndarray
+            New rating values.
+        reg : float, optional
+            Ridge penalty of the fold-in regression, see `fold_in`.
+
+        """
+        user_ids = np.asarray(user_ids)
+        item_ids = np.asarray(item_ids)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        users, inverse = np.unique(user_ids, return_inverse=True)
+        with self._users_lock:
+            self._add_users(users, inverse, item_ids, ratings, reg)
+
+    def _add_users(self, users, inverse, item_ids, ratings, reg):
+        known_ids, pu, bu, positions = self._users
+        rows = np.array([positions.get(u, -1) for u in users.tolist()], dtype=np.int64)
+
+        pu = np.array(pu, dtype=np.float64)
+        bu = np.array(bu, dtype=np.float64)
+        new_pu, new_bu = [], []
+        for i, (user, row) in enumerate(zip(users.tolist(), rows.tolist())):
+            mask = inverse == i
+            prior = (pu[row], bu[row]) if row >= 0 else None
+            p, b = self.fold_in(item_ids[mask], ratings[mask], reg=reg, prior=prior)
+            if row >= 0:
+                pu[row], bu[row] = p, b
+            else:
+                new_pu.append(p)
+                new_bu.append(b)
+
+        new_users = users[rows < 0]
+        user_list = np.concatenate([known_ids, new_users])
+        if new_pu:
+            pu = np.vstack([pu, new_pu])
+            bu = np.concatenate([bu, new_bu])
+        positions = dict(positions)
+        positions.update(zip(new_users.tolist(), range(len(known_ids), len(user_list))))
+        self._users = (user_list, pu, bu, positions)
+
+    def score_users(self, item_ids):
+        """Estimate the rating of every user for a batch of items.
+
+        Parameters
+        ----------
+        item_ids : list
+            Raw ids of the items to score.
+
+        Returns
+        -------
+        np.ndarray
+            Clipped estimates of shape (n_users, len(item_ids)).
+
+        """
+        return self._score_users(item_ids)[1]
+
+    def _score_users(self, item_ids, clip=True):
+        user_ids, pu, bu, _ = self._users
+        index = self.item_index(item_ids)
+        qi = _gather(self.qi, index)
+        bi = _gather(self.bi, index)
+        est = pu @ qi.T
+        est += bu[:, None]
+        est += bi[None, :] + self.global_mean
+        if not clip:
+            return user_ids, est
+        return user_ids, np.clip(est, *self.rating_scale, out=est)
+
+    def top_users(self, item_ids, k=10):
+        """Raw ids of the `k` users with the highest estimate per item.
+
+        Parameters
+        ----------
+        item_ids : list
+            Raw ids of the items to score.
+        k : int
+            Number of users to keep per item.
+
+        Returns
+        -------
+        np.ndarray
+            User ids of shape (k, len(item_ids)), best user first.
+
+        Users are ranked by their unclipped estimate: many estimate the
+        top of the rating scale once clipped.
+
+        """
+        user_ids, scores = self._score_users(item_ids, clip=False)
+        return user_ids[top_k(scores, k)]
@@ -0,0 +1,152 @@
+"""
+
+    Parallel cross-validation of collaborative filtering models.
+
+    Author: Explore Data Science Academy.
+
+    Description: Evaluates the six Surprise algorithms described on the
+    app's "Model Performance" page (SVD, NormalPredictor, BaselineOnly,
+    NMF, SlopeOne and CoClustering) over hyperparameter grids with k-fold
+    cross-validation. Fold splits are built once and shipped to each
+    worker process when it starts; every (algorithm, parameters, fold)
+    combination is then fitted and scored as an independent task on a
+    process pool. The results are written as JSON, which the app renders
+    live on the "Model Performance" page.
+
+    Usage (from the repository root):
+
+        python resources/models/benchmark_models.py --sample 100000 --folds 5
+
+"""
+# Script dependencies
+import os
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import surprise
+from surprise import (SVD, NormalPredictor, BaselineOnly, NMF, SlopeOne,
+                      CoClustering, accuracy)
+from surprise.model_selection import KFold
+
+# Hyperparameter grids searched for every algorithm.
+PARAM_GRIDS = {
+    'SVD': (SVD, {'n_factors': [50, 100, 200], 'n_epochs': [20, 40],
+                  'lr_all': [0.005], 'reg_all': [0.02, 0.05]}),
+    'NormalPredictor': (NormalPredictor, {}),
+    'BaselineOnly': (BaselineOnly, {'bsl_options': [{'method': 'als'}, {'method': 'sgd'}]}),
+    'NMF': (NMF, {'n_factors': [15, 30], 'n_epochs': [50]}),
+    'SlopeOne': (SlopeOne, {}),
+    'CoClustering': (CoClustering, {'n_cltr_u': [3, 5], 'n_cltr_i': [3, 5]}),
+}
+
+# Fold splits of the worker process, set once by `_init_worker`.
+_folds = None
+
+
+def _init_worker(folds):
+    global _folds
+    _folds = folds
+
+
+def _expand(grid):
+    """Every combination of a parameter grid."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def _evaluate(name, params, fold):
+    """Fit one algorithm on one fold and score it on the held-out ratings."""
+    algorithm = PARAM_GRIDS[name][0](**params)
+    trainset, testset = _folds[fold]
+    start = time.perf_counter()
+    algorithm.fit(trainset)
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    predictions = algorithm.test(testset)
+    test_time = time.perf_counter() - start
+    return {'algorithm': name, 'params': params, 'fold': fold,
+            'rmse': accuracy.rmse(predictions, verbose=False),
+            'mae': accuracy.mae(predictions, verbose=False),
+            'fit_time': fit_time, 'test_time': test_time}
+
+
+def _summarise(runs):
+    """Average fold results per (algorithm, parameters)."""
+    groups = {}
+    for run in runs:
+        groups.setdefault((run['algorithm'], json.dumps(run['params'], sort_keys=True)), []).append(run)
+    summary = []
+    for (name, params), folds in groups.items():
+        rmse = [f['rmse'] for f in folds]
+        summary.append({'algorithm': name, 'params': json.loads(params),
+                        'rmse_mean': float(np.mean(rmse)), 'rmse_std': float(np.std(rmse)),
+                        'mae_mean': float(np.mean([f['mae'] for f in folds])),
+                        'fit_time': float(np.mean([f['fit_time'] for f in folds])),
+                        'test_time': float(np.mean([f['test_time'] for f in folds])),
+                        'n_folds': len(folds)})
+    return sorted(summary, key=lambda r: r['rmse_mean'])
+
+
+def benchmark(ratings_path, save_path, algorithms=None, n_folds=5, sample=None,
+              workers=None, seed=42):
+    # Importing the ratings, optionally on a random subset
+    ratings = pd.read_csv(ratings_path, usecols=['userId', 'movieId', 'rating'])
+    if sample and sample < len(ratings):
+        ratings = ratings.sample(n=sample, random_state=seed)
+    reader = surprise.Reader(rating_scale=(ratings['rating'].min(), ratings['rating'].max()))
+    data = surprise.Dataset.load_from_df(ratings, reader)
+
+    # Build the fold splits once, shared by every task
+    folds = list(KFold(n_splits=n_folds, random_state=seed).split(data))
+    tasks = [(name, params, fold)
+             for name in algorithms or list(PARAM_GRIDS)
+             for params in _expand(PARAM_GRIDS[name][1])
+             for fold in range(n_folds)]
+    print(f"Evaluating {len(tasks)} fits on {len(ratings)} ratings "
+          f"with {workers or os.cpu_count()} workers")
+
+    runs = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(folds,)) as pool:
+        futures = [pool.submit(_evaluate, *task) for task in tasks]
+        for future in as_completed(futures):
+            run = future.result()
+            runs.append(run)
+            print(f"[{len(runs)}/{len(tasks)}] {run['algorithm']} {run['params']} "
+                  f"fold {run['fold']}: RMSE {run['rmse']:.4f}")
+
+    summary = _summarise(runs)
+    best = {}
+    for result in summary:
+        best.setdefault(result['algorithm'], result)
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+               'n_ratings': len(ratings), 'n_folds': n_folds,
+               'surprise_version': surprise.__version__,
+               'wall_time': time.perf_counter() - start,
+               'best': list(best.values()), 'results': summary, 'runs': runs}
+    with open(save_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark completed in {results['wall_time']:.0f}s. Saving results to: {save_path}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ratings', default='resources/data/ratings.csv')
+    parser.add_argument('--output', default='resources/models/model_results.json')
+    parser.add_argument('--algorithms', nargs='+', choices=list(PARAM_GRIDS),
+                        help='algorithms to evaluate, all by default')
+    parser.add_argument('--folds', type=int, default=5, help='cross-validation folds')
+    parser.add_argument('--sample', type=int, help='evaluate on a random subset of ratings')
+    parser.add_argument('--workers', type=int, help='worker processes, one per core by default')
+    args = parser.parse_args()
+
+    benchmark(args.ratings, args.output, algorithms=args.algorithms, n_folds=args.folds,
+              sample=args.sample, workers=args.workers)
@@ -0,0 +1,67 @@
+"""
+
+    Content neighbour index build.
+
+    Author: Explore Data Science Academy.
+
+    Description: Offline step computing, for every movie of the catalogue,
+    its top-K most similar movies by genres, title words and release year
+    (see `recommenders/content_neighbours.py`). The result is stored as
+    memory-mappable int32 ids and float16 scores that `content_model`
+    merges at request time instead of scoring the whole catalogue.
+
+    When an index built with the same settings already exists, only the
+    movies added to `movies.csv` since, or whose title or genres changed,
+    are scored against the catalogue; `--full` rebuilds every list.
+
+    Usage (from the repository root):
+
+        python resources/models/build_content_neighbours.py \\
+            --movies resources/data/movies.csv \\
+            --output resources/models/content_neighbours [--full]
+
+"""
+# Script dependencies
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from recommenders import content_neighbours
+from recommenders.catalog import MovieCatalog
+from utils.data_cache import load_movies
+
+
+def build_neighbours(movies_path, save_path, k=50, block_size=512, full=False):
+    movies = MovieCatalog(load_movies(movies_path))
+    previous = None if full else content_neighbours.load_previous(save_path, k)
+
+    start = time.time()
+    rows, scores, vocabulary, n_scored = content_neighbours.build(movies, k=k,
+                                                                   block_size=block_size,
+                                                                   previous=previous)
+    if previous is not None and not n_scored:
+        print(f"Index of {len(movies)} movies is up to date: {save_path}")
+        return
+    print(f"Scored {n_scored} of {len(movies)} movies in {time.time() - start:.1f}s. "
+          f"Saving index to: {save_path}")
+
+    content_neighbours.save(save_path, movies, rows, scores, vocabulary,
+                            incremental=previous is not None, n_scored=n_scored)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', default='resources/data/movies.csv')
+    parser.add_argument('--output', default='resources/models/content_neighbours')
+    parser.add_argument('--k', type=int, default=50, help='neighbours kept per movie')
+    parser.add_argument('--block-size', type=int, default=512,
+                        help='movies scored per similarity computation')
+    parser.add_argument('--full', action='store_true',
+                        help='rebuild every list instead of only those of new or edited movies')
+    args = parser.parse_args()
+
+    build_neighbours(args.movies, args.output, k=args.k, block_size=args.block_size,
+                     full=args.full)
@@ -0,0 +1,114 @@
+"""
+
+    Alternating least squares (ALS) model training.
+
+    Author: Explore Data Science Academy.
+
+    Description: Multithreaded alternative to `train_colbased.py` for
+    full-size MovieLens exports (see `recommenders/als.py`). The ratings
+    are ingested in chunks, a random share is held out to stop training
+    once the holdout score stops improving, and the factor and bias arrays
+    are exported as the versioned artifact the collaborative recommender
+    memory-maps. With `--refit` the model is retrained on every rating for
+    the best number of epochs before being exported.
+
+    Usage (from the repository root):
+
+        python resources/models/train_als.py --factors 100 --epochs 15 \\
+            [--implicit] [--refit] --output resources/models/svd
+
+"""
+# Script dependencies
+import os
+import sys
+import time
+import logging
+import argparse
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from recommenders.als import ALSTrainer
+from recommenders.ingest import ingest_ratings
+from recommenders.model_artifact import export_scorer
+
+
+def split_holdout(ratings, share, seed=0):
+    """Hold a random share of the ratings out of a sparse matrix.
+
+    Returns
+    -------
+    tuple (scipy.sparse.csr_matrix, tuple)
+        Training ratings, and the user rows, item columns and ratings
+        held out.
+
+    """
+    ratings = ratings.tocoo()
+    held = np.random.default_rng(seed).random(ratings.nnz) < share
+    train = sparse.csr_matrix((ratings.data[~held], (ratings.row[~held], ratings.col[~held])),
+                              shape=ratings.shape)
+    return train, (ratings.row[held], ratings.col[held], ratings.data[held])
+
+
+def train_als(ratings_path, save_path, n_factors=100, reg=0.1, n_epochs=15, patience=2,
+              implicit=False, alpha=40.0, holdout=0.02, refit=False, workers=None,
+              block_size=1024, seed=0):
+    # Ingesting the ratings into a sparse user x movie matrix
+    matrix = ingest_ratings(ratings_path).rating_matrix()
+    options = dict(n_factors=n_factors, reg=reg, implicit=implicit, alpha=alpha,
+                   patience=patience, workers=workers, block_size=block_size, seed=seed)
+    scale = (float(matrix.csr.data.min()), float(matrix.csr.data.max()))
+
+    start = time.time()
+    if holdout:
+        train, held_out = split_holdout(matrix.csr, holdout, seed)
+        trainer = ALSTrainer(n_epochs=n_epochs, **options).fit(train, held_out, scale)
+        metric = 'AUC' if implicit else 'RMSE'
+        score = next(r['score'] for r in trainer.history if r['epoch'] == trainer.best_epoch)
+        print(f"Best holdout {metric} {score:.4f} after {trainer.best_epoch} epochs")
+        if refit:
+            trainer = ALSTrainer(n_epochs=trainer.best_epoch, **options).fit(matrix.csr,
+                                                                             rating_scale=scale)
+    else:
+        trainer = ALSTrainer(n_epochs=n_epochs, **options).fit(matrix.csr, rating_scale=scale)
+        metric, score = None, None
+    print(f"Training completed in {time.time() - start:.1f}s. Saving model to: {save_path}")
+
+    return export_scorer(trainer.scorer(matrix.user_ids, matrix.item_ids), save_path,
+                         algorithm='ALS', mode='implicit' if implicit else 'explicit',
+                         n_factors=n_factors, reg=reg, alpha=alpha if implicit else None,
+                         n_epochs=trainer.best_epoch, holdout_share=holdout,
+                         holdout_metric=metric, holdout_score=score, refit=refit,
+                         n_ratings=int(matrix.nnz))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ratings', default='resources/data/ratings.csv')
+    parser.add_argument('--output', default='resources/models/svd', help='model artifact directory')
+    parser.add_argument('--factors', type=int, default=100, help='latent factors')
+    parser.add_argument('--reg', type=float, default=0.1,
+                        help="ridge penalty (per rating in explicit mode)")
+    parser.add_argument('--epochs', type=int, default=15, help='largest number of epochs')
+    parser.add_argument('--patience', type=int, default=2,
+                        help='epochs without holdout improvement before stopping')
+    parser.add_argument('--implicit', action='store_true',
+                        help='train on implicit feedback, ratings as confidences')
+    parser.add_argument('--alpha', type=float, default=40.0,
+                        help='confidence per rating point in implicit mode')
+    parser.add_argument('--holdout', type=float, default=0.02,
+                        help='share of ratings held out for early stopping, 0 to train on all')
+    parser.add_argument('--refit', action='store_true',
+                        help='retrain on every rating for the best number of epochs')
+    parser.add_argument('--workers', type=int, help='threads solving blocks, all cores by default')
+    parser.add_argument('--block-size', type=int, default=1024, help='users or movies per task')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    train_als(args.ratings, args.output, n_factors=args.factors, reg=args.reg,
+              n_epochs=args.epochs, patience=args.patience, implicit=args.implicit,
+              alpha=args.alpha, holdout=args.holdout, refit=args.refit, workers=args.workers,
+              block_size=args.block_size, seed=args.seed)
@@ -5,15 +5,21 @@
     Author: Explore Data Science Academy.
 
     Description: Simple script to train and save an instance of the
-    SVDpp algorithm on MovieLens data.
+    SVDpp algorithm on MovieLens data. The model is saved as a versioned
+    numeric artifact (see `recommenders/model_artifact.py`) which the app
+    memory-maps, rather than as a pickled Surprise object.
 
 """
 # Script dependencies
+import os
+import sys
 import numpy as np
 import pandas as pd
 from surprise import SVD
 import surprise
-import pickle
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from recommenders.model_artifact import export_svd
 
 # Importing datasets
 ratings = pd.read_csv('ratings.csv')
@@ -28,12 +34,14 @@ def svd_pp(save_path):
     # Loading the data frame using surprice
     data_load = surprise.Dataset.load_from_df(ratings, reader)
     # Insatntiating surpricce
-    method = SVD(n_factors = 200 , lr_all = 0.005 , reg_all = 0.02 , n_epochs = 40 , init_std_dev = 0.05)
+    params = dict(n_factors = 200 , lr_all = 0.005 , reg_all = 0.02 , n_epochs = 40 , init_std_dev = 0.05)
+    method = SVD(**params)
     # Loading a trainset into the model
     model = method.fit(data_load.build_full_trainset())
     print (f"Training completed. Saving model to: {save_path}")
 
-    return pickle.dump(model, open(save_path,'wb'))
+    return export_svd(model, save_path, algorithm='SVD', surprise_version=surprise.__version__,
+                      n_ratings=len(ratings), **params)
 
 if __name__ == '__main__':
-    svd_pp('SVD.pkl')
+    svd_pp('svd')
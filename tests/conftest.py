@@ -0,0 +1,16 @@
+"""
+
+    Shared test setup.
+
+    Author: Explore Data Science Academy.
+
+    Description: Makes the repository root importable, so that the tests
+    import `recommenders` and `utils` like the app does, whichever
+    directory pytest is started from.
+
+"""
+# Test dependencies
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
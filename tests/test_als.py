@@ -0,0 +1,107 @@
+"""
+
+    Tests of the block ALS trainer and of folding users into its models.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from scipy import sparse
+from recommenders.als import ALSTrainer
+from recommenders.collaborative_based import favourite_rating
+from recommenders.model_artifact import export_scorer, load_artifact
+
+
+def _ratings(n_users=80, n_items=50, density=0.15, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = rng.random((n_users, n_items)) < density
+    mask[:, 0] = True  # every user rates something
+    values = np.clip(np.round(rng.normal(3.5, 1.0, mask.sum()) * 2) / 2, 0.5, 5.0)
+    rows, cols = np.nonzero(mask)
+    return sparse.csr_matrix((values, (rows, cols)), shape=mask.shape)
+
+
+def _fit(implicit):
+    ratings = _ratings()
+    trainer = ALSTrainer(n_factors=5, reg=0.1, implicit=implicit, n_epochs=5, workers=2,
+                         block_size=16).fit(ratings)
+    # One more user half step, from the final item factors
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        trainer._half_step(executor, ratings, trainer.qi, trainer.bi, trainer.pu, trainer.bu)
+    return ratings, trainer
+
+
+def test_explicit_training_fits_the_ratings():
+    ratings = _ratings()
+    trainer = ALSTrainer(n_factors=5, reg=0.05, n_epochs=10, workers=2).fit(ratings)
+    rows, cols = ratings.nonzero()
+    rmse = np.sqrt(np.mean((trainer.predict(rows, cols) - ratings.data) ** 2))
+    assert rmse < np.std(ratings.data)
+    assert len(trainer.history) == 10
+
+
+@pytest.mark.parametrize('implicit', [False, True])
+def test_fold_in_is_one_user_step(implicit):
+    ratings, trainer = _fit(implicit)
+    scorer = trainer.scorer(np.arange(ratings.shape[0]), np.arange(ratings.shape[1]) * 10)
+    assert scorer.implicit == implicit
+
+    for user in range(0, ratings.shape[0], 9):
+        row = ratings[user]
+        # Explicit solves are regularised per rating (ALS-WR)
+        reg = trainer.reg if implicit else trainer.reg * row.nnz
+        p, b = scorer.fold_in(row.indices * 10, row.data, reg=reg)
+        np.testing.assert_allclose(p, trainer.pu[user], atol=1e-8)
+        assert b == pytest.approx(trainer.bu[user], abs=1e-8)
+        # which is the scorer's own regularisation
+        np.testing.assert_allclose(scorer.fold_in(row.indices * 10, row.data)[0], p)
+
+
+def test_implicit_fold_in_weighs_every_item():
+    _, trainer = _fit(True)
+    scorer = trainer.scorer(np.arange(80), np.arange(50))
+    items, ratings = np.array([3, 7, 20]), np.array([5.0, 4.0, 1.0])
+    p, b = scorer.fold_in(items, ratings, reg=0.1)
+
+    # min sum_i c_i (p_i - qi . p)^2 + reg |p|^2 over the whole catalogue
+    confidence, preference = np.ones(50), np.zeros(50)
+    confidence[items], preference[items] = 1 + scorer.alpha * ratings, 1.0
+    qi = scorer.qi
+    expected = np.linalg.solve(qi.T @ (qi * confidence[:, None]) + 0.1 * np.eye(5),
+                               qi.T @ (confidence * preference))
+    np.testing.assert_allclose(p, expected, atol=1e-10)
+    assert b == 0.0
+
+
+def test_artifacts_record_implicit_models(tmp_path):
+    _, trainer = _fit(True)
+    path = str(tmp_path / 'model')
+    export_scorer(trainer.scorer(np.arange(80), np.arange(50)), path, mode='implicit')
+    scorer = load_artifact(path, verify=True)
+    assert scorer.implicit and scorer.alpha == trainer.alpha
+    assert scorer.input_scale == (0.5, 5.0) and not scorer.weighted_reg
+
+    # Artifacts exported before the settings were recorded
+    with open(os.path.join(path, 'meta.json')) as f:
+        manifest = json.load(f)
+    for name in ('implicit', 'alpha', 'input_scale', 'reg', 'weighted_reg'):
+        del manifest[name]
+    manifest['metadata'].update(algorithm='ALS', reg=0.2)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(manifest, f)
+    scorer = load_artifact(path)
+    assert scorer.implicit and scorer.reg == 0.2 and scorer.input_scale == (0.5, 5.0)
+
+
+def test_favourites_are_folded_in_as_top_ratings():
+    for implicit in (False, True):
+        _, trainer = _fit(implicit)
+        scorer = trainer.scorer(np.arange(80), np.arange(50))
+        assert favourite_rating(scorer) == 5.0
+        assert scorer.rating_scale[1] == (1.0 if implicit else 5.0)
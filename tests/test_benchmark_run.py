@@ -0,0 +1,58 @@
+"""
+
+    Tests of the latency summary and regression check of the benchmark.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import numpy as np
+import pytest
+from benchmarks.run import compare, percentiles
+
+
+def _run(**scales):
+    """Run with the given (p95 latency per recommender, peak RSS) per scale."""
+    return {'scales': {scale.lstrip('x'): {'latency_ms': {name: {'p95': p95}
+                                                           for name, p95 in latency.items()},
+                                            'peak_rss_mb': rss}
+                       for scale, (latency, rss) in scales.items()}}
+
+
+def test_percentiles_of_seconds_in_milliseconds():
+    samples = np.arange(1, 101) / 1000.0  # 1ms .. 100ms
+    summary = percentiles(samples)
+
+    assert summary['n'] == 100
+    assert summary['mean'] == pytest.approx(50.5)
+    assert summary['p50'] == pytest.approx(50.5)
+    assert summary['p95'] == pytest.approx(95.05)
+    assert summary['p99'] == pytest.approx(99.01)
+    assert summary['p50'] <= summary['p95'] <= summary['p99']
+
+
+def test_percentiles_of_a_single_sample():
+    assert percentiles([0.002]) == {'p50': 2.0, 'p95': 2.0, 'p99': 2.0, 'mean': 2.0, 'n': 1}
+
+
+def test_growth_within_the_tolerance_is_no_regression():
+    baseline = _run(x10=({'content': 10.0, 'collab': 20.0}, 100.0))
+    current = _run(x10=({'content': 12.0, 'collab': 19.0}, 120.0))
+    assert compare(current, baseline, tolerance=0.2) == []
+
+
+def test_growth_beyond_the_tolerance_is_reported():
+    baseline = _run(x10=({'content': 10.0, 'collab': 20.0}, 100.0))
+    current = _run(x10=({'content': 12.5, 'collab': 20.0}, 130.0))
+
+    regressions = compare(current, baseline, tolerance=0.2)
+    assert regressions == ['[10x] content p95 latency grew from 10.0ms to 12.5ms (+25%)',
+                           '[10x] peak RSS grew from 100.0MB to 130.0MB (+30%)']
+    assert compare(current, baseline, tolerance=0.3) == []
+
+
+def test_scales_and_recommenders_missing_from_the_baseline_are_skipped():
+    baseline = _run(x10=({'content': 10.0}, 100.0))
+    current = _run(x10=({'content': 10.0, 'hybrid': 50.0}, 100.0),
+                   x100=({'content': 99.0}, 999.0))
+    assert compare(current, baseline, tolerance=0.2) == []
@@ -0,0 +1,102 @@
+"""
+
+    Tests of the incremental content neighbour build.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from recommenders import content_neighbours, item_neighbours
+from recommenders.catalog import MovieCatalog
+
+GENRES = ['Action', 'Comedy', 'Drama', 'Horror', 'Romance', 'Sci-Fi', 'Western']
+WORDS = ['love', 'night', 'return', 'dead', 'city', 'story', 'space', 'king', 'river']
+
+
+def _movies(n, seed=0):
+    rng = np.random.default_rng(seed)
+    titles = [' '.join(rng.choice(WORDS, rng.integers(1, 4))).title()
+              + f' ({rng.integers(1950, 2020)})' for _ in range(n)]
+    genres = ['|'.join(rng.choice(GENRES, rng.integers(1, 4), replace=False)) for _ in range(n)]
+    return pd.DataFrame({'movieId': np.arange(1, n + 1) * 3, 'title': titles, 'genres': genres})
+
+
+def _check_same_lists(incremental, full):
+    rows, scores = incremental[:2]
+    full_rows, full_scores = full[:2]
+    # Reused lists hold float16 scores, and movies tied with the last one
+    # listed may be kept in any order
+    scores, full_scores = scores.astype(np.float16), full_scores.astype(np.float16)
+    np.testing.assert_array_equal(scores, full_scores)
+    for row in range(len(rows)):
+        above = full_scores[row] > full_scores[row][-1]
+        assert set(rows[row][above]) == set(full_rows[row][above])
+
+
+def test_incremental_build_matches_a_full_build(tmp_path):
+    k = 15
+    movies = _movies(400)
+    before = MovieCatalog(movies.iloc[:350])
+    content_neighbours.save(str(tmp_path), before,
+                            *content_neighbours.build(before, k=k)[:3])
+
+    # New movies, and movies whose title or genres were edited
+    after = movies.copy()
+    after.loc[[5, 40, 41], 'title'] = ['Space King (1977)', 'Dead River (1990)',
+                                        'City Of Love (2001)']
+    after.loc[[7, 120], 'genres'] = 'Horror|Western'
+    catalogue = MovieCatalog(after)
+
+    previous = content_neighbours.load_previous(str(tmp_path), k)
+    incremental = content_neighbours.build(catalogue, k=k, block_size=64, previous=previous)
+    full = content_neighbours.build(catalogue, k=k)
+    assert 55 <= incremental[3] < 400
+    _check_same_lists(incremental, full)
+
+
+def test_up_to_date_index_is_reused(tmp_path):
+    catalogue = MovieCatalog(_movies(200))
+    rows, scores, vocabulary, n_scored = content_neighbours.build(catalogue, k=10)
+    content_neighbours.save(str(tmp_path), catalogue, rows, scores, vocabulary)
+
+    previous = content_neighbours.load_previous(str(tmp_path), 10)
+    again = content_neighbours.build(catalogue, k=10, previous=previous)
+    assert again[3] == 0
+    np.testing.assert_array_equal(again[0], rows)
+    assert content_neighbours.load_previous(str(tmp_path), 20) is None
+
+
+def test_failed_save_keeps_the_previous_index(tmp_path, monkeypatch):
+    path = str(tmp_path / 'index')
+    before = MovieCatalog(_movies(150))
+    content_neighbours.save(path, before, *content_neighbours.build(before, k=10)[:3])
+    previous = content_neighbours.load_previous(path, 10)
+    old_lists = np.array(previous[0].neighbour_ids)
+
+    after = MovieCatalog(_movies(180))
+    built = content_neighbours.build(after, k=10, previous=previous)
+    # Interrupt the save once the arrays are written, at the vocabulary
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(item_neighbours, 'json', SimpleNamespace(dump=interrupt))
+    with pytest.raises(KeyboardInterrupt):
+        content_neighbours.save(path, after, *built[:3])
+    monkeypatch.undo()
+
+    assert os.listdir(tmp_path) == ['index']
+    np.testing.assert_array_equal(previous[0].neighbour_ids, old_lists)
+    index, vocabulary, hashes = content_neighbours.load_previous(path, 10)
+    assert len(index.item_ids) == len(hashes) == 150
+
+    # A completed save swaps everything in while the old index is mapped
+    content_neighbours.save(path, after, *built[:3])
+    np.testing.assert_array_equal(previous[0].neighbour_ids, old_lists)
+    index, vocabulary, hashes = content_neighbours.load_previous(path, 10)
+    assert len(index.item_ids) == len(hashes) == 180
+    assert content_neighbours.build(after, k=10, previous=(index, vocabulary, hashes))[3] == 0
@@ -0,0 +1,34 @@
+"""
+
+    Tests of the latency budget wrapper of the recommenders.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+from recommenders import fallback
+from utils.result_cache import cached_recommender
+
+
+def _model(calls):
+    @cached_recommender('test', lambda movies: [len(title) for title in movies], lambda: 1)
+    def model(movie_list, top_n=10):
+        calls.append(list(movie_list))
+        return list(movie_list)[:top_n]
+    return model
+
+
+def test_cache_counters_through_the_deadline_wrapper():
+    calls = []
+    model = _model(calls)
+    wrapper = fallback.with_deadline(model, 'test', budget=5.0)
+
+    assert wrapper(['a', 'bb'], 1) == ['a']
+    stats = model.cache.stats()
+    assert (stats['hits'], stats['misses']) == (0, 1)
+
+    assert wrapper(['a', 'bb'], 1) == ['a']
+    stats = model.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+    assert calls == [['a', 'bb']]
+    assert wrapper.primary is model
@@ -0,0 +1,63 @@
+"""
+
+    Tests of the streaming ratings ingestion and the rating aggregates.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import numpy as np
+import pandas as pd
+import pytest
+from recommenders.ingest import ingest_ratings
+from recommenders.rating_stats import RatingStats
+
+
+def _ratings(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'userId': rng.integers(1, 200, n),
+                         'movieId': rng.choice([1, 2, 3, 50, 1000, 193609], n),
+                         'rating': rng.choice(np.arange(1, 11) / 2, n),
+                         'timestamp': rng.integers(789652004, 1537799250, n)}) \
+        .drop_duplicates(['userId', 'movieId'], ignore_index=True)
+
+
+def test_merged_stats_match_a_single_pass():
+    ratings = _ratings()
+    single = RatingStats.from_frame(ratings)
+    merged = RatingStats()
+    for start in range(0, len(ratings), 300):
+        chunk = ratings.iloc[start:start + 300]
+        merged.update(chunk['movieId'].to_numpy(), chunk['rating'].to_numpy())
+
+    np.testing.assert_array_equal(merged.movie_ids, single.movie_ids)
+    for name in ('count', 'mean', 'variance', 'bayesian_mean'):
+        np.testing.assert_allclose(getattr(merged, name), getattr(single, name))
+
+    expected = ratings.groupby('movieId')['rating'].agg(['count', 'mean', 'var'])
+    np.testing.assert_allclose(merged.mean, expected['mean'])
+    np.testing.assert_allclose(merged.variance, expected['var'])
+
+
+@pytest.mark.parametrize('chunk_rows', [None, 333])
+def test_chunked_ingest_matches_read_csv(tmp_path, chunk_rows):
+    path = tmp_path / 'ratings.csv'
+    _ratings().to_csv(path, index=False)
+    expected = pd.read_csv(path)
+
+    # The first pass parses the csv, the second streams the cache
+    for _ in range(2):
+        ingest = ingest_ratings(str(path), chunk_rows=chunk_rows)
+        assert ingest.rows == len(expected)
+
+        stats = RatingStats.from_frame(expected)
+        np.testing.assert_array_equal(ingest.stats.movie_ids, stats.movie_ids)
+        np.testing.assert_allclose(ingest.stats.count, stats.count)
+        np.testing.assert_allclose(ingest.stats.mean, stats.mean)
+
+        matrix = ingest.rating_matrix()
+        dense = expected.pivot_table(index='userId', columns='movieId', values='rating',
+                                     fill_value=0)
+        np.testing.assert_array_equal(matrix.user_ids, dense.index)
+        np.testing.assert_array_equal(matrix.item_ids, dense.columns)
+        np.testing.assert_allclose(matrix.csr.toarray(), dense.to_numpy())
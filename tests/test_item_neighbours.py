@@ -0,0 +1,81 @@
+"""
+
+    Tests of the neighbour list search and merging shared by the indexes.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import os
+
+import numpy as np
+import pytest
+from recommenders.item_neighbours import (_blocked_topk, _merge_topk, build_exact, build_lsh,
+                                          load_index, sampled_recall, save_index)
+
+
+def _unit(n, d=8, seed=0):
+    rows = np.random.default_rng(seed).normal(size=(n, d))
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize('k, block_size', [(5, 7), (30, 100), (80, 16)])
+def test_blocked_topk_matches_brute_force(k, block_size):
+    base = _unit(60)
+    query = np.arange(0, 60, 3)
+    ids, scores = _blocked_topk(base[query], base, k, block_size, query)
+
+    sims = base[query] @ base.T
+    sims[np.arange(len(query)), query] = -np.inf
+    k_eff = min(k, 59)
+    expected = np.argsort(-sims, axis=1)[:, :k_eff]
+    np.testing.assert_array_equal(ids[:, :k_eff], expected)
+    np.testing.assert_allclose(scores[:, :k_eff],
+                               np.take_along_axis(sims, expected, axis=1), rtol=1e-6)
+    # Padding where the base holds fewer than k other rows
+    assert (ids[:, k_eff:] == -1).all() and np.isneginf(scores[:, k_eff:]).all()
+
+
+def test_merge_topk_keeps_the_best_distinct_candidates():
+    rng = np.random.default_rng(1)
+    value = rng.random(100)  # score of every candidate id
+    k = 6
+    for _ in range(30):
+        a, b = rng.integers(0, 100, (2, 3, 8))
+        ids, scores = _merge_topk(a, value[a].astype(np.float32), b,
+                                  value[b].astype(np.float32), k)
+        for row in range(3):
+            union = np.union1d(a[row], b[row])
+            expected = union[np.argsort(-value[union])][:k]
+            np.testing.assert_array_equal(ids[row], expected)
+            np.testing.assert_allclose(scores[row], value[expected], rtol=1e-6)
+
+
+def test_lsh_lists_are_mostly_exact():
+    factors = _unit(2000, d=16)
+    rows, scores = build_lsh(factors, k=20)
+    assert rows.shape == (2000, 20)
+    assert sampled_recall(factors, rows, n_samples=200) > 0.7
+
+
+def test_saving_replaces_an_index_still_mapped(tmp_path):
+    path = str(tmp_path / 'index')
+    rows, scores = build_exact(_unit(30), k=5)
+    save_index(path, np.arange(30) * 2, rows, scores, model_version='a')
+    old = load_index(path, 'a')
+    old_lists = np.array(old.neighbour_ids)
+
+    save_index(path, np.arange(40) * 2, *build_exact(_unit(40, seed=1), k=5), model_version='b')
+    # The previous files stay readable by the processes mapping them
+    np.testing.assert_array_equal(old.neighbour_ids, old_lists)
+    assert len(load_index(path, 'b').item_ids) == 40
+    assert load_index(path, 'a') is None
+    assert sorted(os.listdir(tmp_path)) == ['index']
+
+
+def test_empty_index_covers_nothing(tmp_path):
+    path = str(tmp_path / 'index')
+    save_index(path, np.empty(0), np.empty((0, 5), dtype=np.int64), np.empty((0, 5)))
+    index = load_index(path)
+    np.testing.assert_array_equal(index.rows([1, 2]), [-1, -1])
+    assert not index.covers([1]) and index.recommend([1]) == []
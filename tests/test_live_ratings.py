@@ -0,0 +1,59 @@
+"""
+
+    Tests of ratings recorded while the app runs.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from recommenders import content_based, hybrid_based
+from recommenders.rating_stats import RatingStats
+from utils.lazy import LazyResource
+
+
+def _loaded(name, value):
+    resource = LazyResource(name, lambda: value)
+    resource.get()
+    return resource
+
+
+def test_live_ratings_bump_the_revision():
+    ratings = pd.DataFrame({'movieId': [1, 1, 2], 'rating': [4.0, 5.0, 3.0]})
+    stats = RatingStats.from_frame(ratings)
+    assert stats.revision == 0
+
+    stats.add_ratings([2, 3], [5.0, 1.0])
+    expected = RatingStats.from_frame(
+        pd.DataFrame({'movieId': [1, 1, 2, 2, 3], 'rating': [4.0, 5.0, 3.0, 5.0, 1.0]}))
+    assert stats.revision == 1
+    np.testing.assert_array_equal(stats.movie_ids, expected.movie_ids)
+    np.testing.assert_allclose(stats.bayesian_mean, expected.bayesian_mean)
+
+
+def test_live_ratings_invalidate_content_and_hybrid_results(monkeypatch):
+    stats = RatingStats.from_frame(pd.DataFrame({'movieId': [1, 2], 'rating': [4.0, 3.0]}))
+    monkeypatch.setattr(content_based, 'rating_stats', _loaded('test:stats', stats))
+    monkeypatch.setattr(content_based, 'data_version', lambda: 'data')
+    monkeypatch.setattr(hybrid_based.collaborative_based, 'model_version', lambda: 'model')
+    monkeypatch.setattr(hybrid_based, '_pool_version', lambda: 'pool')
+    pool = _loaded('test:pool', SimpleNamespace(stats_revision=stats.revision))
+    monkeypatch.setattr(hybrid_based, 'candidate_pool', pool)
+
+    content, hybrid = content_based.content_version(), hybrid_based.hybrid_version()
+    assert pool.loaded
+    stats.add_ratings([1], [5.0])
+
+    assert content_based.content_version() != content
+    assert hybrid_based.hybrid_version() != hybrid
+    # The candidate pool snapshots the statistics, so it is rebuilt too
+    assert not pool.loaded
+
+
+def test_unloaded_stats_do_not_block_the_version(monkeypatch):
+    stats = LazyResource('test:unloaded stats', lambda: 1 / 0)
+    monkeypatch.setattr(content_based, 'rating_stats', stats)
+    assert content_based.stats_revision() == 0
+    assert not stats.loaded
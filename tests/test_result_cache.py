@@ -0,0 +1,118 @@
+"""
+
+    Tests of the bounded cache of recommendation results.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import os
+from types import SimpleNamespace
+import pytest
+from utils import result_cache
+from utils.lazy import LazyResource
+from utils.result_cache import ResultCache, artifact_version, cached_recommender
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manually advanced replacement of the cache's monotonic clock."""
+    now = SimpleNamespace(seconds=1000.0)
+    monkeypatch.setattr(result_cache, 'time', SimpleNamespace(monotonic=lambda: now.seconds))
+    return now
+
+
+def test_least_recently_used_entries_are_evicted_first(clock):
+    cache = ResultCache(max_size=3)
+    for key in 'abc':
+        cache.put(key, key.upper())
+    assert cache.get('a') == (True, 'A')  # 'b' is now the least recently used
+
+    cache.put('d', 'D')
+    cache.put('e', 'E')
+    assert [key in cache for key in 'abcde'] == [True, False, False, True, True]
+    assert cache.evictions == 2 and len(cache) == 3
+
+
+def test_putting_a_cached_key_again_refreshes_it(clock):
+    cache = ResultCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('a', 3)
+    cache.put('c', 4)
+    assert cache.get('a') == (True, 3)
+    assert 'b' not in cache and cache.evictions == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResultCache(ttl=60.0)
+    cache.put('a', 1)
+    clock.seconds += 59.9
+    assert cache.get('a') == (True, 1)
+
+    clock.seconds += 0.2
+    assert 'a' not in cache
+    assert cache.get('a') == (False, None)
+    assert len(cache) == 0  # the expired entry was dropped on lookup
+
+
+def test_a_new_version_empties_the_cache(clock):
+    cache = ResultCache()
+    cache.validate('v1')
+    cache.put('a', 1)
+    cache.validate('v1')
+    assert 'a' in cache
+
+    cache.validate('v2')
+    assert 'a' not in cache and cache.version == 'v2'
+
+
+def test_counters(clock):
+    cache = ResultCache(max_size=1)
+    assert cache.stats()['hit_rate'] == 0.0
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    assert 'a' in cache and 'b' not in cache  # membership checks aren't lookups
+    cache.put('b', 2)
+
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'hit_rate': pytest.approx(2 / 3),
+                             'evictions': 1, 'size': 1, 'max_size': 1, 'ttl': 3600.0}
+
+
+def test_cached_recommender_keys_on_sorted_favourites_and_version(clock):
+    calls = []
+    version = SimpleNamespace(current='v1')
+    ids = {'Up': 3, 'Heat': 1, 'Jaws': 2}
+
+    @cached_recommender('test', lambda movies: [ids[m] for m in movies], lambda: version.current)
+    def model(movie_list, top_n=10):
+        calls.append(list(movie_list))
+        return ['x'] * top_n
+
+    assert model(['Up', 'Heat', 'Jaws'], 2) == ['x', 'x']
+    assert model(['Jaws', 'Up', 'Heat'], 2) == ['x', 'x']
+    assert len(calls) == 1
+    assert model.key(['Heat', 'Jaws', 'Up'], 2) == ('test', (1, 2, 3), 2, 'v1')
+
+    model(['Up', 'Heat', 'Jaws'], 3)
+    version.current = 'v2'
+    model(['Up', 'Heat', 'Jaws'], 2)
+    assert len(calls) == 3 and len(model.cache) == 1
+
+
+def test_artifact_version_resets_resources_when_a_file_changes(tmp_path):
+    path = tmp_path / 'model.bin'
+    path.write_bytes(b'one')
+    resource = LazyResource('test:artifact', lambda: path.read_bytes())
+    version = artifact_version([str(path)], [resource])
+
+    first = version()
+    assert resource.get() == b'one'
+    assert version() == first and resource.loaded
+
+    path.write_bytes(b'three')
+    os.utime(path, ns=(0, 0))
+    assert version() != first
+    assert not resource.loaded and resource.get() == b'three'
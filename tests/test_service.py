@@ -0,0 +1,75 @@
+"""
+
+    Tests of the micro-batching recommendation service.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from benchmarks.synthetic import generate
+from recommenders import content_based
+from recommenders.service import MODELS, MicroBatcher
+from utils import lazy
+
+
+def _reset_resources():
+    for resource in lazy._resources.values():
+        resource.reset()
+    for model in MODELS.values():
+        model.cache.clear()
+
+
+@pytest.fixture
+def requests(tmp_path, monkeypatch):
+    """Favourite lists and top_n drawn from a synthetic dataset, which the
+    recommenders load from the working directory."""
+    monkeypatch.chdir(generate(str(tmp_path), 1))
+    _reset_resources()
+
+    movies = content_based.catalog.get()
+    stats = content_based.rating_stats.get()
+    rated = [i for i in stats.movie_ids[np.argsort(-stats.count)[:200]].tolist()
+             if movies.resolve(movies.title(i)) == i]
+    rng = np.random.default_rng(0)
+    lists = [[movies.title(i) for i in rng.choice(rated, 3, replace=False)] for _ in range(12)]
+    # The same favourites in another order, and different top_n within a batch
+    lists.append(lists[0][::-1])
+    yield [(titles, 5 if row % 3 else 10) for row, titles in enumerate(lists)]
+    _reset_resources()
+
+
+async def _serve_batched(algorithm, requests):
+    batcher = MicroBatcher(algorithm, ThreadPoolExecutor(max_workers=2), asyncio.Semaphore(2),
+                           window=0.05)
+    runner = asyncio.create_task(batcher.run())
+    try:
+        futures = [batcher.submit(titles, top_n) for titles, top_n in requests]
+        results = await asyncio.wait_for(asyncio.gather(*futures), 30.0)
+    finally:
+        runner.cancel()
+        batcher.executor.shutdown(wait=False)
+    return results, batcher.stats()
+
+
+@pytest.mark.parametrize('algorithm', sorted(MODELS))
+def test_batched_requests_match_single_calls(algorithm, requests):
+    results, stats = asyncio.run(_serve_batched(algorithm, requests))
+
+    assert stats['requests'] == len(requests)
+    assert stats['batches'] < len(requests)
+    for (titles, top_n), result in zip(requests, results):
+        assert result['movies'] == titles
+        assert result['recommendations'] == MODELS[algorithm](titles, top_n)
+        assert len(result['recommendations']) == top_n
+
+
+def test_unknown_titles_fail_alone_within_a_batch(requests):
+    titles, top_n = requests[0]
+    results, _ = asyncio.run(_serve_batched('content', [(titles, top_n),
+                                                        (['Not A Movie (1900)'], top_n)]))
+    assert results[0]['recommendations'] == MODELS['content'](titles, top_n)
+    assert 'error' in results[1] and 'recommendations' not in results[1]
@@ -0,0 +1,75 @@
+"""
+
+    Tests of the sparse rating matrix against the dense pivot it replaced.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import numpy as np
+import pandas as pd
+import pytest
+from recommenders.sparse_ratings import RatingMatrix
+
+
+def _ratings(n_users=60, n_movies=40, density=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    pairs = np.argwhere(rng.random((n_users, n_movies)) < density)
+    return pd.DataFrame({'userId': pairs[:, 0] + 1, 'movieId': (pairs[:, 1] + 1) * 10,
+                         'rating': rng.choice(np.arange(1, 11) / 2, len(pairs))})
+
+
+def _pivot_pearson(ratings, user_ids, movie_ids, pseudo_rating=None):
+    """Pearson correlations the way the pivot-table implementation did."""
+    subset = ratings[ratings['userId'].isin(user_ids)]
+    pivot = subset.pivot_table(index='userId', columns='movieId', values='rating').fillna(0)
+    if pseudo_rating is not None:
+        app_user = pd.DataFrame({m: [pseudo_rating] for m in movie_ids}, index=[0])
+        pivot = pd.concat([pivot, app_user]).fillna(0)
+    return pivot.columns.to_numpy(), pivot.corr()[list(movie_ids)].to_numpy()
+
+
+@pytest.mark.parametrize('pseudo_rating', [None, 5.0])
+def test_pearson_matches_the_pivot_table(pseudo_rating):
+    ratings = _ratings()
+    matrix = RatingMatrix.from_frame(ratings)
+    rng = np.random.default_rng(1)
+    users = rng.choice(ratings['userId'].unique(), 25, replace=False)
+    movies = ratings[ratings['userId'].isin(users)]['movieId'].unique()[:3]
+
+    ids, corr = matrix.pearson(users, movies, pseudo_rating=pseudo_rating)
+    expected_ids, expected = _pivot_pearson(ratings, users, movies, pseudo_rating)
+    order = np.argsort(ids)
+    np.testing.assert_array_equal(ids[order], expected_ids)
+    np.testing.assert_allclose(corr[order], expected, atol=1e-5)
+
+
+def test_pearson_of_movies_missing_from_the_matrix():
+    ratings = _ratings()
+    matrix = RatingMatrix.from_frame(ratings)
+    users = ratings['userId'].unique()[:20]
+    movies = [ratings['movieId'].iloc[0], 99999]
+
+    ids, corr = matrix.pearson(users, movies, pseudo_rating=5.0)
+    expected_ids, expected = _pivot_pearson(ratings, users, movies, 5.0)
+    order = np.argsort(ids)
+    np.testing.assert_array_equal(ids[order], expected_ids)
+    np.testing.assert_allclose(corr[order], expected, atol=1e-5)
+
+
+def test_pearson_of_favourites_the_users_never_rated():
+    ratings = _ratings()
+    matrix = RatingMatrix.from_frame(ratings)
+    users = ratings['userId'].unique()[:10]
+    subset = ratings[ratings['userId'].isin(users)]
+    rated = subset['movieId'].unique()[:2]
+    unrated = np.setdiff1d(ratings['movieId'].unique(), subset['movieId'])[:1]
+    movies = [rated[0], unrated[0], rated[1], 99999]
+
+    ids, corr = matrix.pearson(users, movies)
+    expected_ids, expected = _pivot_pearson(ratings, users, rated)
+    order = np.argsort(ids)
+    np.testing.assert_array_equal(ids[order], expected_ids)
+    assert corr.shape == (len(ids), 4)
+    np.testing.assert_allclose(corr[order][:, [0, 2]], expected, atol=1e-5)
+    assert np.isnan(corr[:, [1, 3]]).all()
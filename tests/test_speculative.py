@@ -0,0 +1,108 @@
+"""
+
+    Tests of the speculative background computation of recommendations.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import threading
+import pytest
+from recommenders import fallback, speculative
+from utils.result_cache import cached_recommender
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def gated():
+    """Cached recommender whose calls block until `release` is set."""
+    calls = []
+    started = threading.Semaphore(0)
+    release = threading.Event()
+    # Jobs are shared process-wide by key, so every test gets its own
+    version = object()
+
+    @cached_recommender('test', lambda movies: [ord(title[0]) for title in movies],
+                        lambda: version)
+    def model(movie_list, top_n=10):
+        calls.append(list(movie_list))
+        started.release()
+        assert release.wait(TIMEOUT)
+        return list(movie_list)[:top_n]
+
+    model.calls, model.started, model.release = calls, started, release
+    yield model
+    release.set()
+
+
+def _count(name, before):
+    return speculative.stats()[name] - before[name]
+
+
+def test_a_finished_speculation_is_served_from_the_cache(gated):
+    state = {}
+    speculative.speculate(gated, ['a', 'b', 'c'], state, top_n=2)
+    gated.release.set()
+    state[speculative.SESSION_KEY].future.result(TIMEOUT)
+
+    assert gated(['c', 'b', 'a'], 2) == ['a', 'b']
+    assert len(gated.calls) == 1
+    assert gated.cache.stats()['hits'] == 1
+
+
+def test_a_request_waits_for_its_running_speculation(gated):
+    before = speculative.stats()
+    wrapper = fallback.with_deadline(gated, 'test', budget=TIMEOUT)
+    speculative.speculate(wrapper, ['a', 'b', 'c'], {}, top_n=2)
+    assert gated.started.acquire(timeout=TIMEOUT)
+
+    threading.Timer(0.05, gated.release.set).start()
+    assert wrapper(['a', 'b', 'c'], 2) == ['a', 'b']
+    assert len(gated.calls) == 1
+    assert _count('claimed', before) == 1
+
+
+def test_sessions_selecting_the_same_favourites_share_a_job(gated):
+    before = speculative.stats()
+    first, second = {}, {}
+    speculative.speculate(gated, ['a', 'b', 'c'], first)
+    speculative.speculate(gated, ['c', 'a', 'b'], second)
+
+    assert first[speculative.SESSION_KEY] is second[speculative.SESSION_KEY]
+    assert (_count('started', before), _count('shared', before)) == (1, 1)
+    gated.release.set()
+    first[speculative.SESSION_KEY].future.result(TIMEOUT)
+    assert len(gated.calls) == 1
+
+
+def test_a_superseded_queued_speculation_is_cancelled(gated):
+    before = speculative.stats()
+    # Occupy every speculative worker
+    for title in 'xyz'[:speculative.WORKERS]:
+        speculative.speculate(gated, [title, 'b', 'c'], {})
+    for _ in range(speculative.WORKERS):
+        assert gated.started.acquire(timeout=TIMEOUT)
+
+    state = {}
+    speculative.speculate(gated, ['a', 'b', 'c'], state)
+    queued = state[speculative.SESSION_KEY].future
+    speculative.speculate(gated, ['d', 'b', 'c'], state)
+
+    assert queued.cancelled()
+    assert _count('cancelled', before) == 1
+    gated.release.set()
+    state[speculative.SESSION_KEY].future.result(TIMEOUT)
+    assert ['a', 'b', 'c'] not in gated.calls
+
+
+def test_a_superseded_running_speculation_still_fills_the_cache(gated):
+    state = {}
+    speculative.speculate(gated, ['a', 'b', 'c'], state)
+    running = state[speculative.SESSION_KEY].future
+    assert gated.started.acquire(timeout=TIMEOUT)
+    speculative.speculate(gated, ['d', 'b', 'c'], state)
+
+    gated.release.set()
+    assert running.result(TIMEOUT) == ['a', 'b', 'c']
+    assert gated.key(['a', 'b', 'c']) in gated.cache
@@ -0,0 +1,142 @@
+"""
+
+    Tests of the vectorised SVD scoring engine.
+
+    Author: Explore Data Science Academy.
+
+"""
+# Test dependencies
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from recommenders.svd_engine import SVDScorer, top_k
+
+
+def _reference_top_k(scores, k, axis):
+    """Top-k by sorting every slice, ties broken by position."""
+    moved = np.moveaxis(scores, axis, -1)
+    best = np.stack([np.lexsort((np.arange(len(row)), -row))[:k]
+                     for row in moved.reshape(-1, moved.shape[-1])])
+    return np.moveaxis(best.reshape(moved.shape[:-1] + (k,)), -1, axis)
+
+
+def _scorer(n_users=40, n_items=25, n_factors=4, seed=0):
+    rng = np.random.default_rng(seed)
+    return SVDScorer(rng.normal(0, 0.5, (n_users, n_factors)),
+                     rng.normal(0, 0.5, (n_items, n_factors)),
+                     rng.normal(0, 0.3, n_users), rng.normal(0, 0.3, n_items), 3.5,
+                     np.arange(1, n_users + 1) * 10, np.arange(1, n_items + 1) * 100)
+
+
+@pytest.mark.parametrize('shape, axis', [((60,), 0), ((50, 3), 0), ((4, 70), 1)])
+def test_top_k_matches_sorting(shape, axis):
+    rng = np.random.default_rng(1)
+    for trial in range(50):
+        # Few distinct values, so that ties straddle the k-th place
+        scores = rng.integers(0, 4, shape).astype(float) if trial % 2 else rng.normal(size=shape)
+        k = int(rng.integers(1, shape[axis] + 1))
+        np.testing.assert_array_equal(top_k(scores, k, axis=axis),
+                                      _reference_top_k(scores, k, axis))
+
+
+def test_top_k_of_nothing():
+    assert top_k(np.arange(5.0), 0).shape == (0,)
+    assert top_k(np.ones((3, 5)), 0, axis=1).shape == (3, 0)
+
+
+def test_score_users_matches_formula():
+    svd = _scorer()
+    items = [100, 300, 999]  # 999 is unknown to the model
+    est = svd.score_users(items)
+
+    expected = np.empty((svd.n_users, len(items)))
+    for u in range(svd.n_users):
+        for j, item in enumerate(items):
+            i = svd.item_index([item])[0]
+            qi, bi = (svd.qi[i], svd.bi[i]) if i >= 0 else (np.zeros(svd.qi.shape[1]), 0.0)
+            expected[u, j] = svd.global_mean + svd.bu[u] + bi + np.dot(svd.pu[u], qi)
+    np.testing.assert_allclose(est, np.clip(expected, 0.5, 5.0))
+
+
+def test_top_users_ranks_unclipped_estimates():
+    svd = _scorer()
+    svd.qi[0] *= 20  # most users estimate item 100 above the rating scale
+    users = svd.top_users([100, 200], k=5)
+
+    assert users.shape == (5, 2)
+    raw = svd.pu @ svd.qi[:2].T + svd.bu[:, None] + svd.bi[:2] + svd.global_mean
+    for j in range(2):
+        np.testing.assert_array_equal(users[:, j], svd.user_ids[np.argsort(-raw[:, j])[:5]])
+
+
+def _ridge(svd, item_ids, ratings, reg, prior=None):
+    """The fold-in regression solved directly in its primal form."""
+    index = svd.item_index(item_ids)
+    x = np.hstack([svd.qi[index], np.ones((len(index), 1))])
+    y = np.asarray(ratings) - svd.global_mean - svd.bi[index]
+    w0 = np.zeros(x.shape[1]) if prior is None else np.append(*prior)
+    w = np.linalg.solve(x.T @ x + reg * np.eye(x.shape[1]), x.T @ y + reg * w0)
+    return w[:-1], w[-1]
+
+
+@pytest.mark.parametrize('n_rated', [2, 12])  # dual and primal solves
+def test_fold_in_solves_the_ridge_regression(n_rated):
+    svd = _scorer()
+    rng = np.random.default_rng(2)
+    items = svd.item_ids[rng.choice(svd.n_items, n_rated, replace=False)]
+    ratings = rng.choice(np.arange(1, 11) / 2, n_rated)
+
+    p, b = svd.fold_in(items, ratings, reg=0.1)
+    expected_p, expected_b = _ridge(svd, items, ratings, 0.1)
+    np.testing.assert_allclose(p, expected_p, atol=1e-8)
+    assert b == pytest.approx(expected_b)
+
+    prior = (rng.normal(size=svd.qi.shape[1]), 0.2)
+    p, b = svd.fold_in(items, ratings, reg=0.1, prior=prior)
+    expected_p, expected_b = _ridge(svd, items, ratings, 0.1, prior)
+    np.testing.assert_allclose(p, expected_p, atol=1e-8)
+    assert b == pytest.approx(expected_b)
+
+
+def test_fold_in_ignores_unknown_items():
+    svd = _scorer()
+    p, b = svd.fold_in([100, 999], [5.0, 1.0])
+    expected_p, expected_b = svd.fold_in([100], [5.0])
+    np.testing.assert_allclose(p, expected_p)
+    assert b == pytest.approx(expected_b)
+
+    p, b = svd.fold_in([999], [5.0])
+    assert not p.any() and b == 0.0
+
+
+def test_add_ratings_updates_and_appends_users():
+    svd = _scorer()
+    prior = (svd.pu[0].copy(), svd.bu[0])
+    svd.add_ratings([10, 10, 12345], [100, 200, 300], [4.0, 2.5, 5.0])
+
+    assert svd.n_users == 41 and svd.user_index([12345])[0] == 40
+    p, b = svd.fold_in([100, 200], [4.0, 2.5], prior=prior)
+    np.testing.assert_allclose(svd.pu[0], p)
+    assert svd.bu[0] == pytest.approx(b)
+    np.testing.assert_allclose(svd.pu[40], svd.fold_in([300], [5.0])[0])
+
+
+def test_concurrent_add_ratings_keep_every_user(monkeypatch):
+    svd = _scorer()
+    fold_in = svd.fold_in
+
+    def slow_fold_in(*args, **kwargs):
+        # Widen the window between reading and swapping the users
+        time.sleep(0.01)
+        return fold_in(*args, **kwargs)
+
+    monkeypatch.setattr(svd, 'fold_in', slow_fold_in)
+    new_users = [1000 + i for i in range(8)]
+    with ThreadPoolExecutor(max_workers=len(new_users)) as pool:
+        list(pool.map(lambda user: svd.add_ratings([user, 10], [100, 200], [4.0, 3.0]),
+                      new_users))
+
+    assert svd.n_users == 40 + len(new_users)
+    assert (svd.user_index(new_users) >= 40).all()
+    assert len(svd.pu) == len(svd.bu) == svd.n_users
@@ -0,0 +1,387 @@
+"""
+
+    Binary columnar cache of the MovieLens csv files.
+
+    Author: Explore Data Science Academy.
+
+    Description: Parsing `movies.csv` and `ratings.csv` as text is the
+    largest part of the app's cold start. The first load of a file converts
+    it into one `.npy` array per column, stored next to the data under
+    `.cache/`:
+
+        ids        int32
+        ratings    uint8 number of half stars (0.5 stars -> 1, 5 stars
+                   -> 10), decoded to float32 on load unless asked for
+                   the encoded values
+        text       categorical, stored as int32 codes plus the distinct
+                   values as concatenated UTF-8 bytes and offsets
+        genres     categorical like text, plus one row of uint64 bitmask
+                   words per movie over the sorted genre vocabulary
+
+    Later loads memory-map the arrays, so that every process and every app
+    worker reading the same file shares one copy of its pages through the
+    operating system's page cache. The cache is rebuilt automatically when
+    the source csv changes: its size and modification time are checked on
+    every load, and its SHA-1 hash when these differ from the manifest.
+
+    Files without text columns, i.e. the ratings, are converted in chunks of
+    `CHUNK_ROWS` rows appended to the column files, so that converting a
+    full-size MovieLens dump never holds more than one chunk in memory. A
+    callback given to `ensure_cache` sees every parsed chunk, letting other
+    structures be built within the same pass over the file (see
+    `recommenders/ingest.py`).
+
+"""
+
+# Data handling dependencies
+import os
+import json
+import struct
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Column layout of the files we cache.
+MOVIES_SCHEMA = {'movieId': 'int32', 'title': 'category', 'genres': 'genres'}
+RATINGS_SCHEMA = {'userId': 'int32', 'movieId': 'int32', 'rating': 'halfstar',
+                  'timestamp': 'int64'}
+
+# Rows parsed at once when converting a file without text columns.
+CHUNK_ROWS = 1_000_000
+
+# Rating of every half-star code.
+HALF_STARS = np.arange(256, dtype=np.float32) / 2
+
+
+def encode_ratings(ratings):
+    """Half-star codes of ratings, or None when they aren't all half stars."""
+    doubled = np.asarray(ratings, dtype=np.float64) * 2
+    codes = np.round(doubled)
+    if len(codes) and (codes.min() < 0 or codes.max() > 255 or (codes != doubled).any()):
+        return None
+    return codes.astype(np.uint8)
+
+
+def decode_ratings(codes):
+    """Ratings of half-star codes, as float32."""
+    return HALF_STARS[codes]
+
+
+def genre_masks(genre_strings):
+    """Pack '|'-separated genre strings into bitmask words.
+
+    Returns
+    -------
+    tuple (list (str), np.ndarray)
+        Sorted genre vocabulary, and a (n, n_words) uint64 array with bit
+        i of a row set when the movie lists genre i of the vocabulary.
+
+    """
+    genre_lists = [str(genres).split('|') for genres in genre_strings]
+    vocabulary = sorted({genre for genres in genre_lists for genre in genres})
+    bit = {genre: i for i, genre in enumerate(vocabulary)}
+    n_words = max(1, -(-len(vocabulary) // 64))
+    masks = np.zeros((len(genre_lists), n_words), dtype=np.uint64)
+    for row, genres in enumerate(genre_lists):
+        for i in {bit[genre] for genre in genres}:
+            masks[row, i // 64] |= np.uint64(1 << (i % 64))
+    return vocabulary, masks
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    """SHA-1 hash of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_paths(path_to_csv):
+    """Cache root and manifest path of a csv file."""
+    root = os.path.join(os.path.dirname(os.path.abspath(path_to_csv)), '.cache')
+    stem = os.path.splitext(os.path.basename(path_to_csv))[0]
+    return root, stem, os.path.join(root, stem + '.json')
+
+
+def _save_strings(directory, name, values):
+    """Store a string array as concatenated UTF-8 bytes plus offsets."""
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    np.save(os.path.join(directory, name + '.bytes.npy'),
+            np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, name + '.offsets.npy'), offsets)
+
+
+def _load_strings(directory, name):
+    """Decode a string array stored by `_save_strings`."""
+    data = np.load(os.path.join(directory, name + '.bytes.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(directory, name + '.offsets.npy'))
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+class _ColumnWriter:
+    """Append chunks of a column to a .npy file of yet unknown length.
+
+    The header is written with a fixed size once the length is known, so
+    that the values never need to be held in memory at once.
+
+    """
+
+    HEADER = 128
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(b'\0' * self.HEADER)
+
+    def append(self, values):
+        np.ascontiguousarray(values, dtype=self.dtype).tofile(self.file)
+        self.rows += len(values)
+
+    def retype(self, dtype, convert):
+        """Convert the values written so far to another dtype."""
+        self.file.close()
+        written = np.fromfile(self.path, dtype=self.dtype, offset=self.HEADER)
+        self.__init__(self.path, dtype)
+        self.append(convert(written))
+
+    def close(self):
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype),
+                       'fortran_order': False, 'shape': (self.rows,)}).encode('latin1')
+        self.file.seek(0)
+        self.file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', self.HEADER - 10)
+                        + header.ljust(self.HEADER - 11) + b'\n')
+        self.file.close()
+
+
+def _build_chunked(path_to_csv, schema, directory, on_chunk=None, chunk_rows=None):
+    """Convert a csv file of numeric columns chunk by chunk."""
+    dtypes = {column: 'float64' if kind == 'halfstar' else kind for column, kind in schema.items()}
+    writers = {column: _ColumnWriter(os.path.join(directory, column + '.npy'),
+                                     np.uint8 if kind == 'halfstar' else kind)
+               for column, kind in schema.items()}
+    size = max(os.path.getsize(path_to_csv), 1)
+    try:
+        with open(path_to_csv, 'rb') as f:
+            for chunk in pd.read_csv(f, usecols=list(schema), dtype=dtypes,
+                                     chunksize=chunk_rows or CHUNK_ROWS):
+                for column, kind in schema.items():
+                    values = chunk[column].to_numpy()
+                    if kind == 'halfstar' and writers[column].dtype == np.uint8:
+                        codes = encode_ratings(values)
+                        if codes is not None:
+                            writers[column].append(codes)
+                            continue
+                        # Kept as float32 should a file hold other than half stars
+                        writers[column].retype(np.float32, decode_ratings)
+                    writers[column].append(values)
+                if on_chunk is not None:
+                    on_chunk(chunk, min(f.tell() / size, 1.0))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def _build(path_to_csv, schema, directory, on_chunk=None, chunk_rows=None):
+    """Convert a csv file into one array per column."""
+    if all(kind not in ('category', 'genres') for kind in schema.values()):
+        return _build_chunked(path_to_csv, schema, directory, on_chunk, chunk_rows)
+
+    dtypes = {'genres': 'category', 'halfstar': 'float64'}
+    frame = pd.read_csv(path_to_csv, usecols=list(schema),
+                        dtype={c: dtypes.get(t, t) for c, t in schema.items()})
+    if on_chunk is not None:
+        on_chunk(frame, 1.0)
+    for column, kind in schema.items():
+        if kind in ('category', 'genres'):
+            values = frame[column].cat
+            codes = values.codes.to_numpy().astype(np.int32)
+            np.save(os.path.join(directory, column + '.codes.npy'), codes)
+            _save_strings(directory, column, values.categories)
+            if kind == 'genres':
+                # Pack every distinct genre list once, then expand per
+                # movie; a missing list (code -1) picks the empty last row
+                vocabulary, masks = genre_masks(values.categories)
+                masks = np.vstack([masks, np.zeros_like(masks[:1])])
+                np.save(os.path.join(directory, column + '.masks.npy'), masks[codes])
+                with open(os.path.join(directory, column + '.vocabulary.json'), 'w') as f:
+                    json.dump(vocabulary, f)
+        elif kind == 'halfstar':
+            # Kept as float32 should a file hold other than half stars
+            codes = encode_ratings(frame[column].to_numpy())
+            np.save(os.path.join(directory, column + '.npy'),
+                    frame[column].to_numpy(dtype=np.float32) if codes is None else codes)
+        else:
+            np.save(os.path.join(directory, column + '.npy'), frame[column].to_numpy())
+
+
+def ensure_cache(path_to_csv, schema, on_chunk=None, chunk_rows=None):
+    """Build or refresh the binary cache of a csv file.
+
+    Parameters
+    ----------
+    path_to_csv : str
+        Relative or absolute path to the source .csv file.
+    schema : dict
+        Column name -> numpy dtype name, 'category', 'genres' or
+        'halfstar'.
+    on_chunk : callable, optional
+        Called as `on_chunk(frame, progress)` with every chunk parsed
+        while (re)building the cache, `progress` being the share of the
+        file read so far. Not called when the cache is up to date.
+    chunk_rows : int, optional
+        Rows per chunk, `CHUNK_ROWS` by default.
+
+    Returns
+    -------
+    str
+        Directory holding the column arrays.
+
+    """
+    root, stem, manifest_path = _cache_paths(path_to_csv)
+    source = os.stat(path_to_csv)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    directory = os.path.join(root, manifest.get('directory', ''))
+    if (manifest.get('schema') == schema and os.path.isdir(directory)
+            and manifest.get('size') == source.st_size
+            and manifest.get('mtime_ns') == source.st_mtime_ns):
+        return directory
+
+    # The file was touched or replaced: only rebuild when its contents changed.
+    sha1 = _file_hash(path_to_csv)
+    if manifest.get('schema') != schema or manifest.get('sha1') != sha1 \
+            or not os.path.isdir(directory):
+        os.makedirs(root, exist_ok=True)
+        # Named after the contents and the layout, so that a schema change
+        # never reuses arrays built for the previous layout
+        layout = hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+        directory = os.path.join(root, f'{stem}-{sha1[:12]}-{layout[:8]}')
+        if not os.path.isdir(directory):
+            staging = tempfile.mkdtemp(prefix=stem + '.', dir=root)
+            os.chmod(staging, 0o755)
+            _build(path_to_csv, schema, staging, on_chunk, chunk_rows)
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                # Another process finished the same build first.
+                shutil.rmtree(staging, ignore_errors=True)
+        old = manifest.get('directory')
+        if old and old != os.path.basename(directory):
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    manifest = {'source': os.path.basename(path_to_csv), 'size': source.st_size,
+                'mtime_ns': source.st_mtime_ns, 'sha1': sha1, 'schema': schema,
+                'directory': os.path.basename(directory)}
+    handle, staging = tempfile.mkstemp(suffix='.json', dir=root)
+    with os.fdopen(handle, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.chmod(staging, 0o644)
+    os.replace(staging, manifest_path)
+    return directory
+
+
+def load_columns(path_to_csv, schema, columns=None, encoded=False):
+    """Memory-mapped column arrays of a cached csv file.
+
+    Parameters
+    ----------
+    path_to_csv : str
+        Relative or absolute path to the source .csv file.
+    schema : dict
+        Column name -> numpy dtype name, 'category', 'genres' or
+        'halfstar'.
+    columns : list (str), optional
+        Columns to load, all columns of the schema by default.
+    encoded : bool
+        Return half-star columns as their memory-mapped uint8 codes
+        rather than decoding them into a float32 copy.
+
+    Returns
+    -------
+    dict
+        Column name -> np.ndarray for numeric columns, or
+        pd.Categorical for text columns.
+
+    """
+    directory = ensure_cache(path_to_csv, schema)
+    arrays = {}
+    for column in columns or list(schema):
+        if schema[column] in ('category', 'genres'):
+            codes = np.load(os.path.join(directory, column + '.codes.npy'), mmap_mode='r')
+            arrays[column] = pd.Categorical.from_codes(codes, _load_strings(directory, column))
+        else:
+            arrays[column] = np.load(os.path.join(directory, column + '.npy'), mmap_mode='r')
+            if schema[column] == 'halfstar' and arrays[column].dtype == np.uint8 and not encoded:
+                arrays[column] = decode_ratings(arrays[column])
+    return arrays
+
+
+def load_genre_masks(path_to_movies='resources/data/movies.csv'):
+    """Memory-mapped genre bitmasks of every movie of a movies file.
+
+    Returns
+    -------
+    tuple (list (str), np.ndarray)
+        Sorted genre vocabulary, and the (n_movies, n_words) uint64 masks
+        in file order, see `genre_masks`.
+
+    """
+    directory = ensure_cache(path_to_movies, MOVIES_SCHEMA)
+    with open(os.path.join(directory, 'genres.vocabulary.json')) as f:
+        vocabulary = json.load(f)
+    return vocabulary, np.load(os.path.join(directory, 'genres.masks.npy'), mmap_mode='r')
+
+
+def load_movies(path_to_movies='resources/data/movies.csv', columns=None):
+    """Load the movie database through the binary cache.
+
+    Parameters
+    ----------
+    path_to_movies : str
+        Relative or absolute path to movie database stored
+        in .csv format.
+    columns : list (str), optional
+        Columns to load, all columns by default.
+
+    Returns
+    -------
+    Pandas Dataframe
+        Movie records with int32 ids and categorical text columns.
+
+    """
+    return pd.DataFrame(load_columns(path_to_movies, MOVIES_SCHEMA, columns), copy=False)
+
+
+def load_ratings(path_to_ratings='resources/data/ratings.csv', columns=None, encoded=False):
+    """Load the ratings through the binary cache.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings stored
+        in .csv format.
+    columns : list (str), optional
+        Columns to load, all columns by default.
+    encoded : bool
+        Keep ratings as memory-mapped uint8 half-star codes, see
+        `decode_ratings`.
+
+    Returns
+    -------
+    Pandas Dataframe
+        Ratings with int32 ids and float32 (or encoded uint8) ratings.
+
+    """
+    return pd.DataFrame(load_columns(path_to_ratings, RATINGS_SCHEMA, columns, encoded),
+                        copy=False)
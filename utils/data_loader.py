@@ -6,8 +6,11 @@
 
 """
 # Data handling dependencies
+import os
+import json
 import pandas as pd
 import numpy as np
+from utils.data_cache import load_movies
 
 def load_movie_titles(path_to_movies):
     """Load movie titles from database records.
@@ -24,7 +27,33 @@ def load_movie_titles(path_to_movies):
         Movie titles.
 
     """
-    df = pd.read_csv(path_to_movies)
+    df = load_movies(path_to_movies, columns=['title'])
     df = df.dropna()
     movie_list = df['title'].to_list()
     return movie_list
+
+def load_model_results(path_to_results):
+    """Load the best cross-validation result of every benchmarked model.
+
+    Parameters
+    ----------
+    path_to_results : str
+        Relative or absolute path to the JSON file written by
+        `resources/models/benchmark_models.py`.
+
+    Returns
+    -------
+    Pandas Dataframe or None
+        One row per algorithm, sorted by RMSE, or None when no benchmark
+        has been run yet.
+
+    """
+    if not os.path.exists(path_to_results):
+        return None
+    with open(path_to_results) as f:
+        results = json.load(f)
+    df = pd.DataFrame(results['best'])
+    df['params'] = df['params'].apply(lambda params: json.dumps(params, sort_keys=True))
+    df.attrs.update(n_ratings=results['n_ratings'], n_folds=results['n_folds'],
+                    created=results['created'])
+    return df.sort_values('rmse_mean').reset_index(drop=True)
@@ -0,0 +1,216 @@
+"""
+
+    Per-stage timing and profiling of recommendation requests.
+
+    Author: Explore Data Science Academy.
+
+    Description: A recommender wrapped with `instrumented` records a trace
+    of every request: its total wall time and, for every `stage` entered
+    while it runs, the wall time, number of calls and (optionally) the net
+    memory allocated according to `tracemalloc`. Outside of a request a
+    stage costs a single attribute lookup, so the hot paths stay annotated
+    at all times.
+
+    The last traces are kept in memory for the app's debug panel and every
+    trace is logged as one JSON line on the `utils.instrumentation` logger.
+    Setting the following environment variables switches on the extras:
+
+        RECOMMENDER_DEBUG=1         log traces to stderr and show the debug
+                                    panel within the app
+        RECOMMENDER_TRACEMALLOC=1   record memory allocated per stage
+
+    A cProfile dump of a single request is requested with `profile_next`.
+
+"""
+
+# Dependencies
+import os
+import json
+import time
+import cProfile
+import logging
+import functools
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Number of request traces kept for the debug panel.
+HISTORY = 50
+PROFILE_DIR = 'profiles'
+
+_traces = deque(maxlen=HISTORY)
+_totals = {}
+_local = threading.local()
+_lock = threading.Lock()
+_profile_path = None
+_track_memory = bool(os.environ.get('RECOMMENDER_TRACEMALLOC'))
+
+if os.environ.get('RECOMMENDER_DEBUG'):
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+
+
+def debug_enabled():
+    """Whether the app runs with `RECOMMENDER_DEBUG` set."""
+    return bool(os.environ.get('RECOMMENDER_DEBUG'))
+
+
+def track_memory(enabled=True):
+    """Switch recording of the memory allocated per stage on or off."""
+    global _track_memory
+    _track_memory = enabled
+
+
+def profile_next(path=None):
+    """Capture a cProfile dump of the next request.
+
+    Parameters
+    ----------
+    path : str
+        File the `pstats` dump is written to. By default a file named
+        after the algorithm and time within `PROFILE_DIR`.
+
+    """
+    global _profile_path
+    with _lock:
+        _profile_path = path or ''
+
+
+def _take_profile_request():
+    global _profile_path
+    with _lock:
+        path, _profile_path = _profile_path, None
+    return path
+
+
+class Trace:
+    """Timings of a single request."""
+
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.started = time.time()
+        self.seconds = None
+        self.stages = {}
+        self.fields = {}
+        self.prefix = ''
+        self.track_memory = _track_memory and tracemalloc.is_tracing()
+
+    def add(self, name, seconds, allocated=None):
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        if allocated is not None:
+            entry['alloc_kb'] = entry.get('alloc_kb', 0.0) + allocated / 1024.0
+
+    def as_dict(self):
+        return {'algorithm': self.algorithm, 'started': self.started,
+                'seconds': self.seconds, 'stages': self.stages, **self.fields}
+
+
+@contextmanager
+def stage(name):
+    """Time a block of code as a stage of the current request."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    name = trace.prefix + name
+    before = tracemalloc.get_traced_memory()[0] if trace.track_memory else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[0] - before if before is not None else None
+        trace.add(name, seconds, allocated)
+        with _lock:
+            totals = _totals.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+
+def annotate(**fields):
+    """Attach fields, e.g. which path answered, to the current request."""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+@contextmanager
+def request(algorithm):
+    """Trace a recommendation request.
+
+    A request started within another one is recorded as a stage of the
+    outer request, its own stages prefixed with its algorithm.
+
+    """
+    outer = getattr(_local, 'trace', None)
+    if outer is not None:
+        prefix = outer.prefix
+        outer.prefix = f'{prefix}{algorithm}:'
+        try:
+            with stage(algorithm):
+                yield outer
+        finally:
+            outer.prefix = prefix
+        return
+
+    trace = _local.trace = Trace(algorithm)
+    if _track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        trace.track_memory = True
+    profile_path = _take_profile_request()
+    profiler = cProfile.Profile() if profile_path is not None else None
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield trace
+    except Exception as error:
+        trace.fields['error'] = repr(error)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        trace.seconds = time.perf_counter() - start
+        _local.trace = None
+        if profiler is not None:
+            if not profile_path:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profile_path = os.path.join(
+                    PROFILE_DIR, time.strftime(f'{algorithm}-%Y%m%d-%H%M%S.prof'))
+            profiler.dump_stats(profile_path)
+            trace.fields['profile'] = profile_path
+        _traces.append(trace)
+        logger.info(json.dumps(trace.as_dict()))
+
+
+def instrumented(algorithm):
+    """Trace every call of a recommender function as a request.
+
+    The wrapped function keeps its name, signature and attributes.
+
+    """
+    def decorator(model):
+        @functools.wraps(model)
+        def wrapper(*args, **kwargs):
+            with request(algorithm):
+                return model(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def recent(n=None):
+    """The last `n` request traces as dictionaries, newest first."""
+    traces = list(_traces)[::-1]
+    return [trace.as_dict() for trace in traces[:n]]
+
+
+def stage_totals():
+    """Calls and cumulated seconds per stage since the process started."""
+    with _lock:
+        return {name: {'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in _totals.items()}
@@ -0,0 +1,179 @@
+"""
+
+    Lazy, process-wide loading of heavy resources.
+
+    Author: Explore Data Science Academy.
+
+    Description: Data files, models and indexes are registered here under
+    a name and only loaded the first time they are used. Streamlit runs
+    every session as a thread of the same process and only executes module
+    imports once, so a resource loaded here is shared by all sessions.
+    Loading is guarded by a lock per resource, so concurrent sessions
+    never load the same resource twice.
+
+    `warm_up` loads every registered resource ahead of the first request,
+    optionally on a background thread so the app can answer its first page
+    while the models load. Load and import times are recorded and can be
+    printed with:
+
+        python -m utils.lazy
+
+"""
+
+# Dependencies
+import sys
+import time
+import logging
+import importlib
+import threading
+from utils.instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+# Registered resources and recorded import times, process-wide.
+_resources = {}
+_imports = {}
+_registry_lock = threading.Lock()
+_warm_up_thread = None
+
+
+class LazyResource:
+    """A value computed by `loader` on first access and then kept.
+
+    Parameters
+    ----------
+    name : str
+        Name the resource is reported under.
+    loader : callable
+        Function without arguments returning the resource.
+
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        """Return the resource, loading it on first use."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    with stage(f'load {self.name}'):
+                        self._value = self.loader()
+                    self.seconds = time.perf_counter() - start
+                    self._loaded = True
+                    logger.info("Loaded %s in %.3fs", self.name, self.seconds)
+        return self._value
+
+    def reset(self):
+        """Drop the loaded value so that the next access reloads it."""
+        with self._lock:
+            self._value = None
+            self._loaded = False
+            self.seconds = None
+
+
+def shared_resource(name, loader):
+    """Register a lazily loaded resource, or return the one already
+    registered under the same name.
+
+    Parameters
+    ----------
+    name : str
+        Process-wide name of the resource.
+    loader : callable
+        Function without arguments returning the resource.
+
+    Returns
+    -------
+    LazyResource
+        The shared resource.
+
+    """
+    with _registry_lock:
+        if name not in _resources:
+            _resources[name] = LazyResource(name, loader)
+        return _resources[name]
+
+
+def timed_import(module_name):
+    """Import a module, recording how long the import took."""
+    already_loaded = module_name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if not already_loaded:
+        _imports[module_name] = time.perf_counter() - start
+        logger.info("Imported %s in %.3fs", module_name, _imports[module_name])
+    return module
+
+
+def warm_up(names=None, background=False, first=()):
+    """Load registered resources ahead of their first use.
+
+    Parameters
+    ----------
+    names : list (str), optional
+        Resources to load, every registered resource by default.
+    background : bool
+        Load on a daemon thread and return immediately. Only one warm-up
+        thread is started per process.
+    first : list (str), optional
+        Resources to load before the others, e.g. those the fallback
+        recommendations need.
+
+    """
+    global _warm_up_thread
+
+    def load():
+        ordered = list(first) + [n for n in names or list(_resources) if n not in first]
+        for name in ordered:
+            try:
+                _resources[name].get()
+            except Exception:
+                logger.exception("Warm-up of %s failed", name)
+
+    if not background:
+        load()
+        return
+    with _registry_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=load, name='warm-up', daemon=True)
+            _warm_up_thread.start()
+
+
+def report():
+    """Recorded import and load times.
+
+    Returns
+    -------
+    list (dict)
+        One record per import and per registered resource, with keys
+        'kind', 'name', 'loaded' and 'seconds'.
+
+    """
+    records = [{'kind': 'import', 'name': name, 'loaded': True, 'seconds': seconds}
+               for name, seconds in _imports.items()]
+    records += [{'kind': 'resource', 'name': name, 'loaded': resource.loaded,
+                 'seconds': resource.seconds} for name, resource in _resources.items()]
+    return records
+
+
+if __name__ == '__main__':
+    # Run through the imported module, whose registry the recommenders share.
+    from utils import lazy
+    logging.basicConfig(level=logging.WARNING)
+    lazy.timed_import('recommenders.content_based')
+    lazy.timed_import('recommenders.collaborative_based')
+    lazy.warm_up()
+    for record in lazy.report():
+        seconds = '-' if record['seconds'] is None else f"{record['seconds']:.3f}s"
+        print(f"{record['kind']:<10}{record['name']:<45}{seconds:>10}")
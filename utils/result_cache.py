@@ -0,0 +1,207 @@
+"""
+
+    Bounded cache of recommendation results.
+
+    Author: Explore Data Science Academy.
+
+    Description: Popular combinations of favourite movies are requested
+    again and again, by the same session and across sessions. Results are
+    kept in a least-recently-used cache with a time-to-live and a size
+    limit, keyed by
+
+        (algorithm, sorted favourite movie ids, top_n, model version)
+
+    so that the order in which favourites were picked doesn't matter. The
+    model version is checked on every call and the cache is emptied when
+    it changes, e.g. after a model artifact or data file was replaced.
+
+"""
+
+# Dependencies
+import os
+import time
+import functools
+import threading
+from collections import OrderedDict
+from utils.instrumentation import stage, annotate
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a time-to-live.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of results kept; the least recently used result is
+        evicted first.
+    ttl : float
+        Seconds after which a result expires.
+
+    """
+
+    def __init__(self, max_size=1024, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        # Whether a live entry exists, without counting a lookup
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def get(self, key):
+        """Look a key up.
+
+        Returns
+        -------
+        tuple (bool, object)
+            Whether a live entry was found, and its value.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def validate(self, version):
+        """Empty the cache when `version` differs from the last one seen."""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'size': len(self._entries),
+                    'max_size': self.max_size, 'ttl': self.ttl}
+
+
+def file_version(*paths):
+    """Version stamp of files or directories from their size and mtime.
+
+    Missing paths are stamped with None, so creating them also changes
+    the version.
+
+    """
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def artifact_version(paths, resources=()):
+    """Version callable for `cached_recommender` watching artifact files.
+
+    Parameters
+    ----------
+    paths : list (str)
+        Files whose size and mtime make up the version.
+    resources : list (LazyResource)
+        Resources loaded from those files. They are reset when the version
+        changes, so that the next request reloads them.
+
+    Returns
+    -------
+    callable
+        Function without arguments returning the current version.
+
+    """
+    seen = []
+
+    def version():
+        current = file_version(*paths)
+        if seen and seen[0] != current:
+            for resource in resources:
+                resource.reset()
+        seen[:] = [current]
+        return current
+
+    return version
+
+
+def cached_recommender(algorithm, resolve, version, max_size=1024, ttl=3600.0):
+    """Put a result cache in front of a `*_model(movie_list, top_n)` function.
+
+    Parameters
+    ----------
+    algorithm : str
+        Name of the algorithm, part of the cache key.
+    resolve : callable
+        Maps the list of favourite titles to movie ids.
+    version : callable
+        Returns the current version of the model/data the results depend
+        on. The cache is emptied whenever it changes.
+    max_size : int
+        Maximum number of cached results.
+    ttl : float
+        Seconds after which a result expires.
+
+    Returns
+    -------
+    callable
+        Decorator. The wrapped function keeps its name and signature and
+        exposes its cache as the `cache` attribute, and the key of a
+        request as the `key(movie_list, top_n)` function.
+
+    """
+    cache = ResultCache(max_size=max_size, ttl=ttl)
+
+    def key(movie_list, top_n=10):
+        current = version()
+        cache.validate(current)
+        return (algorithm, tuple(sorted(resolve(movie_list))), top_n, current)
+
+    def decorator(model):
+        @functools.wraps(model)
+        def wrapper(movie_list, top_n=10):
+            with stage('cache lookup'):
+                request_key = key(movie_list, top_n)
+                found, result = cache.get(request_key)
+            annotate(cache='hit' if found else 'miss')
+            if not found:
+                result = model(movie_list, top_n)
+                cache.put(request_key, list(result))
+            return list(result)
+
+        wrapper.cache = cache
+        wrapper.key = key
+        return wrapper
+
+    return decorator
@@ -0,0 +1,99 @@
+"""
+
+    Client of the recommendation service.
+
+    Author: Explore Data Science Academy.
+
+    Description: When the app runs with `RECOMMENDER_SERVICE_URL` set, e.g.
+    `http://127.0.0.1:8600`, recommendations are requested from a running
+    `recommenders/service.py` instead of being computed within the app
+    worker. `remote_model` returns a function with the signature of
+    `content_model` and `collab_model`, so the app calls it unchanged.
+
+"""
+
+# Dependencies
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+_local = threading.local()
+
+
+class ServiceError(RuntimeError):
+    """Raised when the service answers with an error."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _connection(url, timeout):
+    # One keep-alive connection per thread, i.e. per app session
+    connections = _local.__dict__.setdefault('connections', {})
+    if url not in connections:
+        parts = urlsplit(url)
+        connections[url] = http.client.HTTPConnection(parts.hostname, parts.port or 80,
+                                                      timeout=timeout)
+    return connections[url]
+
+
+def request(url, method, path, payload=None, timeout=30.0):
+    """Send a request to the service and decode its JSON answer.
+
+    Raises
+    ------
+    ServiceError
+        When the service answers with an error status.
+
+    """
+    body = json.dumps(payload) if payload is not None else None
+    headers = {'Content-Type': 'application/json'}
+    for attempt in range(2):
+        connection = _connection(url, timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            answer = json.loads(response.read() or b'{}')
+            break
+        except (ConnectionError, http.client.HTTPException):
+            # The service closed the kept-alive connection; reconnect once
+            connection.close()
+            _local.connections.pop(url, None)
+            if attempt:
+                raise
+    if response.status != 200:
+        raise ServiceError(f"{method} {path} failed with {response.status}: "
+                           f"{answer.get('error', answer)}", response.status)
+    return answer
+
+
+def remote_model(algorithm, url, timeout=30.0):
+    """A `*_model(movie_list, top_n)` function answered by the service.
+
+    Parameters
+    ----------
+    algorithm : str
+        'content', 'collab' or 'hybrid'.
+    url : str
+        Base URL of the service.
+    timeout : float
+        Seconds to wait for an answer.
+
+    Unknown titles raise `KeyError`, like the local recommenders.
+
+    """
+    def model(movie_list, top_n=10):
+        try:
+            answer = request(url, 'POST', '/recommend',
+                             {'algorithm': algorithm, 'movies': list(movie_list), 'top_n': top_n},
+                             timeout)
+        except ServiceError as error:
+            if error.status == 404:
+                raise KeyError(str(error)) from error
+            raise
+        return answer['recommendations']
+
+    model.__name__ = f'{algorithm}_model'
+    return model
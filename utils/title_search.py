@@ -0,0 +1,233 @@
+"""
+
+    Indexed search over movie titles.
+
+    Author: Explore Data Science Academy.
+
+    Description: Lets the app offer any of the catalogue's titles without
+    sending all of them to the browser. Titles are normalised (accents,
+    case and punctuation dropped) and indexed three ways when the index is
+    built:
+
+        prefix    sorted normalised titles, searched with bisection. Titles
+                  listed as "Matrix, The (1999)" are also indexed as
+                  "the matrix 1999"
+        token     posting arrays of every word, the last word of the
+                  query matching as a prefix
+        trigram   posting arrays of every character trigram, for queries
+                  with typos
+
+    A search returns exact matches first, then prefix matches, then titles
+    containing every word of the query, then the closest titles by trigram
+    similarity, each group ranked by number of ratings.
+
+"""
+
+# Dependencies
+import re
+import bisect
+import unicodedata
+import numpy as np
+from utils.data_cache import load_movies, load_ratings
+from utils.lazy import shared_resource
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+_TRAILING_ARTICLE = re.compile(r'^(?P<name>.+), (?P<article>the|a|an|les|la|le|il|el|die|der|das)'
+                               r'(?P<rest>( \(.*\))?)$', re.IGNORECASE)
+
+# Smallest trigram similarity of a fuzzy match.
+MIN_SIMILARITY = 0.3
+# Share of titles above which a trigram is too common to be worth counting.
+COMMON_TRIGRAM_SHARE = 0.05
+# Candidates above which the last query word is matched with array
+# operations rather than by checking every candidate's words.
+PYTHON_FILTER_LIMIT = 500
+
+
+def normalise(text):
+    """Lowercase words of a title, without accents or punctuation."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def _trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _postings(lists):
+    return {key: np.array(rows, dtype=np.int32) for key, rows in lists.items()}
+
+
+def _contains(posting, rows):
+    """Which of `rows` are listed in a sorted posting array."""
+    found = np.searchsorted(posting, rows)
+    return posting[np.minimum(found, len(posting) - 1)] == rows
+
+
+class TitleIndex:
+    """Prefix, token and trigram index over a list of titles.
+
+    Parameters
+    ----------
+    titles : list (str)
+        Titles to search, e.g. as returned by `load_movie_titles`.
+    popularity : np.ndarray, optional
+        Number of ratings of every title, ranking matches of equal
+        quality. Shorter titles rank first when it is missing.
+
+    """
+
+    def __init__(self, titles, popularity=None):
+        self.titles = list(titles)
+        popularity = np.zeros(len(self.titles)) if popularity is None else np.asarray(popularity)
+        lengths = np.array([len(t) for t in self.titles])
+        # rank[row] is the position of the title when sorting by decreasing
+        # popularity, then increasing length
+        self.order = np.lexsort((lengths, -popularity))
+        self.rank = np.empty(len(self.order), dtype=np.int64)
+        self.rank[self.order] = np.arange(len(self.order))
+
+        keys, tokens, trigrams = [], {}, {}
+        self.n_trigrams = np.zeros(len(self.titles), dtype=np.int32)
+        self._row_tokens = []
+        for row, title in enumerate(self.titles):
+            key = normalise(title)
+            keys.append((key, row))
+            self._row_tokens.append(tuple(key.split()))
+            article = _TRAILING_ARTICLE.match(title)
+            if article:
+                keys.append((normalise(f"{article['article']} {article['name']}{article['rest']}"), row))
+            for token in set(key.split()):
+                tokens.setdefault(token, []).append(row)
+            grams = _trigrams(key)
+            self.n_trigrams[row] = len(grams)
+            for gram in grams:
+                trigrams.setdefault(gram, []).append(row)
+
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._key_rows = np.array([row for _, row in keys], dtype=np.int32)
+        self._tokens = _postings(tokens)
+        self._vocabulary = sorted(self._tokens)
+        self._trigrams = _postings(trigrams)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _best(self, rows, limit):
+        """Up to `limit` distinct rows, ranked by popularity."""
+        ranks = self.rank[rows]
+        # A row is listed at most a few times, so the best distinct rows
+        # are among the best 4 * limit entries.
+        if len(ranks) > 4 * limit:
+            ranks = ranks[np.argpartition(ranks, 4 * limit - 1)[:4 * limit]]
+        return self.order[np.unique(ranks)[:limit]]
+
+    def _prefix(self, query, limit):
+        lo = bisect.bisect_left(self._keys, query)
+        exact = bisect.bisect_right(self._keys, query, lo)
+        hi = bisect.bisect_left(self._keys, query + '\uffff', exact)
+        return np.concatenate([self._best(self._key_rows[lo:exact], limit),
+                               self._best(self._key_rows[lo:hi], limit)])
+
+    def _token(self, words, limit):
+        # Every word but the last must match a whole word; the last word
+        # may still be being typed.
+        *complete, last = words
+        if any(word not in self._tokens for word in complete):
+            return np.empty(0, dtype=np.int32)
+        if len(last) > 1:
+            lo = bisect.bisect_left(self._vocabulary, last)
+            hi = bisect.bisect_left(self._vocabulary, last + '\uffff', lo)
+            matching = self._vocabulary[lo:hi]
+        else:
+            matching = [last] if last in self._tokens else []
+        if not matching:
+            return np.empty(0, dtype=np.int32)
+
+        # Start from the shortest posting list and filter it by the others
+        postings = sorted((self._tokens[word] for word in complete), key=len)
+        if not postings or sum(len(self._tokens[t]) for t in matching) <= len(postings[0]):
+            rows = np.concatenate([self._tokens[t] for t in matching])
+            last = None
+        else:
+            rows = postings.pop(0)
+        for posting in postings:
+            rows = rows[_contains(posting, rows)]
+        if last is not None and len(rows) > PYTHON_FILTER_LIMIT:
+            rows = rows[np.isin(rows, np.concatenate([self._tokens[t] for t in matching]))]
+        elif last is not None:
+            rows = np.array([row for row in rows.tolist()
+                             if any(t.startswith(last) for t in self._row_tokens[row])],
+                            dtype=np.int32)
+        return self._best(rows, limit)
+
+    def _fuzzy(self, query, limit):
+        postings = sorted((self._trigrams[g] for g in _trigrams(query) if g in self._trigrams),
+                          key=len)
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+        # Trigrams shared by a large share of the titles ("the") cost the
+        # most and discriminate the least; count them only when the query
+        # has few others.
+        common = len(self.titles) * COMMON_TRIGRAM_SHARE
+        postings = postings[:3] + [p for p in postings[3:] if len(p) <= common]
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.titles))
+        rows = np.flatnonzero(shared)
+        # Dice coefficient of the trigram sets
+        similarity = 2.0 * shared[rows] / (len(_trigrams(query)) + self.n_trigrams[rows])
+        keep = similarity >= MIN_SIMILARITY
+        rows, similarity = rows[keep], similarity[keep]
+        order = np.lexsort((self.rank[rows], -similarity))[:limit]
+        return rows[order]
+
+    def search(self, query, limit=20):
+        """Titles best matching a query.
+
+        Parameters
+        ----------
+        query : str
+            Partial title, in any case and with or without accents.
+        limit : int
+            Maximum number of titles returned.
+
+        Returns
+        -------
+        list (str)
+            Matching titles, best first.
+
+        """
+        query = normalise(query)
+        if not query or limit <= 0:
+            return []
+        groups = [self._prefix(query, limit), self._token(query.split(), limit)]
+        if sum(len(g) for g in groups) < limit:
+            groups.append(self._fuzzy(query, limit))
+
+        titles, seen = [], set()
+        for row in np.concatenate(groups).tolist():
+            title = self.titles[row]
+            if title not in seen:
+                seen.add(title)
+                titles.append(title)
+                if len(titles) == limit:
+                    break
+        return titles
+
+
+def build_title_index(movies_path, ratings_path=None):
+    """Index the catalogue's titles, ranked by their number of ratings."""
+    movies = load_movies(movies_path, columns=['movieId', 'title']).dropna()
+    popularity = None
+    if ratings_path is not None:
+        counts = load_ratings(ratings_path, columns=['movieId'])['movieId'].value_counts()
+        popularity = movies['movieId'].map(counts).fillna(0).to_numpy()
+    return TitleIndex(movies['title'].to_list(), popularity)
+
+
+def title_index_resource(movies_path, ratings_path=None):
+    """Title index shared process-wide, built on first use."""
+    return shared_resource(f'title index:{movies_path}',
+                           lambda: build_title_index(movies_path, ratings_path))